@@ -2,7 +2,7 @@ import asyncio
 import logging
 import traceback
 from collections.abc import Awaitable
-from datetime import datetime, timedelta, time
+from datetime import date, datetime, timedelta, time
 from pathlib import Path
 from typing import Any, Iterable, Optional
 
@@ -26,7 +26,9 @@ from .database import (
     get_option_int,
     set_option,
 )
-from .utils import sleep_until_next_utc_midnight
+from .messaging import send_limiter
+from .throttling import snapshot_stats
+from .watchers import TickContext
 
 
 alert_bot = Bot(token=ALERT_BOT_TOKEN) if ALERT_BOT_TOKEN else None
@@ -183,13 +185,13 @@ class TokenMonitor:
             self.next_alert += 1_000_000
             self._save()
 
-    async def report_and_reset(self) -> None:
+    async def report_and_reset(self, today: Optional[date] = None) -> None:
         if alert_bot and ALERT_CHAT_IDS:
             total = self.input + self.output
             await send_alert(
                 f"Отчет по токенам:\nInput: {self.input}\nOutput: {self.output}\nОбщее: {total}"
             )
-        self.date = datetime.utcnow().date()
+        self.date = today or datetime.utcnow().date()
         self.input = 0
         self.output = 0
         self.next_alert = 1_000_000
@@ -239,71 +241,78 @@ async def monthly_limit(telegram_id: int) -> None:
     )
 
 
-async def token_watcher() -> None:
-    """Send daily token report at midnight UTC and reset counters."""
+async def token_watcher_tick(ctx: TickContext) -> None:
+    """Send the daily token report and reset counters (runs at midnight UTC)."""
 
-    while True:
-        await sleep_until_next_utc_midnight()
-        await token_monitor.report_and_reset()
+    await token_monitor.report_and_reset(ctx.now.date())
+    await ctx.processed()
 
 
-async def user_stats_watcher() -> None:
-    """Send daily user statistics to the alert chat at midnight UTC."""
-    while True:
-        await sleep_until_next_utc_midnight()
+async def user_stats_watcher_tick(ctx: TickContext) -> None:
+    """Send daily user statistics to the alert chat (runs at midnight UTC)."""
 
-        today = datetime.utcnow().date()
-        start = datetime.combine(today - timedelta(days=1), time())
-        end = datetime.combine(today, time())
-
-        with SessionLocal() as session:
-            total_users = session.query(User).count()
-            ended = (
-                session.query(Subscription)
-                .filter(
-                    Subscription.period_end >= start,
-                    Subscription.period_end < end,
-                )
-                .count()
-            )
-            new_users = (
-                session.query(User)
-                .filter(User.created_at >= start, User.created_at < end)
-                .count()
-            )
-            paid_users = (
-                session.query(Payment.user_id)
-                .filter(Payment.timestamp >= start, Payment.timestamp < end)
-                .distinct()
-                .count()
-            )
+    today = ctx.now.date()
+    start = datetime.combine(today - timedelta(days=1), time())
+    end = datetime.combine(today, time())
 
-            requests_total = (
-                session.query(func.sum(Subscription.daily_used)).scalar() or 0
-            )
-
-            report = "\n".join(
-                [
-                    "Статистика пользователей за сегодня",
-                    "",
-                    f"Всего пользователей: {total_users}",
-                    f"Закончилась подписка: {ended}",
-                    f"Новых пользователей : {new_users}",
-                    f"Пользователей оплативших подписку: {paid_users}",
-                    f"Запросов за сегодня: {requests_total}",
-                ]
-            )
-            await send_alert(report)
-
-            cutoff = datetime.utcnow() - timedelta(days=30)
-            session.query(Meal).filter(Meal.timestamp < cutoff).delete()
-            session.query(Subscription).update(
-                {
-                    "daily_used": 0,
-                    "daily_start": datetime.utcnow(),
-                }
+    with SessionLocal() as session:
+        total_users = session.query(User).count()
+        ended = (
+            session.query(Subscription)
+            .filter(
+                Subscription.period_end >= start,
+                Subscription.period_end < end,
             )
-            session.commit()
+            .count()
+        )
+        new_users = (
+            session.query(User)
+            .filter(User.created_at >= start, User.created_at < end)
+            .count()
+        )
+        paid_users = (
+            session.query(Payment.user_id)
+            .filter(Payment.timestamp >= start, Payment.timestamp < end)
+            .distinct()
+            .count()
+        )
+
+        requests_total = (
+            session.query(func.sum(Subscription.daily_used)).scalar() or 0
+        )
+        throttled = snapshot_stats(reset=True)
+        throttled_total = sum(
+            count for key, count in throttled.items() if key.endswith(":rejected")
+        )
+        sends = send_limiter.snapshot(reset=True)
+
+        report = "\n".join(
+            [
+                "Статистика пользователей за сегодня",
+                "",
+                f"Всего пользователей: {total_users}",
+                f"Закончилась подписка: {ended}",
+                f"Новых пользователей : {new_users}",
+                f"Пользователей оплативших подписку: {paid_users}",
+                f"Запросов за сегодня: {requests_total}",
+                f"Отклонено лимитером: {throttled_total}",
+                f"Отправлено сообщений: {sends['sent']}, "
+                f"ждали лимита: {sends['delayed']}, RetryAfter: {sends['retry_after']}",
+                f"Пиковая очередь отправки: {sends['peak_waiting']}",
+            ]
+        )
+        await send_alert(report)
+        await ctx.processed()
+
+        cutoff = ctx.now - timedelta(days=30)
+        session.query(Meal).filter(Meal.timestamp < cutoff).delete()
+        session.query(Subscription).update(
+            {
+                "daily_used": 0,
+                "daily_start": ctx.now,
+            }
+        )
+        session.commit()
 
 
 async def _log_chat_id(message: types.Message) -> None:
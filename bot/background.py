@@ -0,0 +1,75 @@
+"""Registration of the bot's periodic background watchers."""
+
+from datetime import time
+from functools import partial
+from typing import Optional
+
+from aiogram import Bot
+
+from .alerts import token_watcher_tick, user_stats_watcher_tick
+from .cleanup import run_cleanup_tick
+from .config import SUBSCRIPTION_CHECK_INTERVAL
+from .digest import digest_watcher_tick
+from .engagement import engagement_watcher_tick
+from .messaging import RateLimiter
+from .outbox import dispatch_outbox, outbox_limiter
+from .reachability import reachability_watcher_tick
+from .reminders import reminder_watcher_tick
+from .settings import (
+    OUTBOX_POLL_INTERVAL,
+    REACHABILITY_FLUSH_INTERVAL,
+    WATCHER_TICK_BUDGET,
+)
+from .subscriptions import subscription_watcher_tick
+from .watchers import DailyAt, Every, WatcherRuntime
+
+
+def register_watchers(
+    runtime: WatcherRuntime, bot: Bot, *, limiter: Optional[RateLimiter] = None
+) -> WatcherRuntime:
+    """Register every background job on ``runtime``, sending through ``bot``.
+
+    ``limiter`` paces the outbox dispatcher, ``outbox_limiter`` by default.
+    """
+
+    runtime.register(
+        "subscription_watcher",
+        subscription_watcher_tick,
+        Every(SUBSCRIPTION_CHECK_INTERVAL),
+        jitter=60,
+        budget=WATCHER_TICK_BUDGET,
+    )
+    runtime.register("cleanup_watcher", run_cleanup_tick, Every(60), jitter=10)
+    runtime.register("reminder_watcher", reminder_watcher_tick, Every(60, align=True))
+    runtime.register(
+        "engagement_watcher",
+        engagement_watcher_tick,
+        Every(60),
+        jitter=10,
+        budget=WATCHER_TICK_BUDGET,
+    )
+    runtime.register(
+        "digest_watcher",
+        digest_watcher_tick,
+        Every(60),
+        jitter=10,
+        budget=WATCHER_TICK_BUDGET,
+    )
+    runtime.register(
+        "outbox_dispatcher",
+        partial(dispatch_outbox, bot, limiter=limiter or outbox_limiter),
+        Every(OUTBOX_POLL_INTERVAL),
+        budget=WATCHER_TICK_BUDGET,
+    )
+    runtime.register(
+        "reachability_watcher",
+        reachability_watcher_tick,
+        Every(REACHABILITY_FLUSH_INTERVAL),
+    )
+    runtime.register(
+        "token_watcher", token_watcher_tick, DailyAt(time()), immediate=False
+    )
+    runtime.register(
+        "user_stats_watcher", user_stats_watcher_tick, DailyAt(time()), immediate=False
+    )
+    return runtime
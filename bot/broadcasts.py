@@ -0,0 +1,420 @@
+"""Admin broadcasts that survive restarts.
+
+A broadcast is a ``Broadcast`` row. Recipients are the members of its
+``Segment`` (everyone by default), read in ``users.id`` order chunk by
+chunk. Each chunk is sent concurrently through a shared ``RateLimiter`` and
+the cursor and counters are committed after it. Jobs still ``running`` at
+startup are resumed from their cursor, so at most one chunk can be sent
+twice after a crash.
+
+A broadcast with ``local_time`` is released per UTC offset: recipients are
+bucketed by their reminder timezone and every bucket waits until it is that
+time locally, so the load is spread over the day. ``cursor_offset`` records
+the bucket being sent.
+
+Media broadcasts keep the ``file_id`` Telegram gave the admin's own message,
+so every recipient gets the file by reference and nothing is uploaded again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot, types
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .alerts import create_monitored_task
+from .database import Broadcast, ReminderSettings, SessionLocal, User
+from .logger import log
+from .messaging import (
+    RateLimiter,
+    background_sends,
+    call_with_retries,
+    send_with_retries,
+)
+from .segments import Segment, segment_query
+from .settings import (
+    BROADCAST_CHUNK_SIZE,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_DEFAULT_TIMEZONE,
+    BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_RELEASE_CHECK,
+    BROADCAST_SEND_RATE,
+)
+from .texts import (
+    BROADCAST_CANCELLED,
+    BROADCAST_FINISHED,
+    BROADCAST_PROGRESS,
+    BROADCAST_SCHEDULED_NOTE,
+    BTN_BROADCAST_CANCEL,
+)
+from .watchers import SystemClock, system_clock
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+broadcast_limiter = RateLimiter(BROADCAST_SEND_RATE)
+_tasks: Dict[int, asyncio.Task] = {}
+_cancel_requested: Set[int] = set()
+
+# {"type": "photo" | "video" | "document", "file_id": ...}
+Media = Dict[str, str]
+_MEDIA_SENDERS = {"photo": "send_photo", "video": "send_video", "document": "send_document"}
+_INPUT_MEDIA = {
+    "photo": types.InputMediaPhoto,
+    "video": types.InputMediaVideo,
+    "document": types.InputMediaDocument,
+}
+
+
+def media_from_message(message: types.Message) -> Optional[Media]:
+    """Return the photo, video or document of ``message`` by its ``file_id``."""
+
+    if message.photo:
+        return {"type": "photo", "file_id": message.photo[-1].file_id}
+    if message.video:
+        return {"type": "video", "file_id": message.video.file_id}
+    if message.document:
+        return {"type": "document", "file_id": message.document.file_id}
+    return None
+
+
+async def send_media(
+    bot: Bot,
+    chat_id: int,
+    media: List[Media],
+    *,
+    caption: str,
+    reply_markup: Optional[types.InlineKeyboardMarkup] = None,
+) -> Any:
+    """Send one file with ``caption`` or an album captioned on its first item.
+
+    Telegram does not attach keyboards to albums, so ``reply_markup`` only
+    applies to a single file.
+    """
+
+    if len(media) == 1:
+        send = getattr(bot, _MEDIA_SENDERS[media[0]["type"]])
+        return await send(
+            chat_id,
+            media[0]["file_id"],
+            caption=caption or None,
+            parse_mode="HTML",
+            reply_markup=reply_markup,
+        )
+    return await bot.send_media_group(
+        chat_id,
+        [
+            _INPUT_MEDIA[item["type"]](
+                media=item["file_id"],
+                caption=caption if index == 0 and caption else None,
+                parse_mode="HTML",
+            )
+            for index, item in enumerate(media)
+        ],
+    )
+
+
+def _offset():
+    return func.coalesce(ReminderSettings.timezone, BROADCAST_DEFAULT_TIMEZONE)
+
+
+def next_recipients(
+    session: Session,
+    after_id: int,
+    limit: int,
+    segment: Optional[Segment] = None,
+    now: Optional[datetime] = None,
+    offset: Optional[int] = None,
+) -> List[Tuple[int, int]]:
+    """Return the next ``(users.id, telegram_id)`` pairs after ``after_id``.
+
+    With ``offset`` only users in that UTC offset are returned.
+    """
+
+    query = segment_query(session, segment or Segment(), now or datetime.utcnow())
+    if offset is not None:
+        query = query.outerjoin(
+            ReminderSettings, ReminderSettings.user_id == User.id
+        ).filter(_offset() == offset)
+    return query.filter(User.id > after_id).order_by(User.id).limit(limit).all()
+
+
+def release_at(local_time: str, offset: int, start: datetime) -> datetime:
+    """First UTC moment from ``start`` on when it is ``local_time`` at ``offset``."""
+
+    hours, minutes = map(int, local_time.split(":"))
+    shift = timedelta(minutes=offset)
+    release = datetime.combine((start + shift).date(), time(hours, minutes)) - shift
+    if release < start:
+        release += timedelta(days=1)
+    return release
+
+
+def _release_key(local_time: str, offset: int, start: datetime) -> Tuple[datetime, int]:
+    return release_at(local_time, offset, start), offset
+
+
+def offset_buckets(
+    session: Session, segment: Segment, local_time: str, start: datetime
+) -> List[int]:
+    """UTC offsets of the segment's members in the order they are released."""
+
+    offsets = [
+        row[0]
+        for row in segment_query(session, segment, start)
+        .outerjoin(ReminderSettings, ReminderSettings.user_id == User.id)
+        .with_entities(_offset())
+        .distinct()
+    ]
+    return sorted(offsets, key=lambda offset: _release_key(local_time, offset, start))
+
+
+def create_broadcast(
+    session: Session,
+    admin_chat_id: int,
+    text: str,
+    reply_markup: Optional[types.InlineKeyboardMarkup] = None,
+    segment: Optional[Segment] = None,
+    media: Optional[List[Media]] = None,
+    local_time: Optional[str] = None,
+) -> Broadcast:
+    segment = segment or Segment()
+    now = datetime.utcnow()
+    job = Broadcast(
+        admin_chat_id=admin_chat_id,
+        text=text,
+        reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+        segment=segment.to_json(),
+        media=json.dumps(media) if media else None,
+        local_time=local_time,
+        status=RUNNING,
+        total=segment_query(session, segment, now).count(),
+        created_at=now,
+    )
+    session.add(job)
+    session.commit()
+    return job
+
+
+def progress_kb(broadcast_id: int) -> types.InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=BTN_BROADCAST_CANCEL, callback_data=f"admin:broadcast:cancel:{broadcast_id}"
+    )
+    return builder.as_markup()
+
+
+def progress_text(job: Broadcast) -> str:
+    template = {
+        RUNNING: BROADCAST_PROGRESS,
+        DONE: BROADCAST_FINISHED,
+        CANCELLED: BROADCAST_CANCELLED,
+    }[job.status]
+    text = template.format(
+        done=job.delivered + job.failed,
+        total=job.total,
+        delivered=job.delivered,
+        failed=job.failed,
+    )
+    if job.local_time and job.status == RUNNING:
+        text += BROADCAST_SCHEDULED_NOTE.format(time=job.local_time)
+    return text
+
+
+async def _show_progress(bot: Bot, job: Broadcast) -> None:
+    if not job.status_message_id:
+        return
+    try:
+        await bot.edit_message_text(
+            progress_text(job),
+            chat_id=job.admin_chat_id,
+            message_id=job.status_message_id,
+            reply_markup=progress_kb(job.id) if job.status == RUNNING else None,
+        )
+    except Exception as exc:  # pragma: no cover - depends on Telegram
+        log("broadcast", "failed to update progress of broadcast %s: %s", job.id, exc)
+
+
+async def _wait_for_release(broadcast_id: int, release: datetime, clock: SystemClock) -> bool:
+    """Sleep until ``release``; False if the broadcast is cancelled meanwhile."""
+
+    while True:
+        if broadcast_id in _cancel_requested:
+            return False
+        remaining = (release - clock.now()).total_seconds()
+        if remaining <= 0:
+            return True
+        await clock.sleep(min(remaining, BROADCAST_RELEASE_CHECK))
+
+
+async def run_broadcast(
+    bot: Bot,
+    broadcast_id: int,
+    *,
+    limiter: RateLimiter = broadcast_limiter,
+    chunk_size: int = BROADCAST_CHUNK_SIZE,
+    clock: SystemClock = system_clock,
+) -> Optional[Broadcast]:
+    """Send broadcast ``broadcast_id`` from its cursor until done or cancelled."""
+
+    session = SessionLocal()
+    try:
+        job = session.get(Broadcast, broadcast_id)
+        if job is None or job.status != RUNNING:
+            return job
+        markup = (
+            types.InlineKeyboardMarkup.model_validate_json(job.reply_markup)
+            if job.reply_markup
+            else None
+        )
+        text = job.text
+        media = json.loads(job.media) if job.media else None
+        # ages in the segment stay measured from the start, also after a resume
+        segment = Segment.from_json(job.segment)
+        started_at = job.created_at or clock.now()
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+        async def _deliver(chat_id: int) -> bool:
+            async with semaphore:
+                await limiter.wait(chat_id)
+                if media:
+                    return await call_with_retries(
+                        lambda: send_media(
+                            bot, chat_id, media, caption=text, reply_markup=markup
+                        ),
+                        chat_id,
+                        category="broadcast",
+                    )
+                return await send_with_retries(
+                    bot,
+                    chat_id,
+                    text=text,
+                    category="broadcast",
+                    parse_mode="HTML",
+                    reply_markup=markup,
+                )
+
+        local_time = job.local_time
+        if local_time:
+            buckets = offset_buckets(session, segment, local_time, started_at)
+            if job.cursor_offset is not None:
+                # skip the buckets released before the one that was being sent
+                current = _release_key(local_time, job.cursor_offset, started_at)
+                buckets = [
+                    offset
+                    for offset in buckets
+                    if _release_key(local_time, offset, started_at) >= current
+                ]
+        else:
+            buckets = [None]
+
+        log("broadcast", "broadcast %s running from user %s", job.id, job.cursor)
+        shown_at = clock.monotonic()
+        while True:
+            if not buckets:
+                job.status = DONE
+            else:
+                offset = buckets[0]
+                if offset != job.cursor_offset:
+                    job.cursor_offset, job.cursor = offset, 0
+                if local_time:
+                    release = release_at(local_time, offset, started_at)
+                    # a bucket can wait for most of a day, with no transaction open
+                    session.commit()
+                    if not await _wait_for_release(broadcast_id, release, clock):
+                        job.status = CANCELLED
+            if job.status == RUNNING:
+                rows = next_recipients(
+                    session, job.cursor, chunk_size, segment, started_at, offset
+                )
+                if not rows:
+                    buckets.pop(0)
+                    continue
+                # nothing stays locked while the chunk is on its way
+                session.commit()
+                results = await asyncio.gather(
+                    *(_deliver(telegram_id) for _, telegram_id in rows)
+                )
+                delivered = sum(results)
+                job.delivered += delivered
+                job.failed += len(results) - delivered
+                job.cursor = rows[-1][0]
+                if broadcast_id in _cancel_requested:
+                    job.status = CANCELLED
+            if job.status != RUNNING:
+                job.finished_at = clock.now()
+            session.commit()
+            if job.status != RUNNING:
+                break
+            if clock.monotonic() - shown_at >= BROADCAST_PROGRESS_INTERVAL:
+                shown_at = clock.monotonic()
+                await _show_progress(bot, job)
+        _cancel_requested.discard(broadcast_id)
+        log(
+            "broadcast",
+            "broadcast %s %s: delivered %s of %s, failed %s",
+            job.id,
+            job.status,
+            job.delivered,
+            job.total,
+            job.failed,
+        )
+        await _show_progress(bot, job)
+        return job
+    finally:
+        session.close()
+
+
+def start_broadcast(bot: Bot, broadcast_id: int) -> asyncio.Task:
+    task = _tasks.get(broadcast_id)
+    if task is None or task.done():
+        # the task copies the context, so all of its sends are background ones
+        with background_sends():
+            task = create_monitored_task(
+                run_broadcast(bot, broadcast_id), name=f"broadcast_{broadcast_id}"
+            )
+        _tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: _tasks.pop(broadcast_id, None))
+    return task
+
+
+def cancel_broadcast(broadcast_id: int) -> bool:
+    """Stop a broadcast after its current chunk; False if it is not running."""
+
+    if broadcast_id in _tasks:
+        _cancel_requested.add(broadcast_id)
+        return True
+    session = SessionLocal()
+    try:
+        job = session.get(Broadcast, broadcast_id)
+        if job is None or job.status != RUNNING:
+            return False
+        job.status = CANCELLED
+        job.finished_at = datetime.utcnow()
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+
+def resume_broadcasts(bot: Bot) -> List[asyncio.Task]:
+    """Restart broadcasts left running by a previous process."""
+
+    session = SessionLocal()
+    try:
+        ids = [
+            row.id
+            for row in session.query(Broadcast.id).filter(Broadcast.status == RUNNING)
+        ]
+    finally:
+        session.close()
+    for broadcast_id in ids:
+        log("broadcast", "resuming broadcast %s", broadcast_id)
+    return [start_broadcast(bot, broadcast_id) for broadcast_id in ids]
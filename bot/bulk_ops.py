@@ -0,0 +1,253 @@
+"""Set-based subscription changes for admin operations over many users."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional, Sequence
+
+from sqlalchemy import and_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .database import NotificationStatus, Subscription, User
+from .logger import log
+from .messaging import ProgressCallback
+from .settings import BULK_CHUNK_SIZE
+from .subscriptions import PAID_LIMIT
+
+
+# (user_id, telegram_id, grade, trial, period_end) -> new subscription values
+RowUpdate = Callable[[tuple], dict]
+
+_NOTIFICATIONS_RESET = {
+    NotificationStatus.notified_7d: False,
+    NotificationStatus.notified_3d: False,
+    NotificationStatus.notified_1d: False,
+    NotificationStatus.notified_0d: False,
+}
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a chunked bulk update."""
+
+    total: int
+    updated: int = 0
+    failed: list[int] = field(default_factory=list)
+
+
+def _days_filter():
+    return and_(Subscription.grade.in_(["light", "pro"]), Subscription.trial.isnot(True))
+
+
+def count_days_targets(session: Session) -> int:
+    """Return how many subscriptions ``bulk_add_subscription_days`` would extend."""
+
+    return session.query(Subscription).filter(_days_filter()).count()
+
+
+def count_trial_targets(session: Session) -> int:
+    """Return how many subscriptions ``bulk_start_trial`` would switch to a trial."""
+
+    return session.query(Subscription).count()
+
+
+def _apply_chunk(
+    session: Session,
+    rows: Sequence[tuple],
+    make_update: RowUpdate,
+    reset_notifications: bool,
+) -> None:
+    mappings = [{"user_id": row[0], **make_update(row)} for row in rows]
+    session.execute(update(Subscription), mappings)
+    if reset_notifications:
+        session.query(NotificationStatus).filter(
+            NotificationStatus.user_id.in_([row[0] for row in rows])
+        ).update(_NOTIFICATIONS_RESET, synchronize_session=False)
+
+
+async def _run_chunked(
+    session: Session,
+    criteria: Iterable,
+    make_update: RowUpdate,
+    *,
+    category: str,
+    reset_notifications: bool = True,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> BulkResult:
+    """Update matching subscriptions chunk by chunk, one transaction per chunk.
+
+    A chunk that violates a constraint is rolled back and replayed row by
+    row so that only the offending users end up in ``failed``.
+    """
+
+    criteria = list(criteria)
+    total = session.query(Subscription).filter(*criteria).count()
+    result = BulkResult(total=total)
+    last_id = 0
+    done = 0
+    while True:
+        rows = (
+            session.query(
+                Subscription.user_id,
+                User.telegram_id,
+                Subscription.grade,
+                Subscription.trial,
+                Subscription.period_end,
+            )
+            .join(User, User.id == Subscription.user_id)
+            .filter(Subscription.user_id > last_id, *criteria)
+            .order_by(Subscription.user_id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        try:
+            _apply_chunk(session, rows, make_update, reset_notifications)
+            session.commit()
+            result.updated += len(rows)
+        except SQLAlchemyError as exc:
+            session.rollback()
+            log(category, "chunk after user %s failed, retrying rows: %s", rows[0][0], exc)
+            for row in rows:
+                try:
+                    _apply_chunk(session, [row], make_update, reset_notifications)
+                    session.commit()
+                    result.updated += 1
+                except SQLAlchemyError as row_exc:
+                    session.rollback()
+                    result.failed.append(row[1])
+                    log(category, "failed to update %s: %s", row[1], row_exc)
+        done += len(rows)
+        if progress:
+            await progress(done, total)
+    return result
+
+
+async def bulk_add_subscription_days(
+    session: Session,
+    days: int,
+    *,
+    now: Optional[datetime] = None,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> BulkResult:
+    """Set-based equivalent of ``add_subscription_days`` for every paid user."""
+
+    now = now or datetime.utcnow()
+    extra = timedelta(days=days)
+
+    def _update(row: tuple) -> dict:
+        period_end = row[4]
+        if period_end and period_end > now:
+            return {"period_end": period_end + extra}
+        return {"period_end": now + extra}
+
+    result = await _run_chunked(
+        session,
+        [_days_filter()],
+        _update,
+        category="days",
+        reset_notifications=False,
+        chunk_size=chunk_size,
+        progress=progress,
+    )
+    log("days", "added %s days to %s users (failed=%s)", days, result.updated, len(result.failed))
+    return result
+
+
+async def bulk_start_trial(
+    session: Session,
+    days: int,
+    grade: str,
+    *,
+    now: Optional[datetime] = None,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> BulkResult:
+    """Set-based equivalent of ``start_trial`` for every user."""
+
+    now = now or datetime.utcnow()
+    extra = timedelta(days=days)
+
+    def _update(row: tuple) -> dict:
+        current_grade, trial, period_end = row[2], row[3], row[4]
+        values = {
+            "grade": f"{grade}_promo",
+            "period_start": now,
+            "trial_end": now + extra,
+            "request_limit": PAID_LIMIT,
+            "requests_used": 0,
+            "daily_used": 0,
+            "daily_start": now,
+            "trial": True,
+            "trial_used": True,
+            "resume_grade": None,
+            "resume_period_end": None,
+        }
+        if current_grade in {"light", "pro"} and not trial:
+            values["resume_grade"] = current_grade
+            values["resume_period_end"] = (period_end or now) + extra
+        return values
+
+    result = await _run_chunked(
+        session,
+        [],
+        _update,
+        category="trial",
+        chunk_size=chunk_size,
+        progress=progress,
+    )
+    log(
+        "trial",
+        "started %s-day %s trial for all users: success=%s, failed=%s",
+        days,
+        grade,
+        result.updated,
+        len(result.failed),
+    )
+    return result
+
+
+async def bulk_set_grade(
+    session: Session,
+    user_ids: Sequence[int],
+    grade: str,
+    days: int,
+    *,
+    now: Optional[datetime] = None,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> BulkResult:
+    """Activate ``grade`` for ``days`` on the given users, ending any trial."""
+
+    now = now or datetime.utcnow()
+
+    def _update(row: tuple) -> dict:
+        values = {
+            "grade": grade,
+            "request_limit": PAID_LIMIT,
+            "requests_used": 0,
+            "period_start": now,
+            "period_end": now + timedelta(days=days),
+        }
+        if row[3]:
+            values.update(
+                trial=False, trial_end=None, resume_grade=None, resume_period_end=None
+            )
+        return values
+
+    result = await _run_chunked(
+        session,
+        [Subscription.user_id.in_(list(user_ids))],
+        _update,
+        category="grade",
+        chunk_size=chunk_size,
+        progress=progress,
+    )
+    log("grade", "set %s grade for %s days to %s users", grade, days, result.updated)
+    return result
@@ -0,0 +1,108 @@
+"""Answer callback queries before their handlers run.
+
+Telegram shows a spinner on the pressed button until the bot answers the
+callback query, and handlers answer at the end, after database work, GPT or
+FatSecret calls and edits. ``EarlyAnswerMiddleware`` answers each query as its
+handler starts. A query can be answered once, so the handler's own
+``query.answer()`` is then completed by ``SkipRepeatedAnswers`` on the bot
+session without a request.
+
+Handlers that answer with text, an alert or a toast, are registered with
+``flags={"alert": True}`` and answer themselves, however long they take. If
+such a handler returns without answering, the query is answered then.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from aiogram import BaseMiddleware, Bot, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.exceptions import TelegramAPIError
+from aiogram.methods import AnswerCallbackQuery
+
+from .logger import log
+
+
+Handler = Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+# callback queries being handled -> whether they were answered already
+_in_flight: Dict[str, bool] = {}
+# early answers still in progress
+_answering: Set[asyncio.Task] = set()
+
+
+async def _answer(query: types.CallbackQuery) -> None:
+    try:
+        await query.answer()
+    except TelegramAPIError as exc:
+        log("telegram", "cannot answer callback %s: %s", query.id, exc)
+
+
+def _finish(query_id: str, task: asyncio.Task) -> None:
+    _answering.discard(task)
+    _in_flight.pop(query_id, None)
+
+
+class EarlyAnswerMiddleware(BaseMiddleware):
+    """Stop the button spinner before the callback handler does its work.
+
+    Installed as an inner middleware, so the handler's flags are known.
+    """
+
+    async def __call__(
+        self,
+        handler: Handler,
+        event: types.TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, types.CallbackQuery):
+            return await handler(event, data)
+
+        _in_flight[event.id] = False
+        early = None
+        if not get_flag(data, "alert"):
+            early = asyncio.create_task(_answer(event))
+            _answering.add(early)
+        try:
+            return await handler(event, data)
+        finally:
+            if early is None:
+                if not _in_flight[event.id]:
+                    await _answer(event)
+                _in_flight.pop(event.id, None)
+            else:
+                # the handler's own answer must stay a repeat until ours went out
+                early.add_done_callback(lambda task: _finish(event.id, task))
+
+
+class SkipRepeatedAnswers(BaseRequestMiddleware):
+    """Complete a second answer to a callback query without calling Telegram."""
+
+    def __init__(self) -> None:
+        self.skipped = 0
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if (
+            not isinstance(method, AnswerCallbackQuery)
+            or method.callback_query_id not in _in_flight
+        ):
+            return await make_request(bot, method)
+        if _in_flight[method.callback_query_id]:
+            self.skipped += 1
+            if method.text or method.url:
+                # Telegram would refuse it as well
+                log(
+                    "telegram",
+                    "callback %s already answered, dropped: %s",
+                    method.callback_query_id,
+                    method.text or method.url,
+                )
+            return True
+        _in_flight[method.callback_query_id] = True
+        return await make_request(bot, method)
+
+
+skip_repeated_answers = SkipRepeatedAnswers()
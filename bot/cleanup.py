@@ -1,22 +1,24 @@
-import asyncio
 import os
 import tempfile
 import time
 from typing import Optional
 
 from .storage import pending_meals, remove_photo_if_unused
+from .throttling import prune_idle_buckets
+from .watchers import TickContext
 
 PREFIX = "diet_photo_"
 RETENTION_DAYS = 7
 STALE_PENDING_SECONDS = 3600
 
 
-def run_cleanup_cycle(*, now: Optional[float] = None, temp_dir: Optional[str] = None) -> None:
-    """Perform a single cleanup pass over temp files and pending meals."""
+def run_cleanup_cycle(*, now: Optional[float] = None, temp_dir: Optional[str] = None) -> int:
+    """Perform a single cleanup pass; return how many files and meals were removed."""
 
     current_time = now if now is not None else time.time()
     cutoff = current_time - RETENTION_DAYS * 24 * 3600
     directory = temp_dir or tempfile.gettempdir()
+    removed = 0
 
     for name in os.listdir(directory):
         if not name.startswith(PREFIX):
@@ -25,25 +27,23 @@ def run_cleanup_cycle(*, now: Optional[float] = None, temp_dir: Optional[str] =
         try:
             if os.path.getmtime(path) < cutoff:
                 os.remove(path)
+                removed += 1
         except FileNotFoundError:
             pass
         except Exception:
             pass
 
     stale_cutoff = current_time - STALE_PENDING_SECONDS
-    for meal_id, meal in list(pending_meals.items()):
-        timestamp = meal.get("timestamp")
+    for meal_id, meal in pending_meals.pop_expired(stale_cutoff):
         path = meal.get("photo_path")
-        if timestamp and timestamp < stale_cutoff:
-            if path:
-                remove_photo_if_unused(path, ignore_id=meal_id)
-            pending_meals.pop(meal_id, None)
+        if path:
+            remove_photo_if_unused(path, ignore_id=meal_id)
+        pending_meals.pop(meal_id, None)
+        removed += 1
 
+    prune_idle_buckets()
+    return removed
 
-def cleanup_watcher(check_interval: int = 60):
-    async def _cleanup():
-        while True:
-            run_cleanup_cycle()
-            await asyncio.sleep(check_interval)
 
-    return _cleanup
+async def run_cleanup_tick(ctx: TickContext) -> None:
+    await ctx.processed(run_cleanup_cycle(now=ctx.timestamp))
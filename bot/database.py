@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import (
     create_engine,
     Column,
@@ -9,8 +9,10 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Boolean,
+    Index,
     text,  # for raw SQL migrations
     inspect,
+    func,
 )
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 from typing import Optional
@@ -51,6 +53,18 @@ def _ensure_columns():
             )
         if "referrer_id" not in existing:
             conn.execute(text("ALTER TABLE users ADD COLUMN referrer_id BIGINT"))
+        if "meals_count" not in existing:
+            conn.execute(text("ALTER TABLE users ADD COLUMN meals_count INTEGER DEFAULT 0"))
+        if "last_meal_at" not in existing:
+            conn.execute(text("ALTER TABLE users ADD COLUMN last_meal_at TIMESTAMP"))
+        if "first_request_at" not in existing:
+            conn.execute(text("ALTER TABLE users ADD COLUMN first_request_at TIMESTAMP"))
+        if "unreachable_at" not in existing:
+            conn.execute(text("ALTER TABLE users ADD COLUMN unreachable_at TIMESTAMP"))
+        if "unreachable_reason" not in existing:
+            conn.execute(text("ALTER TABLE users ADD COLUMN unreachable_reason VARCHAR"))
+    # filled once the subscriptions columns it reads exist
+    backfill_counters = "meals_count" not in existing
 
     existing = _column_names("meals")
     with engine.begin() as conn:
@@ -69,6 +83,16 @@ def _ensure_columns():
                     f"ALTER TABLE subscriptions ADD COLUMN goal_trial_notified BOOLEAN DEFAULT {bool_default}"
                 )
             )
+        if "paid_until" not in existing:
+            conn.execute(text("ALTER TABLE subscriptions ADD COLUMN paid_until TIMESTAMP"))
+    if "paid_until" not in existing:
+        session = SessionLocal()
+        backfill_paid_until(session)
+        session.close()
+    if backfill_counters:
+        session = SessionLocal()
+        backfill_activity_counters(session)
+        session.close()
 
     existing = _column_names("engagement_status")
     with engine.begin() as conn:
@@ -94,6 +118,42 @@ def _ensure_columns():
         if "reactivated_at" not in existing:
             conn.execute(text("ALTER TABLE goals ADD COLUMN reactivated_at TIMESTAMP"))
 
+    existing = _column_names("reminders")
+    with engine.begin() as conn:
+        if "last_digest" not in existing:
+            conn.execute(text("ALTER TABLE reminders ADD COLUMN last_digest TIMESTAMP"))
+
+    existing = _column_names("broadcasts")
+    with engine.begin() as conn:
+        if "segment" not in existing:
+            conn.execute(text("ALTER TABLE broadcasts ADD COLUMN segment VARCHAR"))
+        if "media" not in existing:
+            conn.execute(text("ALTER TABLE broadcasts ADD COLUMN media VARCHAR"))
+        if "local_time" not in existing:
+            conn.execute(text("ALTER TABLE broadcasts ADD COLUMN local_time VARCHAR"))
+        if "cursor_offset" not in existing:
+            conn.execute(text("ALTER TABLE broadcasts ADD COLUMN cursor_offset INTEGER"))
+
+
+def _ensure_indexes():
+    """Create indexes used by the watcher queries on existing databases."""
+    with engine.begin() as conn:
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS ix_users_created_at ON users (created_at)")
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_subscriptions_last_request "
+                "ON subscriptions (last_request)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_meals_user_timestamp "
+                "ON meals (user_id, timestamp)"
+            )
+        )
+
 
 def _drop_request_logs():
     """Remove legacy request_logs table if it still exists."""
@@ -105,10 +165,19 @@ class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
     telegram_id = Column(BigInteger, unique=True, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     blocked = Column(Boolean, default=False)
     left_bot = Column(Boolean, default=False)
+    # set together with left_bot when a send failed for good (blocked bot,
+    # deactivated account, chat not found); cleared when the user returns
+    unreachable_at = Column(DateTime, nullable=True)
+    unreachable_reason = Column(String, nullable=True)
     referrer_id = Column(BigInteger, nullable=True)
+    # denormalized activity counters, kept in sync by record_meal_saved
+    # and process_request_events
+    meals_count = Column(Integer, default=0)
+    last_meal_at = Column(DateTime, nullable=True)
+    first_request_at = Column(DateTime, nullable=True)
 
     subscription = relationship(
         'Subscription',
@@ -190,6 +259,7 @@ class User(Base):
     last_request = property(lambda self: self._sub().last_request, lambda self, v: setattr(self._sub(), 'last_request', v))
     trial = property(lambda self: self._sub().trial, lambda self, v: setattr(self._sub(), 'trial', v))
     trial_used = property(lambda self: self._sub().trial_used, lambda self, v: setattr(self._sub(), 'trial_used', v))
+    paid_until = property(lambda self: self._sub().paid_until, lambda self, v: setattr(self._sub(), 'paid_until', v))
     goal_trial_start = property(
         lambda self: self._sub().goal_trial_start,
         lambda self, v: setattr(self._sub(), 'goal_trial_start', v),
@@ -233,11 +303,13 @@ class Subscription(Base):
     resume_period_end = Column(DateTime, nullable=True)
     daily_used = Column(Integer, default=0)
     daily_start = Column(DateTime, default=datetime.utcnow)
-    last_request = Column(DateTime, nullable=True)
+    last_request = Column(DateTime, nullable=True, index=True)
     trial = Column(Boolean, default=False)
     trial_used = Column(Boolean, default=False)
     goal_trial_start = Column(DateTime, nullable=True)
     goal_trial_notified = Column(Boolean, default=False)
+    # end of the paid coverage chained over all payments, see process_payment_success
+    paid_until = Column(DateTime, nullable=True)
 
     user = relationship('User', back_populates='subscription')
 
@@ -293,6 +365,7 @@ class ReminderSettings(Base):
     last_morning = Column(DateTime, nullable=True)
     last_day = Column(DateTime, nullable=True)
     last_evening = Column(DateTime, nullable=True)
+    last_digest = Column(DateTime, nullable=True)
 
     user = relationship('User', back_populates='reminders')
 
@@ -335,6 +408,8 @@ class Meal(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     user = relationship('User', back_populates='meals')
 
+    __table_args__ = (Index("ix_meals_user_timestamp", "user_id", "timestamp"),)
+
 
 class Payment(Base):
     """Record of a successful subscription purchase."""
@@ -359,6 +434,64 @@ class Comment(Base):
     user = relationship('User')
 
 
+class Broadcast(Base):
+    """Admin broadcast job; ``cursor`` is the last ``users.id`` already sent to."""
+
+    __tablename__ = 'broadcasts'
+
+    id = Column(Integer, primary_key=True)
+    admin_chat_id = Column(BigInteger)
+    status_message_id = Column(Integer, nullable=True)
+    text = Column(String)
+    reply_markup = Column(String, nullable=True)
+    # JSON of the audience ``Segment``; NULL sends to everyone
+    segment = Column(String, nullable=True)
+    # JSON list of {"type", "file_id"}; ``text`` is then the caption
+    media = Column(String, nullable=True)
+    # "HH:MM" in every recipient's own timezone; NULL sends right away
+    local_time = Column(String, nullable=True)
+    status = Column(String, default='running', index=True)
+    # UTC offset of the timezone bucket ``cursor`` belongs to
+    cursor_offset = Column(Integer, nullable=True)
+    cursor = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    delivered = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class Outbox(Base):
+    """Notification waiting for delivery by the outbox dispatcher.
+
+    ``on_delivered`` is a JSON list of column updates (see ``bot.outbox.Mark``)
+    applied once Telegram accepts the message.
+    """
+
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        Index("ix_outbox_due", "status", "priority", "not_before"),
+        Index("ix_outbox_dedup_key", "dedup_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger)
+    text = Column(String)
+    reply_markup = Column(String, nullable=True)
+    parse_mode = Column(String, nullable=True)
+    reply_to_message_id = Column(Integer, nullable=True)
+    category = Column(String, default='notification')
+    event = Column(String, nullable=True)
+    dedup_key = Column(String, nullable=True)
+    priority = Column(Integer, default=0)
+    not_before = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, default=0)
+    status = Column(String, default='pending')
+    on_delivered = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
 class Option(Base):
     __tablename__ = 'options'
 
@@ -399,6 +532,92 @@ def set_option(key: str, value: str) -> None:
     session.close()
 
 
+def record_meal_saved(user: User, meal: Meal) -> None:
+    """Update activity counters for a meal added in the current transaction."""
+    user.meals_count = (user.meals_count or 0) + 1
+    timestamp = meal.timestamp or datetime.utcnow()
+    if user.last_meal_at is None or timestamp > user.last_meal_at:
+        user.last_meal_at = timestamp
+
+
+def backfill_activity_counters(session) -> int:
+    """Recompute meals_count, last_meal_at and first_request_at from meals.
+
+    Users without meals fall back to ``last_request`` for ``first_request_at``
+    since individual requests are not logged. Returns the number of users updated.
+    """
+    meal_stats = (
+        session.query(
+            Meal.user_id.label("user_id"),
+            func.count(Meal.id).label("meals"),
+            func.min(Meal.timestamp).label("first_meal"),
+            func.max(Meal.timestamp).label("last_meal"),
+        )
+        .group_by(Meal.user_id)
+        .subquery()
+    )
+    rows = (
+        session.query(
+            User.id,
+            meal_stats.c.meals,
+            meal_stats.c.first_meal,
+            meal_stats.c.last_meal,
+            Subscription.last_request,
+            Subscription.requests_total,
+        )
+        .outerjoin(meal_stats, meal_stats.c.user_id == User.id)
+        .outerjoin(Subscription, Subscription.user_id == User.id)
+        .all()
+    )
+    updates = []
+    for user_id, meals, first_meal, last_meal, last_request, total in rows:
+        first_request = None
+        if total:
+            candidates = [ts for ts in (first_meal, last_request) if ts]
+            first_request = min(candidates) if candidates else None
+        updates.append(
+            {
+                "id": user_id,
+                "meals_count": meals or 0,
+                "last_meal_at": last_meal,
+                "first_request_at": first_request,
+            }
+        )
+    if updates:
+        session.bulk_update_mappings(User, updates)
+    session.commit()
+    return len(updates)
+
+
+def backfill_paid_until(session) -> int:
+    """Recompute subscriptions.paid_until by chaining each user's payments.
+
+    Every payment covers 30 days per month starting from its timestamp or
+    from the end of the previous coverage, whichever is later.
+    """
+    payments = (
+        session.query(Payment.user_id, Payment.timestamp, Payment.months)
+        .order_by(Payment.user_id, Payment.timestamp)
+        .all()
+    )
+    paid_until: dict[int, datetime] = {}
+    for user_id, timestamp, months in payments:
+        months = months if months and months > 0 else 1
+        start = timestamp
+        previous = paid_until.get(user_id)
+        if previous and previous > start:
+            start = previous
+        paid_until[user_id] = start + timedelta(days=30 * months)
+    updates = [
+        {"user_id": user_id, "paid_until": value}
+        for user_id, value in paid_until.items()
+    ]
+    if updates:
+        session.bulk_update_mappings(Subscription, updates)
+    session.commit()
+    return len(updates)
+
+
 def _ensure_options():
     defaults = {
         "pay_card": "1",
@@ -410,11 +629,15 @@ def _ensure_options():
         "feat_settings": "1",
         "feat_reminders": "1",
         "feat_goals": "1",
+        "feat_digest": "1",
         "feat_referral": "1",
         "trial_pro_enabled": "0",
         "trial_pro_days": "0",
         "trial_light_enabled": "0",
         "trial_light_days": "0",
+        "goal_ai_free": "0",
+        "goal_ai_light": "0",
+        "goal_ai_pro": "1",
     }
     session = SessionLocal()
     for k, v in defaults.items():
@@ -451,6 +674,7 @@ def _ensure_cascades():
 
 Base.metadata.create_all(engine)
 _ensure_columns()
+_ensure_indexes()
 _drop_request_logs()
 _ensure_options()
 _ensure_cascades()
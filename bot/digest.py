@@ -0,0 +1,248 @@
+"""Weekly nutrition digest sent on Sunday evening in each user's local time.
+
+Every few minutes the watcher plans the users whose local time just entered
+the digest window: their daily totals come from one grouped query per chunk
+of users, texts are rendered in memory and put in the outbox with a due
+time spread over the evening.
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Integer, cast, func, or_
+
+from .database import Goal, Meal, ReminderSettings, SessionLocal, User, get_option_bool
+from .goal_templates import Macros, format_macro
+from .logger import log
+from .outbox import PRIORITY_BULK, Mark, OutboxMessage, enqueue_many
+from .settings import (
+    DIGEST_CHUNK_SIZE,
+    DIGEST_LOCAL_HOUR,
+    DIGEST_PLAN_MINUTES,
+    DIGEST_SPREAD_MINUTES,
+    DIGEST_STREAK_DAYS,
+    DIGEST_WINDOW_MINUTES,
+)
+from .texts import WEEKDAY_NAMES, WEEKLY_DIGEST
+from .utils import plural_ru_day
+from .watchers import TickContext
+
+SUNDAY = 6
+# UTC offsets in minutes a user can have
+_MIN_OFFSET = -12 * 60
+_MAX_OFFSET = 14 * 60
+_EPOCH = date(1970, 1, 1)
+
+# users handled in the current Sunday window, including those without a
+# digest, so they are not aggregated again; cleared outside the window
+_planned: Set[int] = set()
+
+
+def digest_offsets(now: datetime) -> List[Tuple[int, int]]:
+    """Return ``[low, high)`` UTC offsets whose local time is in the digest window."""
+
+    ranges = []
+    for shift in (-1, 0, 1):
+        day = now.date() + timedelta(days=shift)
+        if day.weekday() != SUNDAY:
+            continue
+        start = datetime.combine(day, time(DIGEST_LOCAL_HOUR))
+        end = start + timedelta(minutes=DIGEST_WINDOW_MINUTES)
+        low = max(math.ceil((start - now).total_seconds() / 60), _MIN_OFFSET)
+        high = min(math.ceil((end - now).total_seconds() / 60), _MAX_OFFSET + 1)
+        if low < high:
+            ranges.append((low, high))
+    return ranges
+
+
+def _local_day(session):
+    """SQL expression for the meal's local day as days since 1970-01-01."""
+
+    offset = func.coalesce(ReminderSettings.timezone, 0) * 60
+    if session.get_bind().dialect.name == "postgresql":
+        return cast(func.floor((func.extract("epoch", Meal.timestamp) + offset) / 86400), Integer)
+    return (cast(func.strftime("%s", Meal.timestamp), Integer) + offset) // 86400
+
+
+def daily_totals(
+    session, user_ids: List[int], now: datetime
+) -> Dict[int, Dict[date, Macros]]:
+    """Sum meals per user and local day over the streak window in one query."""
+
+    local_day = _local_day(session).label("local_day")
+    rows = (
+        session.query(
+            Meal.user_id,
+            local_day,
+            func.sum(Meal.calories),
+            func.sum(Meal.protein),
+            func.sum(Meal.fat),
+            func.sum(Meal.carbs),
+        )
+        .join(ReminderSettings, ReminderSettings.user_id == Meal.user_id)
+        .filter(
+            Meal.user_id.in_(user_ids),
+            Meal.timestamp >= now - timedelta(days=DIGEST_STREAK_DAYS + 1),
+            Meal.timestamp < now,
+        )
+        .group_by(Meal.user_id, local_day)
+        .all()
+    )
+    totals: Dict[int, Dict[date, Macros]] = {}
+    for user_id, day, cal, prot, fat, carb in rows:
+        totals.setdefault(user_id, {})[_EPOCH + timedelta(days=int(day))] = (
+            float(cal or 0),
+            float(prot or 0),
+            float(fat or 0),
+            float(carb or 0),
+        )
+    return totals
+
+
+def _streak(days: Dict[date, Macros], today: date) -> int:
+    current = today if today in days else today - timedelta(days=1)
+    streak = 0
+    while current in days:
+        streak += 1
+        current -= timedelta(days=1)
+    return streak
+
+
+def render_digest(plan: Macros, days: Dict[date, Macros], today: date) -> Optional[str]:
+    """Return the digest for the week ending ``today`` or None without meals."""
+
+    week = [today - timedelta(days=offset) for offset in range(6, -1, -1)]
+    logged = [(day, days[day]) for day in week if day in days]
+    if not logged:
+        return None
+    average = [sum(totals[i] for _, totals in logged) / len(logged) for i in range(4)]
+    target = plan[0]
+    best_day, best = min(logged, key=lambda item: abs(item[1][0] - target))
+    worst_day, worst = max(logged, key=lambda item: abs(item[1][0] - target))
+    streak = _streak(days, today)
+    return WEEKLY_DIGEST.format(
+        cal=format_macro(round(average[0])),
+        cal_goal=format_macro(plan[0]),
+        p=format_macro(round(average[1])),
+        p_goal=format_macro(plan[1]),
+        f=format_macro(round(average[2])),
+        f_goal=format_macro(plan[2]),
+        c=format_macro(round(average[3])),
+        c_goal=format_macro(plan[3]),
+        logged=len(logged),
+        best_day=WEEKDAY_NAMES[best_day.weekday()],
+        best_cal=format_macro(round(best[0])),
+        worst_day=WEEKDAY_NAMES[worst_day.weekday()],
+        worst_cal=format_macro(round(worst[0])),
+        streak=streak,
+        streak_word=plural_ru_day(streak),
+    )
+
+
+def _due_at(user_id: int, timezone: int, now: datetime) -> datetime:
+    """Spread digests over the first ``DIGEST_SPREAD_MINUTES`` of the window."""
+
+    offset = timedelta(minutes=timezone)
+    local_start = datetime.combine((now + offset).date(), time(DIGEST_LOCAL_HOUR))
+    spread = timedelta(seconds=user_id * 7919 % (DIGEST_SPREAD_MINUTES * 60))
+    return max(local_start - offset + spread, now)
+
+
+def _candidates(session, ranges, now: datetime, after_id: int):
+    timezone = func.coalesce(ReminderSettings.timezone, 0)
+    return (
+        session.query(
+            User.id,
+            User.telegram_id,
+            timezone,
+            Goal.calories,
+            Goal.protein,
+            Goal.fat,
+            Goal.carbs,
+        )
+        .join(Goal, Goal.user_id == User.id)
+        .join(ReminderSettings, ReminderSettings.user_id == User.id)
+        .filter(
+            User.id > after_id,
+            User.blocked.isnot(True),
+            User.left_bot.isnot(True),
+            Goal.calories > 0,
+            or_(*[timezone.between(low, high - 1) for low, high in ranges]),
+            or_(
+                ReminderSettings.last_digest.is_(None),
+                ReminderSettings.last_digest < now - timedelta(days=6),
+            ),
+        )
+        .order_by(User.id)
+        .limit(DIGEST_CHUNK_SIZE)
+        .all()
+    )
+
+
+async def plan_digests(session, now: datetime, ctx: TickContext) -> int:
+    """Render and queue digests for users that entered the window, chunk by chunk."""
+
+    ranges = digest_offsets(now)
+    if not ranges:
+        _planned.clear()
+        return 0
+    queued = 0
+    after_id = ctx.state.pop("digest_after_id", 0)
+    while True:
+        rows = _candidates(session, ranges, now, after_id)
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        fresh = [row for row in rows if row[0] not in _planned]
+        totals = daily_totals(session, [row[0] for row in fresh], now) if fresh else {}
+        messages = []
+        for user_id, telegram_id, timezone, *plan in fresh:
+            _planned.add(user_id)
+            today = (now + timedelta(minutes=timezone)).date()
+            text = render_digest(
+                tuple(float(value or 0) for value in plan), totals.get(user_id, {}), today
+            )
+            if text:
+                messages.append(
+                    OutboxMessage(
+                        telegram_id,
+                        text,
+                        "weekly digest",
+                        priority=PRIORITY_BULK,
+                        dedup_key=f"weekly digest:{user_id}:{today}",
+                        not_before=_due_at(user_id, timezone, now),
+                        on_delivered=[Mark(ReminderSettings, user_id, {"last_digest": now})],
+                    )
+                )
+        queued += enqueue_many(session, messages, now)
+        session.commit()
+        await ctx.processed(len(fresh))
+        if ctx.out_of_time():
+            ctx.state["digest_after_id"] = after_id
+            ctx.defer()
+            break
+    if queued:
+        log("notification", "queued %s weekly digests", queued)
+    return queued
+
+
+async def digest_watcher_tick(ctx: TickContext) -> None:
+    if not get_option_bool("feat_digest"):
+        return
+    planned_at = ctx.state.get("digest_planned_at")
+    if (
+        "digest_after_id" not in ctx.state
+        and planned_at is not None
+        and ctx.now - planned_at < timedelta(minutes=DIGEST_PLAN_MINUTES)
+    ):
+        return
+    session = SessionLocal()
+    try:
+        await plan_digests(session, ctx.now, ctx)
+    finally:
+        session.close()
+    if not ctx.deferred:
+        ctx.state["digest_planned_at"] = ctx.now
@@ -2,12 +2,15 @@
 
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Sequence
 
+from sqlalchemy import and_, case, false, func, literal, not_, or_
 from sqlalchemy.orm import Session
 
-from .database import Payment, User
+from .database import EngagementStatus, Payment, Subscription, User
+from .outbox import PRIORITY_BULK, Mark, OutboxMessage, enqueue_many
 
 
 def determine_discount_type(
@@ -80,3 +83,137 @@ def determine_discount_type(
         return None
     return "return"
 
+
+@dataclass
+class DiscountRecipient:
+    user_id: int
+    telegram_id: int
+    discount_type: str
+    has_engagement: bool
+
+
+def plan_discount_campaign(
+    session: Session, decision_time: datetime
+) -> list[DiscountRecipient]:
+    """Return all free users eligible for a discount in a single query.
+
+    Mirrors :func:`determine_discount_type` with ``respect_cooldown`` and
+    ``skip_inactive`` enabled, but relies on ``Subscription.paid_until``
+    instead of walking each user's payments.
+    """
+
+    lapsed_before = decision_time - timedelta(days=3)
+    cooldown_since = decision_time - timedelta(days=30)
+    discount_type = case(
+        (Subscription.paid_until.is_(None), literal("new")),
+        else_=literal("return"),
+    )
+    on_cooldown = and_(
+        EngagementStatus.discount_sent.is_(True),
+        # without either date the comparisons are NULL; such a row is not on cooldown
+        func.coalesce(
+            or_(
+                EngagementStatus.discount_last_sent > cooldown_since,
+                and_(
+                    EngagementStatus.discount_last_sent.is_(None),
+                    # discount_expires - 1 day > cooldown_since
+                    EngagementStatus.discount_expires > cooldown_since + timedelta(days=1),
+                ),
+            ),
+            false(),
+        ),
+    )
+    rows = (
+        session.query(
+            User.id,
+            User.telegram_id,
+            discount_type,
+            EngagementStatus.user_id.isnot(None),
+        )
+        .join(Subscription, Subscription.user_id == User.id)
+        .outerjoin(EngagementStatus, EngagementStatus.user_id == User.id)
+        .filter(
+            Subscription.grade == "free",
+            or_(Subscription.trial_end.is_(None), Subscription.trial_end <= decision_time),
+            or_(
+                Subscription.trial.isnot(True),
+                Subscription.trial_end.isnot(None),
+            ),
+            User.blocked.isnot(True),
+            User.left_bot.isnot(True),
+            or_(EngagementStatus.user_id.is_(None), not_(on_cooldown)),
+            or_(
+                and_(
+                    Subscription.paid_until.is_(None),
+                    User.created_at <= lapsed_before,
+                ),
+                Subscription.paid_until <= lapsed_before,
+            ),
+        )
+        .order_by(User.id)
+        .all()
+    )
+    return [
+        DiscountRecipient(
+            user_id=user_id,
+            telegram_id=telegram_id,
+            discount_type=kind,
+            has_engagement=bool(has_engagement),
+        )
+        for user_id, telegram_id, kind, has_engagement in rows
+    ]
+
+
+def queue_discount_campaign(
+    session: Session,
+    recipients: Sequence[DiscountRecipient],
+    *,
+    texts: dict[str, str],
+    expires: datetime,
+    now: Optional[datetime] = None,
+    **fields,
+) -> dict[str, int]:
+    """Put discount offers in the outbox and return the queued count per type.
+
+    The cooldown columns are written by the dispatcher once an offer is
+    delivered, so users that never receive it stay eligible.
+    """
+
+    now = now or datetime.utcnow()
+    missing = [r.user_id for r in recipients if not r.has_engagement]
+    if missing:
+        session.bulk_insert_mappings(
+            EngagementStatus, [{"user_id": user_id} for user_id in missing]
+        )
+    queued = {}
+    for kind, text in texts.items():
+        queued[kind] = enqueue_many(
+            session,
+            (
+                OutboxMessage(
+                    r.telegram_id,
+                    text,
+                    f"{kind} discount",
+                    category="discount",
+                    priority=PRIORITY_BULK,
+                    dedup_key=f"discount:{r.user_id}",
+                    on_delivered=[
+                        Mark(
+                            EngagementStatus,
+                            r.user_id,
+                            {
+                                "discount_sent": True,
+                                "discount_expires": expires,
+                                "discount_last_sent": now,
+                            },
+                        )
+                    ],
+                    **fields,
+                )
+                for r in recipients
+                if r.discount_type == kind
+            ),
+            now,
+        )
+    session.commit()
+    return queued
@@ -0,0 +1,162 @@
+"""Skip message edits that would not change anything.
+
+Pressing the same button twice makes a handler edit its message into the
+text and keyboard it already shows, and Telegram answers with "message is
+not modified". ``SkipUnchangedEdits`` sits on the bot session and keeps a
+hash of the last text and keyboard we rendered per ``(chat_id,
+message_id)``. An edit to the same content fails locally with the same
+error Telegram would return, without the request. Handlers wrap edits in
+``apply_edit`` to treat that error as a no-op.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from aiogram import Bot, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    DeleteMessage,
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendMessage,
+)
+
+from .messaging import in_background
+from .settings import EDIT_CACHE_SIZE, EDIT_CACHE_TTL
+
+NOT_MODIFIED = "message is not modified"
+
+# (hash of text or caption, hash of keyboard); None for an unknown text
+Rendered = Tuple[Optional[int], int]
+
+
+class RenderCache:
+    """Last rendered state per message, bounded by size and age."""
+
+    def __init__(
+        self,
+        max_size: int = EDIT_CACHE_SIZE,
+        max_age: float = EDIT_CACHE_TTL,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.max_age = max_age
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Rendered]]" = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, (stored_at, _) = next(iter(self._entries.items()))
+            if now - stored_at < self.max_age and len(self._entries) <= self.max_size:
+                break
+            del self._entries[key]
+
+    def get(self, key: Hashable) -> Optional[Rendered]:
+        self._evict(self.clock())
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def put(self, key: Hashable, rendered: Rendered) -> None:
+        now = self.clock()
+        self._entries.pop(key, None)
+        self._entries[key] = (now, rendered)
+        self._evict(now)
+
+    def discard(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _markup_hash(markup: Any) -> int:
+    if markup is None:
+        return hash(None)
+    return hash(markup.model_dump_json(exclude_none=True))
+
+
+def _content_hash(text: Optional[str], parse_mode: Any, entities: Any) -> int:
+    entities = [entity.model_dump_json() for entity in entities or ()]
+    return hash((text, repr(parse_mode), tuple(entities)))
+
+
+def _rendered(method: Any, previous: Optional[Rendered]) -> Rendered:
+    markup = _markup_hash(method.reply_markup)
+    if isinstance(method, EditMessageReplyMarkup):
+        # the text stays as it was
+        return (previous[0] if previous else None), markup
+    if isinstance(method, EditMessageCaption):
+        content = _content_hash(method.caption, method.parse_mode, method.caption_entities)
+        return content, markup
+    return _content_hash(method.text, method.parse_mode, method.entities), markup
+
+
+class SkipUnchangedEdits(BaseRequestMiddleware):
+    """Answer edits that would leave a message unchanged without calling Telegram."""
+
+    def __init__(self, cache: Optional[RenderCache] = None) -> None:
+        self.cache = cache if cache is not None else RenderCache()
+        self.skipped = 0
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if isinstance(method, DeleteMessage):
+            self.cache.discard((method.chat_id, method.message_id))
+            return await make_request(bot, method)
+        if isinstance(method, SendMessage):
+            result = await make_request(bot, method)
+            # bulk sends are hardly ever edited and would flush the cache
+            if isinstance(result, types.Message) and not in_background():
+                self.cache.put((result.chat.id, result.message_id), _rendered(method, None))
+            return result
+        if not isinstance(
+            method, (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)
+        ) or method.inline_message_id:
+            return await make_request(bot, method)
+
+        key = (method.chat_id, method.message_id)
+        previous = self.cache.get(key)
+        rendered = _rendered(method, previous)
+        unchanged = previous is not None and (
+            previous[1] == rendered[1]
+            if isinstance(method, EditMessageReplyMarkup)
+            else previous == rendered
+        )
+        if unchanged:
+            self.skipped += 1
+            raise TelegramBadRequest(method, f"Bad Request: {NOT_MODIFIED} (cached)")
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as exc:
+            if is_not_modified(exc):
+                # that is what the message shows, remember it
+                self.cache.put(key, rendered)
+            else:
+                self.cache.discard(key)
+            raise
+        self.cache.put(key, rendered)
+        return result
+
+
+def is_not_modified(exc: TelegramBadRequest) -> bool:
+    return NOT_MODIFIED in str(exc)
+
+
+async def apply_edit(edit: Awaitable[Any]) -> bool:
+    """Await an edit request; False when the message already looked like that."""
+
+    try:
+        await edit
+    except TelegramBadRequest as exc:
+        if not is_not_modified(exc):
+            raise
+        return False
+    return True
+
+
+skip_unchanged_edits = SkipUnchangedEdits()
@@ -1,15 +1,21 @@
-import asyncio
-import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 
-from aiogram import Bot
+from sqlalchemy import Boolean, and_, false, func, insert, not_, or_, select
 
-from .database import SessionLocal, User, Meal, EngagementStatus
+from .database import SessionLocal, User, EngagementStatus, Subscription
 from .keyboards import subscribe_button, feedback_button
 from .logger import log
-from .messaging import send_with_retries
+from .outbox import (
+    PRIORITY_ENGAGEMENT,
+    PRIORITY_INTERACTIVE,
+    Mark,
+    OutboxMessage,
+    enqueue_many,
+)
 from .storage import pending_meals
+from .watchers import TickContext
 from .settings import SUPPORT_HANDLE
 from .texts import (
     WELCOME_REMINDER_15M,
@@ -29,39 +35,37 @@ from .texts import (
     BTN_REMOVE_LIMITS,
 )
 
+PENDING_REMINDER_SECONDS = 1800
+
 
-async def _send(
-    bot: Bot,
+def _message(
+    user_id: int,
     chat_id: int,
     text: str,
+    event: str,
+    flag=None,
     *,
-    event: Optional[str] = None,
-    reply_markup=None,
-    **kwargs,
-) -> bool:
-    """Send engagement messages with retries and logging."""
-
-    send_kwargs = {}
-    if reply_markup is not None:
-        send_kwargs["reply_markup"] = reply_markup
-    send_kwargs.update(kwargs)
-    delivered = await send_with_retries(
-        bot,
+    priority: int = PRIORITY_ENGAGEMENT,
+    **fields,
+) -> OutboxMessage:
+    """Build an engagement message; ``flag`` is set once it is delivered."""
+
+    return OutboxMessage(
         chat_id,
-        text=text,
+        text,
+        event,
         category="engagement",
-        **send_kwargs,
+        priority=priority,
+        dedup_key=f"{event}:{user_id}" if flag is not None else None,
+        on_delivered=(
+            [Mark(EngagementStatus, user_id, {flag.key: True})] if flag is not None else ()
+        ),
+        **fields,
     )
-    label = event or text
-    if delivered:
-        log("engagement", "delivered %s to %s", label, chat_id)
-    else:
-        log("engagement", "failed to deliver %s to %s", label, chat_id)
-    return delivered
 
 
-async def process_request_events(bot: Bot, telegram_id: int) -> None:
-    """Handle engagement events triggered by a new GPT request."""
+def process_request_events(telegram_id: int) -> None:
+    """Queue engagement messages triggered by a new GPT request."""
     session = SessionLocal()
     user = session.query(User).filter_by(telegram_id=telegram_id).first()
     if not user:
@@ -73,38 +77,21 @@ async def process_request_events(bot: Bot, telegram_id: int) -> None:
     now = datetime.utcnow()
 
     prev_ts = user.last_request
-
-    if not eng.first_request_sent and user.requests_total >= 1:
-        if await _send(
-            bot,
-            user.telegram_id,
-            FIRST_REQUEST_DONE,
-            event="first request milestone",
-        ):
-            eng.first_request_sent = True
-
-    if not eng.three_requests_sent and user.requests_total >= 3:
-        if await _send(
-            bot,
-            user.telegram_id,
-            THREE_REQUESTS_DONE,
-            event="three requests milestone",
-        ):
-            eng.three_requests_sent = True
-
-    if not eng.seven_requests_sent and user.requests_total >= 7:
-        if await _send(
-            bot,
-            user.telegram_id,
-            SEVEN_REQUESTS_DONE,
-            event="seven requests milestone",
-        ):
-            eng.seven_requests_sent = True
+    milestones = (
+        (1, FIRST_REQUEST_DONE, "first request milestone", EngagementStatus.first_request_sent),
+        (3, THREE_REQUESTS_DONE, "three requests milestone", EngagementStatus.three_requests_sent),
+        (7, SEVEN_REQUESTS_DONE, "seven requests milestone", EngagementStatus.seven_requests_sent),
+    )
+    messages = [
+        _message(user.id, user.telegram_id, text, event, flag, priority=PRIORITY_INTERACTIVE)
+        for requests, text, event, flag in milestones
+        if not getattr(eng, flag.key) and user.requests_total >= requests
+    ]
 
     if (
         not eng.five_no_meal_sent
         and user.requests_total >= 5
-        and session.query(Meal).filter_by(user_id=user.id).count() == 0
+        and not user.meals_count
     ):
         meals = [
             m
@@ -115,178 +102,309 @@ async def process_request_events(bot: Bot, telegram_id: int) -> None:
         if meals:
             latest = max(meals, key=lambda m: m.get("timestamp", 0))
             msg_id = latest.get("message_id")
-        if await _send(
-            bot,
-            user.telegram_id,
-            NO_MEAL_AFTER_REQUESTS,
-            event="no meal reminder",
-            reply_to_message_id=msg_id,
-        ):
-            eng.five_no_meal_sent = True
+        messages.append(
+            _message(
+                user.id,
+                user.telegram_id,
+                NO_MEAL_AFTER_REQUESTS,
+                "no meal reminder",
+                EngagementStatus.five_no_meal_sent,
+                priority=PRIORITY_INTERACTIVE,
+                reply_to_message_id=msg_id,
+            )
+        )
 
     if prev_ts and now - prev_ts >= timedelta(days=7):
-        await _send(
-            bot,
-            user.telegram_id,
-            WELCOME_BACK,
-            event="welcome back reminder",
+        messages.append(
+            _message(
+                user.id,
+                user.telegram_id,
+                WELCOME_BACK,
+                "welcome back reminder",
+                priority=PRIORITY_INTERACTIVE,
+            )
         )
+    enqueue_many(session, messages, now)
     eng.inactivity_7d_sent = False
     eng.inactivity_14d_sent = False
     eng.inactivity_30d_sent = False
 
     user.last_request = now
+    if user.first_request_at is None:
+        user.first_request_at = now
 
     session.commit()
     session.close()
 
 
-def engagement_watcher(check_interval: int = 60):
-    async def _watch(bot: Bot):
-        while True:
-            now = datetime.utcnow()
-            session = SessionLocal()
-            users = session.query(User).all()
-            skip_chat_ids = set()
-            for user in users:
-                if user.blocked or user.left_bot:
-                    skip_chat_ids.add(user.telegram_id)
-                    continue
-                eng = user.engagement or EngagementStatus()
-                if not user.engagement:
-                    user.engagement = eng
-
-                # no first request reminders
-                if user.requests_total == 0:
-                    delta = now - (user.created_at or now)
-                    if (
-                        not eng.no_request_15m
-                        and delta >= timedelta(minutes=15)
-                    ):
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            WELCOME_REMINDER_15M,
-                            event="welcome reminder 15m",
-                        ):
-                            eng.no_request_15m = True
-                    if (
-                        not eng.no_request_24h
-                        and delta >= timedelta(hours=24)
-                    ):
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            WELCOME_REMINDER_24H,
-                            event="welcome reminder 24h",
-                        ):
-                            eng.no_request_24h = True
-                    if (
-                        not eng.no_request_3d
-                        and delta >= timedelta(days=3)
-                    ):
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            WELCOME_REMINDER_3D,
-                            event="welcome reminder 3d",
-                        ):
-                            eng.no_request_3d = True
-
-                # 10-day feedback
-                if (
-                    not eng.feedback_10d_sent
-                    and now - (user.created_at or now) >= timedelta(days=10)
-                ):
-                    url = f"https://t.me/{SUPPORT_HANDLE.lstrip('@')}"
-                    if await _send(
-                        bot,
-                        user.telegram_id,
-                        FEEDBACK_10D,
-                        event="feedback reminder 10d",
-                        reply_markup=feedback_button(url),
-                    ):
-                        eng.feedback_10d_sent = True
-
-                # free limit reminder
-                if user.grade == "free":
-                    if user.requests_used >= user.request_limit:
-                        if eng.limit_reached_at is None:
-                            eng.limit_reached_at = now
-                    else:
-                        eng.limit_reached_at = None
-                        eng.limit_reminder_sent = False
-                    if (
-                        eng.limit_reached_at
-                        and not eng.limit_reminder_sent
-                        and now - eng.limit_reached_at >= timedelta(days=3)
-                    ):
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            FREE_LIMIT_PAY_REMINDER,
-                            event="free limit reminder",
-                            reply_markup=subscribe_button(BTN_REMOVE_LIMITS),
-                        ):
-                            eng.limit_reminder_sent = True
-                else:
-                    eng.limit_reached_at = None
-                    eng.limit_reminder_sent = False
-
-                # inactivity reminders
-                last_ts = user.last_request
-                if last_ts:
-                    days = (now - last_ts).days
-                    if days >= 30 and not eng.inactivity_30d_sent:
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            INACTIVE_30D,
-                            event="inactive 30d",
-                        ):
-                            eng.inactivity_30d_sent = True
-                    elif days >= 14 and not eng.inactivity_14d_sent:
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            INACTIVE_14D,
-                            event="inactive 14d",
-                        ):
-                            eng.inactivity_14d_sent = True
-                    elif days >= 7 and not eng.inactivity_7d_sent:
-                        if await _send(
-                            bot,
-                            user.telegram_id,
-                            INACTIVE_7D,
-                            event="inactive 7d",
-                        ):
-                            eng.inactivity_7d_sent = True
-
-            session.commit()
-            session.close()
-
-            # pending meal reminders
-            now_ts = time.time()
-            for meal_id, meal in list(pending_meals.items()):
-                ts = meal.get("timestamp")
-                if ts and now_ts - ts > 1800 and not meal.get("reminded"):
-                    chat_id = meal.get("chat_id")
-                    if chat_id in skip_chat_ids:
-                        continue
-                    msg_id = meal.get("message_id")
-                    if await _send(
-                        bot,
-                        chat_id,
-                        ADD_MEAL_REMINDER,
-                        event="pending meal reminder",
-                        reply_to_message_id=msg_id,
-                    ):
-                        meal["reminded"] = True
-
-
-            await asyncio.sleep(check_interval)
-
-    def _start(bot: Bot):
-        return _watch(bot)
-
-    return _start
+@dataclass(frozen=True)
+class EngagementRule:
+    """A scheduled engagement message and the SQL selecting who needs it now."""
+
+    event: str
+    text: str
+    # EngagementStatus flag set once the message is delivered
+    flag: Any
+    # extra WHERE predicates for the given moment
+    criteria: Callable[[datetime], list]
+    reply_markup: Optional[Callable[[], Any]] = None
+
+
+def _not_sent(flag):
+    return flag.isnot(True)
+
+
+def _no_requests_for(delta: timedelta):
+    def _criteria(now: datetime) -> list:
+        return [
+            func.coalesce(Subscription.requests_total, 0) == 0,
+            User.created_at <= now - delta,
+        ]
+
+    return _criteria
+
+
+_INACTIVITY_FLAGS = {
+    30: EngagementStatus.inactivity_30d_sent,
+    14: EngagementStatus.inactivity_14d_sent,
+    7: EngagementStatus.inactivity_7d_sent,
+}
+
+
+def _inactive(now: datetime, days: int):
+    return and_(
+        Subscription.last_request <= now - timedelta(days=days),
+        _not_sent(_INACTIVITY_FLAGS[days]),
+    )
+
+
+def _inactive_for(days: int):
+    """Only the longest unsent inactivity stage applies to a user."""
+
+    def _criteria(now: datetime) -> list:
+        longer = [d for d in _INACTIVITY_FLAGS if d > days]
+        return [
+            Subscription.last_request <= now - timedelta(days=days),
+            *[not_(_inactive(now, d)) for d in longer],
+        ]
+
+    return _criteria
+
+
+def _free_limit_for(delta: timedelta):
+    def _criteria(now: datetime) -> list:
+        return [
+            Subscription.grade == "free",
+            EngagementStatus.limit_reached_at <= now - delta,
+        ]
+
+    return _criteria
+
+
+def _feedback_after(delta: timedelta):
+    def _criteria(now: datetime) -> list:
+        return [User.created_at <= now - delta]
+
+    return _criteria
+
+
+RULES = (
+    EngagementRule(
+        "welcome reminder 15m",
+        WELCOME_REMINDER_15M,
+        EngagementStatus.no_request_15m,
+        _no_requests_for(timedelta(minutes=15)),
+    ),
+    EngagementRule(
+        "welcome reminder 24h",
+        WELCOME_REMINDER_24H,
+        EngagementStatus.no_request_24h,
+        _no_requests_for(timedelta(hours=24)),
+    ),
+    EngagementRule(
+        "welcome reminder 3d",
+        WELCOME_REMINDER_3D,
+        EngagementStatus.no_request_3d,
+        _no_requests_for(timedelta(days=3)),
+    ),
+    EngagementRule(
+        "feedback reminder 10d",
+        FEEDBACK_10D,
+        EngagementStatus.feedback_10d_sent,
+        _feedback_after(timedelta(days=10)),
+        reply_markup=lambda: feedback_button(f"https://t.me/{SUPPORT_HANDLE.lstrip('@')}"),
+    ),
+    EngagementRule(
+        "free limit reminder",
+        FREE_LIMIT_PAY_REMINDER,
+        EngagementStatus.limit_reminder_sent,
+        _free_limit_for(timedelta(days=3)),
+        reply_markup=lambda: subscribe_button(BTN_REMOVE_LIMITS),
+    ),
+    EngagementRule(
+        "inactive 30d",
+        INACTIVE_30D,
+        EngagementStatus.inactivity_30d_sent,
+        _inactive_for(30),
+    ),
+    EngagementRule(
+        "inactive 14d",
+        INACTIVE_14D,
+        EngagementStatus.inactivity_14d_sent,
+        _inactive_for(14),
+    ),
+    EngagementRule(
+        "inactive 7d",
+        INACTIVE_7D,
+        EngagementStatus.inactivity_7d_sent,
+        _inactive_for(7),
+    ),
+)
+
+
+def _active_users():
+    return [User.blocked.isnot(True), User.left_bot.isnot(True)]
+
+
+def _ensure_engagement_rows(session) -> None:
+    """Give users created before engagement tracking an all-false status row."""
+
+    flags = [
+        column.name
+        for column in EngagementStatus.__table__.columns
+        if isinstance(column.type, Boolean)
+    ]
+    missing = (
+        select(User.id, *[false() for _ in flags])
+        .select_from(User)
+        .outerjoin(EngagementStatus, EngagementStatus.user_id == User.id)
+        .where(EngagementStatus.user_id.is_(None))
+    )
+    session.execute(insert(EngagementStatus).from_select(["user_id", *flags], missing))
+
+
+def _update_limit_markers(session, now: datetime) -> None:
+    """Track when free users hit their limit, in two set-based updates."""
+
+    at_limit = select(Subscription.user_id).where(
+        Subscription.grade == "free",
+        Subscription.requests_used >= Subscription.request_limit,
+    )
+    active = select(User.id).where(*_active_users())
+    session.query(EngagementStatus).filter(
+        EngagementStatus.limit_reached_at.is_(None),
+        EngagementStatus.user_id.in_(at_limit),
+        EngagementStatus.user_id.in_(active),
+    ).update({EngagementStatus.limit_reached_at: now}, synchronize_session=False)
+    session.query(EngagementStatus).filter(
+        or_(
+            EngagementStatus.limit_reached_at.isnot(None),
+            EngagementStatus.limit_reminder_sent.is_(True),
+        ),
+        EngagementStatus.user_id.notin_(at_limit),
+    ).update(
+        {
+            EngagementStatus.limit_reached_at: None,
+            EngagementStatus.limit_reminder_sent: False,
+        },
+        synchronize_session=False,
+    )
+
+
+def _recipients(session, rule: EngagementRule, now: datetime) -> list[tuple[int, int]]:
+    return (
+        session.query(User.id, User.telegram_id)
+        .join(EngagementStatus, EngagementStatus.user_id == User.id)
+        .outerjoin(Subscription, Subscription.user_id == User.id)
+        .filter(*_active_users(), _not_sent(rule.flag), *rule.criteria(now))
+        .order_by(User.id)
+        .all()
+    )
+
+
+def _queue_rule(
+    session,
+    rule: EngagementRule,
+    recipients: list[tuple[int, int]],
+    now: datetime,
+) -> int:
+    """Queue ``rule`` for its recipients; the flag is set on delivery.
+
+    Recipients whose message is still pending are selected again until then
+    and skipped by the outbox dedup key.
+    """
+
+    return enqueue_many(
+        session,
+        [
+            _message(
+                user_id,
+                telegram_id,
+                rule.text,
+                rule.event,
+                rule.flag,
+                reply_markup=rule.reply_markup() if rule.reply_markup else None,
+            )
+            for user_id, telegram_id in recipients
+        ],
+        now,
+    )
+
+
+async def run_engagement_tick(now: datetime, ctx: Optional[TickContext] = None) -> None:
+    """Queue every engagement message that became due, rule by rule."""
+
+    ctx = ctx or TickContext("engagement_watcher")
+    session = SessionLocal()
+    try:
+        _ensure_engagement_rows(session)
+        _update_limit_markers(session, now)
+        for rule in RULES:
+            recipients = _recipients(session, rule, now)
+            queued = _queue_rule(session, rule, recipients, now)
+            if queued:
+                log("engagement", "queued %s for %s users", rule.event, queued)
+            await ctx.processed(len(recipients))
+        session.commit()
+    finally:
+        session.close()
+
+
+def _remind_pending_meals(ctx: TickContext) -> None:
+    due = pending_meals.pop_reminders(ctx.timestamp - PENDING_REMINDER_SECONDS)
+    if not due:
+        return
+    session = SessionLocal()
+    try:
+        skip_chat_ids = {
+            telegram_id
+            for (telegram_id,) in session.query(User.telegram_id).filter(
+                User.telegram_id.in_({meal.get("chat_id") for _, meal in due}),
+                or_(User.blocked.is_(True), User.left_bot.is_(True)),
+            )
+        }
+        messages = []
+        for meal_id, meal in due:
+            chat_id = meal.get("chat_id")
+            if chat_id in skip_chat_ids:
+                continue
+            meal["reminded"] = True
+            messages.append(
+                OutboxMessage(
+                    chat_id,
+                    ADD_MEAL_REMINDER,
+                    "pending meal reminder",
+                    category="engagement",
+                    priority=PRIORITY_ENGAGEMENT,
+                    reply_to_message_id=meal.get("message_id"),
+                )
+            )
+        enqueue_many(session, messages, ctx.now)
+        session.commit()
+    finally:
+        session.close()
+
+
+async def engagement_watcher_tick(ctx: TickContext) -> None:
+    await run_engagement_tick(ctx.now, ctx)
+    _remind_pending_meals(ctx)
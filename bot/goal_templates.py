@@ -0,0 +1,145 @@
+"""Rule-based goal reminder texts built from plan and fact numbers."""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from html import escape
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .texts import (
+    GOAL_ADVICE,
+    GOAL_EVENING_VERDICTS,
+    GOAL_MORNING_GREETINGS,
+    GOAL_SUMMARY,
+    GOAL_SUMMARY_EMPTY,
+    GOAL_TARGET_LINE,
+)
+
+# calories, protein, fat, carbs
+Macros = Tuple[float, float, float, float]
+# (slot, deviation bucket, goal target)
+AdviceKey = Tuple[str, str, Optional[str]]
+
+PREFIXES = {
+    "morning": ("🌅", "📊", "💪"),
+    "evening": ("🌙", "📊", "💡"),
+}
+
+# upper bounds of fact/plan calorie ratio for each bucket
+_BUCKETS = (
+    (0.8, "low"),
+    (0.95, "under"),
+    (1.05, "on_track"),
+    (1.2, "over"),
+)
+
+
+def format_macro(value) -> str:
+    try:
+        num = round(float(value), 1)
+    except (TypeError, ValueError):
+        return "0"
+    if num == int(num):
+        return str(int(num))
+    return f"{num:.1f}".rstrip("0").rstrip(".")
+
+
+def deviation_bucket(plan_kcal, fact_kcal) -> str:
+    """Classify how far the eaten calories are from the plan."""
+
+    if not fact_kcal:
+        return "empty"
+    if not plan_kcal:
+        return "on_track"
+    ratio = float(fact_kcal) / float(plan_kcal)
+    for bound, bucket in _BUCKETS:
+        if ratio < bound:
+            return bucket
+    return "high"
+
+
+def _numbers(prefix: str, values: Macros) -> Dict[str, str]:
+    names = ("kcal", "P", "F", "C")
+    return {
+        f"{prefix}{name}": f"<b>{format_macro(value)}</b>"
+        for name, value in zip(names, values)
+    }
+
+
+def render_goal_reminder(
+    slot: str,
+    plan: Macros,
+    fact: Macros,
+    advice: Optional[str] = None,
+    rng: random.Random = random,
+) -> str:
+    """Return the HTML text of a morning or evening goal reminder.
+
+    ``advice`` replaces the phrase picked from ``GOAL_ADVICE`` for the bucket.
+    """
+
+    bucket = deviation_bucket(plan[0], fact[0])
+    first, second, third = PREFIXES[slot]
+    if slot == "morning":
+        headline = rng.choice(GOAL_MORNING_GREETINGS)
+    else:
+        headline = rng.choice(GOAL_EVENING_VERDICTS[bucket])
+    if bucket == "empty":
+        summary = escape(GOAL_SUMMARY_EMPTY[slot])
+    else:
+        summary = escape(GOAL_SUMMARY[slot]).format(**_numbers("", fact))
+    target = escape(GOAL_TARGET_LINE).format(**_numbers("plan_", plan))
+    advice = advice or rng.choice(GOAL_ADVICE[bucket])
+    return (
+        f"{first} <b>{escape(headline)}</b>\n\n"
+        f"{second} {summary}\n{target}\n\n"
+        f"{third} {escape(advice)}"
+    )
+
+
+class AdviceCache:
+    """Cache generated advice paragraphs by ``(slot, bucket, goal)``.
+
+    Concurrent requests for the same key share one generation call.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self._ttl = ttl
+        self._entries: Dict[AdviceKey, Tuple[float, str]] = {}
+        self._inflight: Dict[AdviceKey, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: AdviceKey) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def get_or_create(
+        self, key: AdviceKey, create: Callable[[], Awaitable[str]]
+    ) -> str:
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, create))
+            self._inflight[key] = task
+        # a cancelled waiter must not cancel the call other users wait for
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: AdviceKey, create: Callable[[], Awaitable[str]]) -> str:
+        try:
+            text = await create()
+            self._entries[key] = (time.monotonic() + self._ttl, text)
+            return text
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
@@ -1,9 +1,11 @@
+import asyncio
+
 from aiogram import types, Dispatcher, F
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional
 
 from sqlalchemy import func
 
@@ -12,13 +14,25 @@ from ..database import (
     User,
     Comment,
     EngagementStatus,
-    Subscription,
 )
+from ..edits import apply_edit
 from ..states import AdminState
 from ..config import ADMIN_COMMAND, ADMIN_PASSWORD
 from ..keyboards import subscribe_button
 from ..logger import log
-from ..messaging import deliver_text, send_with_retries
+from ..broadcasts import (
+    cancel_broadcast,
+    create_broadcast,
+    media_from_message,
+    progress_kb,
+    progress_text,
+    start_broadcast,
+)
+from ..messaging import send_with_retries
+from ..reminder_schedule import refresh_user_schedule
+from ..settings import BROADCAST_ALBUM_WAIT
+from ..segments import Segment, SegmentError, count_segment, parse_segment
+from ..storage import mark_blocked, mark_unblocked
 from ..texts import (
     BTN_BROADCAST,
     BTN_BROADCAST_TEXT,
@@ -41,9 +55,12 @@ from ..texts import (
     BTN_SETTINGS,
     BTN_REMINDERS,
     BTN_GOALS,
+    BTN_DIGEST,
     BTN_MANUAL,
     BTN_GRADE_START,
     BTN_GRADE_PRO,
+    BTN_GRADE_FREE,
+    BTN_GOAL_AI,
     BTN_STATS_ADMIN,
     BTN_YES,
     BTN_NO,
@@ -63,9 +80,17 @@ from ..texts import (
     ADMIN_UNAVAILABLE,
     BROADCAST_CHOOSE,
     BROADCAST_PROMPT,
-    BROADCAST_ERROR,
-    BROADCAST_DONE,
+    BROADCAST_CANCELLING,
     BROADCAST_SUPPORT_PROMPT,
+    BROADCAST_SEGMENT_PROMPT,
+    BROADCAST_ALBUM_NO_BUTTON,
+    BROADCAST_TIME_PROMPT,
+    BROADCAST_SCHEDULED_PREVIEW,
+    BTN_BROADCAST_LOCAL_TIME,
+    INVALID_TIME,
+    BROADCAST_SEGMENT_INVALID,
+    BROADCAST_SEGMENT_EMPTY,
+    BROADCAST_SEGMENT_PREVIEW,
     ADMIN_CHOOSE_ACTION,
     ADMIN_ENTER_ID,
     ADMIN_ENTER_DAYS,
@@ -84,6 +109,9 @@ from ..texts import (
     ADMIN_DISCOUNT_PROMPT,
     ADMIN_DISCOUNT_DONE,
     ADMIN_DISCOUNT_COOLDOWN,
+    ADMIN_DISCOUNT_QUEUED,
+    ADMIN_BULK_CONFIRM,
+    ADMIN_BULK_PROGRESS,
     ADMIN_STATS,
     ADMIN_REFERRAL_TITLE,
     ADMIN_REFERRAL_EMPTY,
@@ -91,8 +119,18 @@ from ..texts import (
     RETURN_DISCOUNT_MESSAGE,
     format_date_ru,
 )
-from ..discounts import determine_discount_type
-from ..subscriptions import PAID_LIMIT
+from ..bulk_ops import (
+    bulk_add_subscription_days,
+    bulk_set_grade,
+    bulk_start_trial,
+    count_days_targets,
+    count_trial_targets,
+)
+from ..discounts import (
+    determine_discount_type,
+    plan_discount_campaign,
+    queue_discount_campaign,
+)
 from ..utils import telegram_markdown_to_html
 
 admins = set()
@@ -251,6 +289,14 @@ def discount_confirm_kb() -> types.InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def bulk_confirm_kb() -> types.InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=BTN_CONFIRM, callback_data="admin:bulk_confirm")
+    builder.button(text=BTN_BACK, callback_data="admin:menu")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
 def trial_menu_kb() -> types.InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text=BTN_ONE, callback_data="admin:trial_one")
@@ -409,41 +455,19 @@ async def admin_discount_confirm(query: types.CallbackQuery, state: FSMContext):
     sent_stats = {"new": 0, "return": 0}
 
     if target == "all":
-        users = (
-            session.query(User)
-            .join(Subscription)
-            .filter(Subscription.grade == "free")
-            .all()
-        )
-        for user in users:
-            discount_type = determine_discount_type(
-                session, user, decision_time
-            )
-            if not discount_type:
-                continue
-            engagement = user.engagement
-            if not engagement:
-                engagement = EngagementStatus()
-                user.engagement = engagement
-            text = text_new if discount_type == "new" else text_return
-            success = await send_with_retries(
-                query.bot,
-                user.telegram_id,
-                text=text,
-                category="discount",
+        recipients = plan_discount_campaign(session, decision_time)
+        sent_stats.update(
+            queue_discount_campaign(
+                session,
+                recipients,
+                texts={"new": text_new, "return": text_return},
+                expires=expire,
+                now=decision_time,
                 parse_mode="HTML",
                 reply_markup=subscribe_button(BTN_REMOVE_LIMITS),
             )
-            if success:
-                sent_at = datetime.utcnow()
-                engagement.discount_sent = True
-                engagement.discount_expires = expire
-                engagement.discount_last_sent = sent_at
-                session.add(engagement)
-                count += 1
-                sent_stats[discount_type] += 1
-            else:
-                failed.append(user.telegram_id)
+        )
+        count = sum(sent_stats.values())
     elif target == "one" and tg_id:
         user = session.query(User).filter_by(telegram_id=int(tg_id)).first()
         if user:
@@ -498,15 +522,16 @@ async def admin_discount_confirm(query: types.CallbackQuery, state: FSMContext):
     session.close()
     log(
         "discount",
-        "discount target %s: delivered %s (new %s, return %s), failed %s",
+        "discount target %s: %s %s (new %s, return %s), failed %s",
         target,
+        "queued" if target == "all" else "delivered",
         count,
         sent_stats["new"],
         sent_stats["return"],
         len(failed),
     )
     await state.clear()
-    result_text = ADMIN_DISCOUNT_DONE
+    result_text = ADMIN_DISCOUNT_QUEUED if target == "all" else ADMIN_DISCOUNT_DONE
     if target == "all":
         result_text += (
             f"\nНовые пользователи: {sent_stats['new']}"
@@ -630,11 +655,7 @@ async def admin_stats(query: types.CallbackQuery):
         left=left,
         req_today=q_today,
     )
-    try:
-        await query.message.edit_text(text, reply_markup=admin_menu_kb())
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    await apply_edit(query.message.edit_text(text, reply_markup=admin_menu_kb()))
     await query.answer()
 
 
@@ -714,84 +735,185 @@ async def process_comment_text(message: types.Message, state: FSMContext):
 
 
 def _render_broadcast_text(message: types.Message) -> str:
-    if message.html_text and (not message.text or message.html_text != message.text):
-        return message.html_text
-    if not message.text:
+    # a caption is rendered like a text, so attaching a file changes nothing
+    source = message.text or message.caption
+    if not source:
         return ""
-    return telegram_markdown_to_html(message.text)
+    if message.html_text and message.html_text != source:
+        return message.html_text
+    return telegram_markdown_to_html(source)
+
+
+# parts of albums sent by admins as a broadcast, by media_group_id
+_albums: Dict[str, List[types.Message]] = {}
+
+
+def _support_kb() -> types.InlineKeyboardMarkup:
+    from ..settings import SUPPORT_HANDLE
+    url = f"https://t.me/{SUPPORT_HANDLE.lstrip('@')}"
+    builder = InlineKeyboardBuilder()
+    builder.button(text=BTN_SUPPORT, url=url)
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def broadcast_confirm_kb(scheduled: bool = False) -> types.InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=BTN_CONFIRM, callback_data="admin:broadcast:confirm")
+    if not scheduled:
+        builder.button(
+            text=BTN_BROADCAST_LOCAL_TIME, callback_data="admin:broadcast:local_time"
+        )
+    builder.button(text=BTN_BACK, callback_data="admin:menu")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+async def _album_parts(message: types.Message) -> Optional[List[types.Message]]:
+    """Collect the album of ``message``; only its first part gets the parts back."""
+
+    parts = _albums.setdefault(message.media_group_id, [])
+    parts.append(message)
+    if len(parts) > 1:
+        return None
+    await asyncio.sleep(BROADCAST_ALBUM_WAIT)
+    return sorted(_albums.pop(message.media_group_id), key=lambda part: part.message_id)
+
+
+async def _ask_segment(message: types.Message, state: FSMContext, support: bool) -> None:
+    parts = [message]
+    if message.media_group_id:
+        parts = await _album_parts(message)
+        if parts is None:
+            return
+        if support:
+            await message.answer(BROADCAST_ALBUM_NO_BUTTON)
+            return
+    media = [item for item in map(media_from_message, parts) if item]
+    caption = next((text for text in map(_render_broadcast_text, parts) if text), "")
+    await state.update_data(
+        broadcast_text=caption,
+        broadcast_support=support,
+        broadcast_media=media or None,
+        broadcast_local_time=None,
+    )
+    await state.set_state(AdminState.waiting_broadcast_segment)
+    await message.answer(BROADCAST_SEGMENT_PROMPT, reply_markup=admin_back_kb())
 
 
 async def process_broadcast(message: types.Message, state: FSMContext):
     if message.from_user.id not in admins:
         return
-    text = _render_broadcast_text(message)
+    await _ask_segment(message, state, support=False)
+
+
+async def process_broadcast_support(message: types.Message, state: FSMContext):
+    if message.from_user.id not in admins:
+        return
+    await _ask_segment(message, state, support=True)
+
+
+async def process_broadcast_segment(message: types.Message, state: FSMContext):
+    if message.from_user.id not in admins:
+        return
+    try:
+        segment = parse_segment(message.text)
+    except SegmentError as exc:
+        await message.answer(BROADCAST_SEGMENT_INVALID.format(error=exc))
+        return
     session = SessionLocal()
-    users = session.query(User).all()
-    user_ids = [u.telegram_id for u in users]
+    count = count_segment(session, segment, datetime.utcnow())
     session.close()
-    report = await deliver_text(
-        message.bot,
-        user_ids,
-        text=text,
-        category="broadcast",
-        parse_mode="HTML",
-    )
-    log(
-        "broadcast",
-        "sent broadcast from %s to %s users (failed=%s)",
-        message.from_user.id,
-        report.delivered,
-        len(report.failed),
+    if not count:
+        await message.answer(BROADCAST_SEGMENT_EMPTY)
+        return
+    await state.update_data(broadcast_segment=segment.to_json())
+    await state.set_state(AdminState.waiting_broadcast_confirm)
+    await message.answer(
+        BROADCAST_SEGMENT_PREVIEW.format(segment=segment.describe(), count=count),
+        reply_markup=broadcast_confirm_kb(),
     )
-    response = BROADCAST_DONE
-    if report.failed:
-        failed_preview = ", ".join(map(str, report.failed[:10]))
-        extra = f"\nНе доставлено {len(report.failed)} пользователям."
-        if failed_preview:
-            extra += f"\nIDs: {failed_preview}"
-        response = BROADCAST_ERROR + extra
-    await message.answer(response, reply_markup=admin_menu_kb())
-    await state.clear()
 
 
-async def process_broadcast_support(message: types.Message, state: FSMContext):
+async def admin_broadcast_local_time(query: types.CallbackQuery, state: FSMContext):
+    if query.from_user.id not in admins:
+        await query.answer(ADMIN_UNAVAILABLE, show_alert=True)
+        return
+    await state.set_state(AdminState.waiting_broadcast_time)
+    await query.message.edit_text(BROADCAST_TIME_PROMPT, reply_markup=admin_back_kb())
+    await query.answer()
+
+
+async def process_broadcast_time(message: types.Message, state: FSMContext):
     if message.from_user.id not in admins:
         return
-    text = _render_broadcast_text(message)
+    try:
+        hours, minutes = map(int, message.text.strip().split(":"))
+        if not (0 <= hours < 24 and 0 <= minutes < 60):
+            raise ValueError
+    except ValueError:
+        await message.answer(INVALID_TIME)
+        return
+    local_time = f"{hours:02d}:{minutes:02d}"
+    data = await state.get_data()
+    segment = Segment.from_json(data.get("broadcast_segment"))
     session = SessionLocal()
-    users = session.query(User).all()
-    user_ids = [u.telegram_id for u in users]
+    count = count_segment(session, segment, datetime.utcnow())
     session.close()
-    from ..settings import SUPPORT_HANDLE
-    url = f"https://t.me/{SUPPORT_HANDLE.lstrip('@')}"
-    builder = InlineKeyboardBuilder()
-    builder.button(text=BTN_SUPPORT, url=url)
-    builder.adjust(1)
-    kb = builder.as_markup()
-    report = await deliver_text(
-        message.bot,
-        user_ids,
-        text=text,
-        category="broadcast",
-        parse_mode="HTML",
-        reply_markup=kb,
+    await state.update_data(broadcast_local_time=local_time)
+    await state.set_state(AdminState.waiting_broadcast_confirm)
+    await message.answer(
+        BROADCAST_SCHEDULED_PREVIEW.format(
+            segment=segment.describe(), count=count, time=local_time
+        ),
+        reply_markup=broadcast_confirm_kb(scheduled=True),
     )
+
+
+async def admin_broadcast_confirm(query: types.CallbackQuery, state: FSMContext):
+    if query.from_user.id not in admins:
+        await query.answer(ADMIN_UNAVAILABLE, show_alert=True)
+        return
+    data = await state.get_data()
+    await state.clear()
+    await query.answer()
+    reply_markup = _support_kb() if data.get("broadcast_support") else None
+    session = SessionLocal()
+    job = create_broadcast(
+        session,
+        query.message.chat.id,
+        data.get("broadcast_text", ""),
+        reply_markup,
+        Segment.from_json(data.get("broadcast_segment")),
+        data.get("broadcast_media"),
+        data.get("broadcast_local_time"),
+    )
+    await query.message.edit_text(progress_text(job), reply_markup=progress_kb(job.id))
+    job.status_message_id = query.message.message_id
+    session.commit()
+    broadcast_id = job.id
     log(
         "broadcast",
-        "sent support broadcast from %s to %s users (failed=%s)",
-        message.from_user.id,
-        report.delivered,
-        len(report.failed),
+        "broadcast %s from %s started for %s users of segment %s at %s",
+        broadcast_id,
+        query.from_user.id,
+        job.total,
+        job.segment or "all",
+        job.local_time or "once",
     )
-    response = BROADCAST_DONE
-    if report.failed:
-        failed_preview = ", ".join(map(str, report.failed[:10]))
-        extra = f"\nНе доставлено {len(report.failed)} пользователям."
-        if failed_preview:
-            extra += f"\nIDs: {failed_preview}"
-        response = BROADCAST_ERROR + extra
-    await message.answer(response, reply_markup=admin_menu_kb())
-    await state.clear()
+    session.close()
+    start_broadcast(query.bot, broadcast_id)
+
+
+async def admin_broadcast_cancel(query: types.CallbackQuery):
+    if query.from_user.id not in admins:
+        await query.answer(ADMIN_UNAVAILABLE, show_alert=True)
+        return
+    broadcast_id = int(query.data.rsplit(":", 1)[1])
+    if cancel_broadcast(broadcast_id):
+        await query.answer(BROADCAST_CANCELLING)
+    else:
+        await query.answer()
 
 
 async def process_user_id(message: types.Message, state: FSMContext):
@@ -844,42 +966,56 @@ async def process_days_all(message: types.Message, state: FSMContext):
         await message.answer(ADMIN_ENTER_DAYS)
         return
     session = SessionLocal()
-    from ..subscriptions import add_subscription_days
+    count = count_days_targets(session)
+    session.close()
+    await state.update_data(bulk_op="days", bulk_days=days)
+    await state.set_state(AdminState.waiting_bulk_confirm)
+    await message.answer(
+        ADMIN_BULK_CONFIRM.format(count=count), reply_markup=bulk_confirm_kb()
+    )
 
-    from ..database import Subscription
 
-    users = (
-        session.query(User)
-        .join(Subscription)
-        .filter(Subscription.grade.in_(["light", "pro"]))
-        .all()
-    )
-    failed: list[int] = []
-    success = 0
-    for u in users:
+async def admin_bulk_confirm(query: types.CallbackQuery, state: FSMContext):
+    if query.from_user.id not in admins:
+        await query.answer(ADMIN_UNAVAILABLE, show_alert=True)
+        return
+    data = await state.get_data()
+    await state.clear()
+    await query.answer()
+    op = data.get("bulk_op")
+    days = int(data.get("bulk_days", 0))
+
+    async def _progress(done: int, total: int) -> None:
         try:
-            add_subscription_days(session, u, days)
-            success += 1
-        except Exception as exc:
-            session.rollback()
-            failed.append(u.telegram_id)
-            log("days", "failed to add %s days to %s: %s", days, u.telegram_id, exc)
-    log(
-        "days",
-        "added %s days to %s users (failed=%s)",
-        days,
-        success,
-        len(failed),
-    )
-    session.close()
-    text = ADMIN_DAYS_DONE
-    if failed:
-        preview = ", ".join(map(str, failed[:10]))
-        text += f"\nНе удалось начислить {len(failed)} пользователям."
+            await query.message.edit_text(
+                ADMIN_BULK_PROGRESS.format(done=done, total=total)
+            )
+        except TelegramBadRequest:
+            pass
+
+    session = SessionLocal()
+    try:
+        if op == "days":
+            result = await bulk_add_subscription_days(session, days, progress=_progress)
+            text = ADMIN_DAYS_DONE
+            failed_text = "\nНе удалось начислить {count} пользователям."
+        elif op == "trial":
+            grade = data.get("bulk_grade")
+            result = await bulk_start_trial(session, days, grade, progress=_progress)
+            text = ADMIN_TRIAL_DONE
+            failed_text = "\nНе удалось подключить {count} пользователям."
+        else:
+            await query.message.edit_text(ADMIN_MODE, reply_markup=admin_menu_kb())
+            return
+    finally:
+        session.close()
+    text += f"\nОбновлено: {result.updated}/{result.total}"
+    if result.failed:
+        preview = ", ".join(map(str, result.failed[:10]))
+        text += failed_text.format(count=len(result.failed))
         if preview:
             text += f"\nIDs: {preview}"
-    await message.answer(text, reply_markup=admin_menu_kb())
-    await state.clear()
+    await query.message.edit_text(text, reply_markup=admin_menu_kb())
 
 
 async def process_block(message: types.Message, state: FSMContext):
@@ -895,6 +1031,7 @@ async def process_block(message: types.Message, state: FSMContext):
     if user:
         user.blocked = True
         session.commit()
+        mark_blocked(user.telegram_id)
         from ..logger import log
         log("block", "blocked %s", user.telegram_id)
     session.close()
@@ -957,41 +1094,13 @@ async def process_trial_days(message: types.Message, state: FSMContext):
     mode = data.get("trial_mode")
     if mode == "all":
         session = SessionLocal()
-        users = session.query(User).all()
-        from ..subscriptions import start_trial
-        failed: list[int] = []
-        for u in users:
-            try:
-                start_trial(session, u, days, grade)
-            except Exception as exc:
-                session.rollback()
-                failed.append(u.telegram_id)
-                log(
-                    "trial",
-                    "failed to start %s-day %s trial for %s: %s",
-                    days,
-                    grade,
-                    u.telegram_id,
-                    exc,
-                )
-        delivered = len(users) - len(failed)
-        log(
-            "trial",
-            "started %s-day %s trial for all users: success=%s, failed=%s",
-            days,
-            grade,
-            delivered,
-            len(failed),
-        )
+        count = count_trial_targets(session)
         session.close()
-        text = ADMIN_TRIAL_DONE
-        if failed:
-            preview = ", ".join(map(str, failed[:10]))
-            text += f"\nНе удалось подключить {len(failed)} пользователям."
-            if preview:
-                text += f"\nIDs: {preview}"
-        await message.answer(text, reply_markup=admin_menu_kb())
-        await state.clear()
+        await state.update_data(bulk_op="trial", bulk_days=days, bulk_grade=grade)
+        await state.set_state(AdminState.waiting_bulk_confirm)
+        await message.answer(
+            ADMIN_BULK_CONFIRM.format(count=count), reply_markup=bulk_confirm_kb()
+        )
     else:
         await state.update_data(trial_days=days)
         await state.set_state(AdminState.waiting_trial_user_id)
@@ -1086,26 +1195,16 @@ async def process_grade_user_id(message: types.Message, state: FSMContext):
     if not user:
         from ..subscriptions import ensure_user
         user = ensure_user(session, telegram_id)
-    now = datetime.utcnow()
-    if user.trial:
-        user.trial = False
-        user.trial_end = None
-        user.resume_grade = None
-        user.resume_period_end = None
-    user.grade = grade
-    user.request_limit = PAID_LIMIT
-    user.requests_used = 0
-    user.period_start = now
-    user.period_end = now + timedelta(days=days)
-    user.notified_7d = False
-    user.notified_3d = False
-    user.notified_1d = False
-    user.notified_0d = False
     session.commit()
-    from ..logger import log
-    log("grade", "set %s grade for %s days to %s", grade, days, telegram_id)
+    result = await bulk_set_grade(session, [user.id], grade, days)
     session.close()
-    await message.answer(ADMIN_GRADE_DONE, reply_markup=admin_menu_kb())
+    if result.failed:
+        await message.answer(
+            f"Не удалось активировать грейд для {telegram_id}",
+            reply_markup=admin_menu_kb(),
+        )
+    else:
+        await message.answer(ADMIN_GRADE_DONE, reply_markup=admin_menu_kb())
     await state.clear()
 
 
@@ -1266,6 +1365,10 @@ async def admin_unblock(query: types.CallbackQuery):
     if user:
         user.blocked = False
         session.commit()
+        # the schedule rebuild skipped the user while blocked
+        if not user.left_bot:
+            refresh_user_schedule(user)
+    mark_unblocked(telegram_id)
     from ..logger import log
     log("block", "unblocked %s", telegram_id)
     session.close()
@@ -1300,6 +1403,7 @@ def admin_settings_kb() -> types.InlineKeyboardMarkup:
     settings = "🟢" if get_option_bool("feat_settings") else "🔴"
     reminders = "🟢" if get_option_bool("feat_reminders") else "🔴"
     goals = "🟢" if get_option_bool("feat_goals") else "🔴"
+    digest = "🟢" if get_option_bool("feat_digest") else "🔴"
     builder.button(
         text=f"{BTN_SETTINGS} {settings}", callback_data="admin:toggle:feat_settings"
     )
@@ -1309,6 +1413,19 @@ def admin_settings_kb() -> types.InlineKeyboardMarkup:
     builder.button(
         text=f"{BTN_GOALS} {goals}", callback_data="admin:toggle:feat_goals"
     )
+    builder.button(
+        text=f"{BTN_DIGEST} {digest}", callback_data="admin:toggle:feat_digest"
+    )
+    for grade, name in (
+        ("free", BTN_GRADE_FREE),
+        ("light", BTN_GRADE_START),
+        ("pro", BTN_GRADE_PRO),
+    ):
+        ai = "🟢" if get_option_bool(f"goal_ai_{grade}", grade == "pro") else "🔴"
+        builder.button(
+            text=f"{BTN_GOAL_AI} {name} {ai}",
+            callback_data=f"admin:toggle:goal_ai_{grade}",
+        )
     builder.button(text=BTN_BACK, callback_data="admin:features")
     builder.adjust(1)
     return builder.as_markup()
@@ -1393,51 +1510,78 @@ async def admin_toggle(query: types.CallbackQuery):
         await admin_methods(query)
     elif key.startswith("grade_"):
         await admin_grades(query)
+    elif key.startswith("goal_ai_"):
+        await admin_settings_menu(query)
     else:
         await admin_features(query)
 
 
 def register(dp: Dispatcher):
+    # every admin button refuses non-admins with an alert
+    def callback(handler, *filters):
+        dp.callback_query.register(handler, *filters, flags={"alert": True})
+
     dp.message.register(admin_login, F.text.startswith(f"/{ADMIN_COMMAND}"))
-    dp.callback_query.register(admin_broadcast_menu, F.data == "admin:broadcast")
-    dp.callback_query.register(admin_broadcast_prompt, F.data == "admin:broadcast:text")
-    dp.callback_query.register(
-        admin_broadcast_support_prompt, F.data == "admin:broadcast:support"
+    callback(admin_broadcast_menu, F.data == "admin:broadcast")
+    callback(admin_broadcast_prompt, F.data == "admin:broadcast:text")
+    callback(admin_broadcast_support_prompt, F.data == "admin:broadcast:support")
+    callback(admin_broadcast_cancel, F.data.startswith("admin:broadcast:cancel:"))
+    callback(
+        admin_broadcast_confirm,
+        AdminState.waiting_broadcast_confirm,
+        F.data == "admin:broadcast:confirm",
+    )
+    callback(
+        admin_broadcast_local_time,
+        AdminState.waiting_broadcast_confirm,
+        F.data == "admin:broadcast:local_time",
+    )
+    callback(admin_discount_menu, F.data == "admin:discount")
+    callback(admin_discount_all, F.data == "admin:discount_all")
+    callback(admin_discount_one, F.data == "admin:discount_one")
+    callback(admin_discount_confirm, F.data == "admin:discount_confirm")
+    callback(
+        admin_bulk_confirm,
+        AdminState.waiting_bulk_confirm,
+        F.data == "admin:bulk_confirm",
+    )
+    callback(admin_days_menu, F.data == "admin:days")
+    callback(admin_days_one, F.data == "admin:days_one")
+    callback(admin_days_all, F.data == "admin:days_all")
+    callback(admin_block_prompt, F.data == "admin:block")
+    callback(admin_user_prompt, F.data == "admin:user")
+    callback(admin_comment_prompt, F.data.startswith("admin:comment:"))
+    callback(admin_trial_menu, F.data == "admin:trial")
+    callback(admin_trial_one, F.data == "admin:trial_one")
+    callback(admin_trial_all, F.data == "admin:trial_all")
+    callback(admin_trial_grade, F.data.startswith("admin:trial_one"))
+    callback(admin_trial_grade, F.data.startswith("admin:trial_all"))
+    callback(admin_trial_start, F.data == "admin:trial_start")
+    callback(admin_trial_start_grade, F.data.startswith("admin:trial_start:"))
+    callback(admin_trial_toggle, F.data.startswith("admin:trial_toggle:"))
+    callback(admin_trial_days_set, F.data.startswith("admin:trial_days_set:"))
+    callback(admin_features, F.data == "admin:features")
+    callback(admin_methods, F.data == "admin:methods")
+    callback(admin_grades, F.data == "admin:grades")
+    callback(admin_settings_menu, F.data == "admin:settings")
+    callback(admin_toggle, F.data.startswith("admin:toggle:"))
+    callback(admin_grade_menu, F.data == "admin:grade")
+    callback(admin_grade_type, F.data.startswith("admin:grade_set:"))
+    callback(admin_blocked_list, F.data.startswith("admin:blocked"))
+    callback(admin_unblock_prompt, F.data.startswith("admin:unblock:"))
+    callback(admin_unblock, F.data.startswith("admin:unblock_yes:"))
+    callback(admin_stats, F.data == "admin:stats")
+    callback(admin_referral_list, F.data.startswith("admin:referral"))
+    callback(admin_menu, F.data == "admin:menu")
+    broadcast_content = F.text | F.photo | F.video | F.document
+    dp.message.register(process_broadcast, AdminState.waiting_broadcast, broadcast_content)
+    dp.message.register(
+        process_broadcast_support, AdminState.waiting_broadcast_support, broadcast_content
+    )
+    dp.message.register(
+        process_broadcast_segment, AdminState.waiting_broadcast_segment, F.text
     )
-    dp.callback_query.register(admin_discount_menu, F.data == "admin:discount")
-    dp.callback_query.register(admin_discount_all, F.data == "admin:discount_all")
-    dp.callback_query.register(admin_discount_one, F.data == "admin:discount_one")
-    dp.callback_query.register(admin_discount_confirm, F.data == "admin:discount_confirm")
-    dp.callback_query.register(admin_days_menu, F.data == "admin:days")
-    dp.callback_query.register(admin_days_one, F.data == "admin:days_one")
-    dp.callback_query.register(admin_days_all, F.data == "admin:days_all")
-    dp.callback_query.register(admin_block_prompt, F.data == "admin:block")
-    dp.callback_query.register(admin_user_prompt, F.data == "admin:user")
-    dp.callback_query.register(admin_comment_prompt, F.data.startswith("admin:comment:"))
-    dp.callback_query.register(admin_trial_menu, F.data == "admin:trial")
-    dp.callback_query.register(admin_trial_one, F.data == "admin:trial_one")
-    dp.callback_query.register(admin_trial_all, F.data == "admin:trial_all")
-    dp.callback_query.register(admin_trial_grade, F.data.startswith("admin:trial_one"))
-    dp.callback_query.register(admin_trial_grade, F.data.startswith("admin:trial_all"))
-    dp.callback_query.register(admin_trial_start, F.data == "admin:trial_start")
-    dp.callback_query.register(admin_trial_start_grade, F.data.startswith("admin:trial_start:"))
-    dp.callback_query.register(admin_trial_toggle, F.data.startswith("admin:trial_toggle:"))
-    dp.callback_query.register(admin_trial_days_set, F.data.startswith("admin:trial_days_set:"))
-    dp.callback_query.register(admin_features, F.data == "admin:features")
-    dp.callback_query.register(admin_methods, F.data == "admin:methods")
-    dp.callback_query.register(admin_grades, F.data == "admin:grades")
-    dp.callback_query.register(admin_settings_menu, F.data == "admin:settings")
-    dp.callback_query.register(admin_toggle, F.data.startswith("admin:toggle:"))
-    dp.callback_query.register(admin_grade_menu, F.data == "admin:grade")
-    dp.callback_query.register(admin_grade_type, F.data.startswith("admin:grade_set:"))
-    dp.callback_query.register(admin_blocked_list, F.data.startswith("admin:blocked"))
-    dp.callback_query.register(admin_unblock_prompt, F.data.startswith("admin:unblock:"))
-    dp.callback_query.register(admin_unblock, F.data.startswith("admin:unblock_yes:"))
-    dp.callback_query.register(admin_stats, F.data == "admin:stats")
-    dp.callback_query.register(admin_referral_list, F.data.startswith("admin:referral"))
-    dp.callback_query.register(admin_menu, F.data == "admin:menu")
-    dp.message.register(process_broadcast, AdminState.waiting_broadcast, F.text)
-    dp.message.register(process_broadcast_support, AdminState.waiting_broadcast_support, F.text)
+    dp.message.register(process_broadcast_time, AdminState.waiting_broadcast_time, F.text)
     dp.message.register(process_user_id, AdminState.waiting_user_id, F.text)
     dp.message.register(process_days, AdminState.waiting_days, F.text)
     dp.message.register(process_days_all, AdminState.waiting_days_all, F.text)
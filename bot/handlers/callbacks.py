@@ -4,10 +4,10 @@ import time
 from datetime import datetime, timedelta
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
-from aiogram.exceptions import TelegramBadRequest
 from sqlalchemy import func
 
-from ..database import SessionLocal, User, Meal
+from ..database import SessionLocal, User, Meal, record_meal_saved
+from ..edits import apply_edit
 from ..services import (
     analyze_photo_with_hint,
     analyze_text_with_hint,
@@ -118,11 +118,7 @@ async def cb_lookup_back(query: types.CallbackQuery, state: FSMContext):
     builder = choose_product_kb(meal_id, meal.get('results', []))
     await state.update_data(meal_id=meal_id)
     await state.set_state(LookupMeal.choosing)
-    try:
-        await query.message.edit_text(LOOKUP_PROMPT, reply_markup=builder)
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    await apply_edit(query.message.edit_text(LOOKUP_PROMPT, reply_markup=builder))
     await query.answer()
 
 
@@ -133,13 +129,11 @@ async def cb_lookup_ref(query: types.CallbackQuery, state: FSMContext):
         return
     await state.update_data(meal_id=meal_id)
     await state.set_state(LookupMeal.entering_query)
-    try:
-        await query.message.edit_text(
+    await apply_edit(
+        query.message.edit_text(
             LOOKUP_REFINE, reply_markup=weight_back_kb(meal_id)
         )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    )
     await query.answer()
 
 
@@ -189,15 +183,7 @@ async def process_edit(message: types.Message, state: FSMContext):
             return
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await state.clear()
-        return
+    notify_trial_end(session, user)
     grade = user.grade
     session.close()
     MAX_LEN = 200
@@ -255,8 +241,8 @@ async def process_edit(message: types.Message, state: FSMContext):
             await message.delete()
         except Exception:
             pass
-        try:
-            await message.bot.edit_message_text(
+        await apply_edit(
+            message.bot.edit_message_text(
                 text=format_meal_message(
                     meal['name'], meal['serving'], meal['macros'], user_id=message.from_user.id
                 ),
@@ -264,9 +250,7 @@ async def process_edit(message: types.Message, state: FSMContext):
                 message_id=meal['message_id'],
                 reply_markup=meal_actions_kb(meal_id)
             )
-        except TelegramBadRequest as e:
-            if "message is not modified" not in str(e):
-                raise
+        )
         await state.clear()
         return
     serving = parse_serving(result.get('serving', meal['serving']))
@@ -291,8 +275,8 @@ async def process_edit(message: types.Message, state: FSMContext):
             pass
         meal.pop('error_msg', None)
     await message.delete()
-    try:
-        await message.bot.edit_message_text(
+    await apply_edit(
+        message.bot.edit_message_text(
             text=format_meal_message(
                 meal['name'], meal['serving'], meal['macros'], user_id=message.from_user.id
             ),
@@ -300,9 +284,7 @@ async def process_edit(message: types.Message, state: FSMContext):
             message_id=meal['message_id'],
             reply_markup=meal_actions_kb(meal_id)
         )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    )
     await state.clear()
 
 async def cb_delete(query: types.CallbackQuery):
@@ -334,13 +316,6 @@ async def _final_save(query: types.CallbackQuery, meal_id: str, fraction: float
         user = User(telegram_id=query.from_user.id)
         session.add(user)
         session.commit()
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
     serving = round(parse_serving(meal.get('orig_serving', meal['serving'])) * fraction, 1)
     macros = {
         k: round(to_float(v) * fraction, 1)
@@ -359,6 +334,7 @@ async def _final_save(query: types.CallbackQuery, meal_id: str, fraction: float
         carbs=macros['carbs'],
     )
     session.add(new_meal)
+    record_meal_saved(user, new_meal)
     session.commit()
     log("meal_save", "meal saved for %s: %s %s g", query.from_user.id, name, serving)
 
@@ -412,16 +388,14 @@ async def process_lookup_query(message: types.Message, state: FSMContext):
     meal['results'] = results
     builder = choose_product_kb(meal_id, results)
     await message.delete()
-    try:
-        await message.bot.edit_message_text(
+    await apply_edit(
+        message.bot.edit_message_text(
             LOOKUP_PROMPT,
             chat_id=meal["chat_id"],
             message_id=meal["message_id"],
             reply_markup=builder,
         )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    )
     await state.set_state(LookupMeal.choosing)
 
 
@@ -452,8 +426,8 @@ async def process_weight(message: types.Message, state: FSMContext):
         'orig_macros': macros.copy(),
     })
     await message.delete()
-    try:
-        await message.bot.edit_message_text(
+    await apply_edit(
+        message.bot.edit_message_text(
             format_meal_message(
                 meal['name'], grams, macros, user_id=message.from_user.id
             ),
@@ -461,9 +435,7 @@ async def process_weight(message: types.Message, state: FSMContext):
             message_id=meal['message_id'],
             reply_markup=add_delete_back_kb(meal_id),
         )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    )
     await state.clear()
 
 async def cb_save_full(query: types.CallbackQuery):
@@ -595,18 +567,31 @@ async def cb_add(query: types.CallbackQuery):
 def register(dp: Dispatcher):
     dp.callback_query.register(cb_edit, F.data.startswith('edit:'))
     dp.callback_query.register(cb_refine, F.data == 'refine')
-    dp.callback_query.register(cb_pick, F.data.startswith('pick:'))
-    dp.callback_query.register(cb_lookup_ref, F.data.startswith('lookref:'))
-    dp.callback_query.register(cb_lookup_back, F.data.startswith('lookback:'))
+    dp.callback_query.register(cb_pick, F.data.startswith('pick:'), flags={"alert": True})
+    dp.callback_query.register(cb_lookup_ref, F.data.startswith('lookref:'), flags={"alert": True})
+    dp.callback_query.register(
+        cb_lookup_back,
+        F.data.startswith('lookback:'),
+        flags={"alert": True},
+    )
     dp.callback_query.register(cb_cancel, F.data == 'cancel')
-    dp.message.register(process_edit, StateFilter(EditMeal.waiting_input), F.text)
+    dp.message.register(
+        process_edit,
+        StateFilter(EditMeal.waiting_input),
+        F.text,
+        flags={"throttle": True},
+    )
     dp.message.register(process_lookup_query, StateFilter(LookupMeal.entering_query), F.text)
     dp.message.register(process_weight, StateFilter(LookupMeal.entering_weight), F.text)
     dp.callback_query.register(cb_delete, F.data.startswith('delete:'))
-    dp.callback_query.register(cb_save, F.data.startswith('save:'))
-    dp.callback_query.register(cb_save_full, F.data.startswith('full:'))
-    dp.callback_query.register(cb_save_half, F.data.startswith('half:'))
-    dp.callback_query.register(cb_save_quarter, F.data.startswith('quarter:'))
-    dp.callback_query.register(cb_save_threeq, F.data.startswith('threeq:'))
+    dp.callback_query.register(cb_save, F.data.startswith('save:'), flags={"alert": True})
+    dp.callback_query.register(cb_save_full, F.data.startswith('full:'), flags={"alert": True})
+    dp.callback_query.register(cb_save_half, F.data.startswith('half:'), flags={"alert": True})
+    dp.callback_query.register(
+        cb_save_quarter,
+        F.data.startswith('quarter:'),
+        flags={"alert": True},
+    )
+    dp.callback_query.register(cb_save_threeq, F.data.startswith('threeq:'), flags={"alert": True})
     dp.callback_query.register(cb_save_back, F.data.startswith('back:'))
-    dp.callback_query.register(cb_add, F.data.startswith('add:'))
+    dp.callback_query.register(cb_add, F.data.startswith('add:'), flags={"alert": True})
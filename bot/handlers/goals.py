@@ -12,6 +12,8 @@ from aiogram.filters import StateFilter
 from PIL import Image, ImageOps, UnidentifiedImageError
 
 from ..database import SessionLocal, Goal, Meal, get_option_bool
+from ..views import View, show_view
+from ..reminder_schedule import refresh_user_schedule
 from ..subscriptions import ensure_user, update_limits
 from ..keyboards import (
     goal_start_kb,
@@ -544,6 +546,7 @@ async def open_goals(query: types.CallbackQuery, state: FSMContext):
                 )
             user.goal_trial_notified = True
             session.commit()
+            refresh_user_schedule(user)
             await query.message.edit_text(
                 GOAL_TRIAL_PAYWALL_TEXT,
                 reply_markup=goal_trial_paywall_kb(),
@@ -957,6 +960,7 @@ async def goal_confirm_save(query: types.CallbackQuery, state: FSMContext):
         goal.reminder_morning = True
         goal.reminder_evening = True
     session.commit()
+    refresh_user_schedule(user)
     session.refresh(goal)
     summary = goal_summary_text(goal, session)
     session.close()
@@ -1071,6 +1075,7 @@ async def goal_toggle(query: types.CallbackQuery):
     else:
         goal.reminder_evening = not goal.reminder_evening
     session.commit()
+    refresh_user_schedule(user)
     text = GOAL_REMINDERS_TEXT.format(
         time=(datetime.utcnow() + timedelta(minutes=user.timezone or 0)).strftime("%H:%M")
     )
@@ -1119,6 +1124,7 @@ async def goal_timezone(message: types.Message, state: FSMContext):
     user.goal = goal
     user.timezone = diff
     session.commit()
+    refresh_user_schedule(user)
     data = await state.get_data()
     prompt_id = data.get("prompt_id")
     return_to = data.get("return_to", "settings")
@@ -1162,9 +1168,9 @@ async def goal_reminder_settings(query: types.CallbackQuery):
 async def goal_set_time_prompt(
     query: types.CallbackQuery, state: FSMContext, field: str, name: str
 ):
-    await query.message.edit_text(SET_TIME_PROMPT.format(name=name))
-    await query.message.edit_reply_markup(
-        reply_markup=back_to_goal_reminders_settings_kb()
+    await show_view(
+        query.message,
+        View(SET_TIME_PROMPT.format(name=name), back_to_goal_reminders_settings_kb()),
     )
     await state.update_data(prompt_id=query.message.message_id)
     await state.set_state(getattr(GoalReminderState, field))
@@ -1195,6 +1201,7 @@ async def goal_process_time(
     user = ensure_user(session, message.from_user.id)
     setattr(user, attr, f"{hours:02d}:{minutes:02d}")
     session.commit()
+    refresh_user_schedule(user)
     data = await state.get_data()
     prompt_id = data.get("prompt_id")
     await state.clear()
@@ -1237,6 +1244,7 @@ async def goal_stop_confirm(query: types.CallbackQuery):
     if user.goal:
         session.delete(user.goal)
         session.commit()
+        refresh_user_schedule(user)
     session.close()
     try:
         await query.message.delete()
@@ -1261,7 +1269,11 @@ async def goals_main(query: types.CallbackQuery):
 
 
 def register(dp: Dispatcher):
-    dp.callback_query.register(open_goals, F.data.in_(["goals", "goals_main"]))
+    dp.callback_query.register(
+        open_goals,
+        F.data.in_(["goals", "goals_main"]),
+        flags={"alert": True},
+    )
     dp.callback_query.register(goal_start, F.data == "goal_start")
     dp.callback_query.register(goal_cancel, F.data == "goal_cancel")
     dp.callback_query.register(goal_set_gender, F.data.startswith("goal_gender:"))
@@ -1,4 +1,3 @@
-import asyncio
 import time
 from datetime import timedelta
 from aiogram import types, Dispatcher, F
@@ -24,6 +23,7 @@ from ..subscriptions import (
     has_request_quota,
 )
 from ..database import SessionLocal
+from ..views import View, show_view
 from ..states import ManualMeal, EditMeal, LookupMeal
 from ..storage import pending_meals
 from ..texts import (
@@ -52,15 +52,7 @@ async def manual_start(query: types.CallbackQuery, state: FSMContext):
 
     session = SessionLocal()
     user = ensure_user(session, query.from_user.id)
-    await notify_trial_end(query.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await query.answer()
-        return
+    notify_trial_end(session, user)
     if not has_request_quota(session, user):
         reset = (
             user.period_end.date()
@@ -77,8 +69,7 @@ async def manual_start(query: types.CallbackQuery, state: FSMContext):
         await query.answer()
         return
     session.close()
-    await query.message.edit_text(MANUAL_PROMPT, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=back_inline_kb())
+    await show_view(query.message, View(MANUAL_PROMPT, back_inline_kb(), "HTML"))
     await state.set_state(ManualMeal.waiting_text)
     await query.answer()
     log("notification", "manual input prompt sent to %s", query.from_user.id)
@@ -95,14 +86,7 @@ async def process_manual(message: types.Message, state: FSMContext):
 
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
+    notify_trial_end(session, user)
     ok, reason = consume_request(session, user)
     if not ok:
         if reason == "daily":
@@ -145,7 +129,7 @@ async def process_manual(message: types.Message, state: FSMContext):
     if isinstance(results, list) and results and results[0].get("error"):
         await message.answer(MANUAL_ERROR)
         log("prompt", "manual text not recognized for %s", message.from_user.id)
-        asyncio.create_task(process_request_events(message.bot, message.from_user.id))
+        process_request_events(message.from_user.id)
         return
     if not isinstance(results, list):
         results = [results]
@@ -153,7 +137,7 @@ async def process_manual(message: types.Message, state: FSMContext):
     if not valid:
         await message.answer(MANUAL_ERROR)
         log("prompt", "manual text not recognized for %s", message.from_user.id)
-        asyncio.create_task(process_request_events(message.bot, message.from_user.id))
+        process_request_events(message.from_user.id)
         return
 
     # suppress reminders for previous pending meals from this user
@@ -230,11 +214,14 @@ async def process_manual(message: types.Message, state: FSMContext):
         pending_meals[meal_id]["message_id"] = msg.message_id
         pending_meals[meal_id]["chat_id"] = msg.chat.id
     await state.clear()
-    asyncio.create_task(process_request_events(message.bot, message.from_user.id))
+    process_request_events(message.from_user.id)
 
 
 def register(dp: Dispatcher):
-    dp.callback_query.register(manual_start, F.data == "manual")
+    dp.callback_query.register(manual_start, F.data == "manual", flags={"alert": True})
     dp.message.register(
-        process_manual, StateFilter(ManualMeal.waiting_text), F.text
+        process_manual,
+        StateFilter(ManualMeal.waiting_text),
+        F.text,
+        flags={"throttle": True},
     )
@@ -1,4 +1,3 @@
-import asyncio
 import tempfile
 import time
 from datetime import datetime, timedelta
@@ -50,14 +49,7 @@ from ..engagement import process_request_events
 async def request_photo(message: types.Message):
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
+    notify_trial_end(session, user)
     if not has_request_quota(session, user):
         reset = (
             user.period_end.date()
@@ -93,14 +85,7 @@ async def handle_photo(message: types.Message, state: FSMContext):
     reset_multi_photo_prompt(message.from_user.id)
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
+    notify_trial_end(session, user)
     ok, reason = consume_request(session, user)
     if not ok:
         if reason == "daily":
@@ -135,7 +120,7 @@ async def handle_photo(message: types.Message, state: FSMContext):
             )
         session.close()
         return
-    await reward_first_analysis(message.bot, session, user)
+    reward_first_analysis(session, user)
     grade = user.grade
     session.close()
 
@@ -158,7 +143,7 @@ async def handle_photo(message: types.Message, state: FSMContext):
     log("prompt", "photo analyzed for %s", message.from_user.id)
     if isinstance(results, list) and results and results[0].get("error"):
         await processing_msg.edit_text(RECOGNITION_ERROR)
-        asyncio.create_task(process_request_events(message.bot, message.from_user.id))
+        process_request_events(message.from_user.id)
         return
     if not isinstance(results, list):
         results = [results]
@@ -167,7 +152,7 @@ async def handle_photo(message: types.Message, state: FSMContext):
     all_names = [r.get("name") for r in valid if r.get("name")]
     if not valid:
         await processing_msg.edit_text(NO_FOOD_ERROR)
-        asyncio.create_task(process_request_events(message.bot, message.from_user.id))
+        process_request_events(message.from_user.id)
         return
 
     # prevent multiple reminders: mark previous pending meals from this user as reminded
@@ -270,7 +255,7 @@ async def handle_photo(message: types.Message, state: FSMContext):
             pending_meals[meal_id]["message_id"] = msg.message_id
             pending_meals[meal_id]["chat_id"] = msg.chat.id
 
-    asyncio.create_task(process_request_events(message.bot, message.from_user.id))
+    process_request_events(message.from_user.id)
 
 
 async def handle_document(message: types.Message):
@@ -279,5 +264,5 @@ async def handle_document(message: types.Message):
 
 
 def register(dp: Dispatcher):
-    dp.message.register(handle_photo, F.photo)
+    dp.message.register(handle_photo, F.photo, flags={"throttle": True})
     dp.message.register(handle_document, F.document)
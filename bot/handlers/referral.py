@@ -9,6 +9,8 @@ from ..texts import (
 )
 from ..keyboards import referral_inline_kb
 from ..database import get_option_bool, SessionLocal, User, Payment
+from ..views import View, show_view
+from ..outbox import PRIORITY_INTERACTIVE, enqueue
 from ..subscriptions import ensure_user, add_subscription_days, start_trial
 
 
@@ -38,7 +40,7 @@ def get_referral_stats(session: SessionLocal, referrer_tg: int) -> tuple[int, in
     return total, days
 
 
-async def reward_first_analysis(bot, session: SessionLocal, user) -> None:
+def reward_first_analysis(session: SessionLocal, user) -> None:
     """Reward the referrer when invitee makes their first request."""
     if not get_option_bool("feat_referral") or not user.referrer_id:
         return
@@ -46,15 +48,17 @@ async def reward_first_analysis(bot, session: SessionLocal, user) -> None:
         return
     referrer = ensure_user(session, user.referrer_id)
     _grant_days(session, referrer, 5)
-    try:
-        await bot.send_message(user.referrer_id, REFERRAL_FRIEND_ACTIVATED)
-    except Exception:
-        pass
+    enqueue(
+        session,
+        user.referrer_id,
+        REFERRAL_FRIEND_ACTIVATED,
+        event="referral activation reward",
+        priority=PRIORITY_INTERACTIVE,
+    )
+    session.commit()
 
 
-async def reward_subscription(
-    bot, session: SessionLocal, user, payments: int
-) -> None:
+def reward_subscription(session: SessionLocal, user, payments: int) -> None:
     """Reward the referrer when invitee buys a subscription."""
     if not get_option_bool("feat_referral") or not user.referrer_id:
         return
@@ -62,10 +66,14 @@ async def reward_subscription(
         return
     referrer = ensure_user(session, user.referrer_id)
     _grant_days(session, referrer, 30)
-    try:
-        await bot.send_message(user.referrer_id, REFERRAL_FRIEND_PAID)
-    except Exception:
-        pass
+    enqueue(
+        session,
+        user.referrer_id,
+        REFERRAL_FRIEND_PAID,
+        event="referral payment reward",
+        priority=PRIORITY_INTERACTIVE,
+    )
+    session.commit()
 
 async def _referral_link(bot, user_id: int) -> str:
     me = await bot.get_me()
@@ -74,8 +82,7 @@ async def _referral_link(bot, user_id: int) -> str:
 async def cb_referral(query: types.CallbackQuery):
     link = await _referral_link(query.bot, query.from_user.id)
     text = REFERRAL_INTRO.format(link=link)
-    await query.message.edit_text(text, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=referral_inline_kb(link))
+    await show_view(query.message, View(text, referral_inline_kb(link), "HTML"))
     await query.answer()
 
 async def cb_referral_stats(query: types.CallbackQuery):
@@ -84,8 +91,7 @@ async def cb_referral_stats(query: types.CallbackQuery):
     count, days = get_referral_stats(session, query.from_user.id)
     session.close()
     text = REFERRAL_STATS.format(count=count, days=days)
-    await query.message.edit_text(text, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=referral_inline_kb(link))
+    await show_view(query.message, View(text, referral_inline_kb(link), "HTML"))
     await query.answer()
 
 
@@ -4,6 +4,8 @@ from aiogram.filters import StateFilter
 from datetime import datetime, timedelta
 
 from ..database import SessionLocal
+from ..views import View, show_view
+from ..reminder_schedule import refresh_user_schedule
 from ..subscriptions import ensure_user
 from ..keyboards import (
     settings_menu_kb,
@@ -91,6 +93,7 @@ async def process_timezone(message: types.Message, state: FSMContext):
     user = ensure_user(session, message.from_user.id)
     user.timezone = diff
     session.commit()
+    refresh_user_schedule(user)
     data = await state.get_data()
     prompt_id = data.get("prompt_id")
     await state.clear()
@@ -119,6 +122,7 @@ async def toggle(query: types.CallbackQuery, field: str):
     value = getattr(user, field)
     setattr(user, field, not value)
     session.commit()
+    refresh_user_schedule(user)
     text = (
         REMINDER_ON.format(name=query.data.split('_')[1])
         if not value
@@ -144,8 +148,10 @@ async def open_reminder_settings(query: types.CallbackQuery):
 
 
 async def set_time_prompt(query: types.CallbackQuery, state: FSMContext, field: str, name: str):
-    await query.message.edit_text(SET_TIME_PROMPT.format(name=name))
-    await query.message.edit_reply_markup(reply_markup=back_to_reminder_settings_kb())
+    await show_view(
+        query.message,
+        View(SET_TIME_PROMPT.format(name=name), back_to_reminder_settings_kb()),
+    )
     await state.update_data(prompt_id=query.message.message_id)
     await state.set_state(getattr(ReminderState, field))
     await query.answer()
@@ -168,6 +174,7 @@ async def process_time(message: types.Message, state: FSMContext, field: str, na
     user = ensure_user(session, message.from_user.id)
     setattr(user, field, time_str)
     session.commit()
+    refresh_user_schedule(user)
     data = await state.get_data()
     prompt_id = data.get("prompt_id")
     local_time = (
@@ -233,15 +240,16 @@ async def process_evening_time(message: types.Message, state: FSMContext):
 
 
 def register(dp: Dispatcher):
-    dp.callback_query.register(open_settings, F.data == "settings")
+    dp.callback_query.register(open_settings, F.data == "settings", flags={"alert": True})
     dp.callback_query.register(
         open_reminders,
         F.data.in_(["reminders", "reminders_back", "update_tz"]),
+        flags={"alert": True},
     )
     dp.callback_query.register(open_reminder_settings, F.data == "reminder_settings")
-    dp.callback_query.register(toggle_morning, F.data == "toggle_morning")
-    dp.callback_query.register(toggle_day, F.data == "toggle_day")
-    dp.callback_query.register(toggle_evening, F.data == "toggle_evening")
+    dp.callback_query.register(toggle_morning, F.data == "toggle_morning", flags={"alert": True})
+    dp.callback_query.register(toggle_day, F.data == "toggle_day", flags={"alert": True})
+    dp.callback_query.register(toggle_evening, F.data == "toggle_evening", flags={"alert": True})
     dp.callback_query.register(set_morning_prompt, F.data == "set_morning")
     dp.callback_query.register(set_day_prompt, F.data == "set_day")
     dp.callback_query.register(set_evening_prompt, F.data == "set_evening")
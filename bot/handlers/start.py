@@ -2,8 +2,10 @@ from aiogram import types, Dispatcher, F
 from aiogram.filters import Command
 
 from ..database import SessionLocal, User
+from ..views import View, show_view
 from ..subscriptions import ensure_user, days_left, update_limits, notify_trial_end
 from ..keyboards import main_menu_kb, menu_inline_kb
+from ..reachability import mark_reachable
 from ..texts import (
     WELCOME_BASE,
     WELCOME_INTRO,
@@ -49,7 +51,7 @@ async def cmd_start(message: types.Message):
     existed = session.query(User).filter_by(telegram_id=message.from_user.id).first()
     new_user = existed is None
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
+    notify_trial_end(session, user)
     from ..subscriptions import check_start_trial, start_trial
     from ..database import get_option_bool
 
@@ -71,13 +73,6 @@ async def cmd_start(message: types.Message):
             trial = check_start_trial(session, user)
     else:
         trial = check_start_trial(session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
     text = get_welcome_text(user)
     session.commit()
     session.close()
@@ -129,8 +124,8 @@ async def on_user_unblocked(event: types.ChatMemberUpdated):
         and event.old_chat_member.status in {"kicked", "left"}
     ):
         session = SessionLocal()
-        user = ensure_user(session, event.from_user.id)
-        user.left_bot = False
+        ensure_user(session, event.from_user.id)
+        mark_reachable(session, event.from_user.id)
         session.commit()
         session.close()
         from ..alerts import user_unblocked as alert_user_unblocked
@@ -142,14 +137,7 @@ async def back_to_menu(message: types.Message):
     """Return user to the main menu."""
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
+    notify_trial_end(session, user)
     text = get_welcome_text(user)
     session.commit()
     session.close()
@@ -170,20 +158,11 @@ async def back_to_menu(message: types.Message):
 async def cb_menu(query: types.CallbackQuery):
     session = SessionLocal()
     user = ensure_user(session, query.from_user.id)
-    await notify_trial_end(query.bot, session, user)
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await query.answer()
-        return
-    text = get_welcome_text(user)
+    notify_trial_end(session, user)
+    view = View(get_welcome_text(user), menu_inline_kb(), "HTML")
     session.commit()
     session.close()
-    await query.message.edit_text(text, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=menu_inline_kb())
+    await show_view(query.message, view)
     await query.answer()
 
 
@@ -4,6 +4,8 @@ from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from ..database import SessionLocal, Meal, User
+from ..edits import apply_edit
+from ..views import View, show_view
 from ..utils import make_bar_chart
 from ..keyboards import (
     stats_period_kb,
@@ -35,46 +37,18 @@ from ..texts import (
 )
 
 async def show_stats_menu(message: types.Message):
-    session = SessionLocal()
-    user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-    if user and user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
-    session.close()
     await message.answer(STATS_MENU_TEXT, reply_markup=stats_menu_kb(), parse_mode="HTML")
 
 
-async def cb_stats_menu(query: types.CallbackQuery):
-    session = SessionLocal()
-    user = session.query(User).filter_by(telegram_id=query.from_user.id).first()
-    if user and user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
+def stats_menu_view() -> View:
+    return View(STATS_MENU_TEXT, stats_menu_inline_kb(), "HTML")
 
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await query.answer()
-        return
-    session.close()
-    await query.message.edit_text(STATS_MENU_TEXT, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=stats_menu_inline_kb())
+
+async def cb_stats_menu(query: types.CallbackQuery):
+    await show_view(query.message, stats_menu_view())
     await query.answer()
 
 async def cmd_stats(message: types.Message):
-    session = SessionLocal()
-    user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-    if user and user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
-    session.close()
     await message.answer(
         STATS_CHOOSE_PERIOD, reply_markup=stats_period_kb()
     )
@@ -86,14 +60,6 @@ async def cb_stats(query: types.CallbackQuery):
         await query.answer(STATS_NO_DATA, show_alert=True)
         session.close()
         return
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await query.answer()
-        return
     period = query.data.split(':', 1)[1]
     now = datetime.utcnow()
     if period == 'day':
@@ -133,14 +99,6 @@ async def cb_report_day(query: types.CallbackQuery):
         await query.answer()
         session.close()
         return
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await query.answer()
-        return
     start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     end = start + timedelta(days=1)
     meals = (
@@ -150,14 +108,14 @@ async def cb_report_day(query: types.CallbackQuery):
         .all()
     )
     session.close()
+    # Show only a back button leading to the stats menu
+    builder = InlineKeyboardBuilder()
+    builder.button(text=BTN_BACK, callback_data="stats_menu")
+    builder.adjust(1)
     if not meals:
-        new_text = REPORT_EMPTY
-        if query.message.text != new_text:
-            await query.message.edit_text(new_text)
-        builder = InlineKeyboardBuilder()
-        builder.button(text=BTN_BACK, callback_data="stats_menu")
-        builder.adjust(1)
-        await query.message.edit_reply_markup(reply_markup=builder.as_markup())
+        await apply_edit(
+            query.message.edit_text(REPORT_EMPTY, reply_markup=builder.as_markup())
+        )
         await query.answer()
         return
 
@@ -202,14 +160,9 @@ async def cb_report_day(query: types.CallbackQuery):
         lines.append("")
         lines.extend(drinks)
 
-    new_text = "\n".join(lines)
-    if query.message.text != new_text:
-        await query.message.edit_text(new_text)
-    # Show only a back button leading to the stats menu
-    builder = InlineKeyboardBuilder()
-    builder.button(text=BTN_BACK, callback_data="stats_menu")
-    builder.adjust(1)
-    await query.message.edit_reply_markup(reply_markup=builder.as_markup())
+    await apply_edit(
+        query.message.edit_text("\n".join(lines), reply_markup=builder.as_markup())
+    )
     await query.answer()
 
 
@@ -221,13 +174,6 @@ async def report_day(message: types.Message):
         await message.answer(STATS_NO_DATA, reply_markup=main_menu_kb())
         session.close()
         return
-    if user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        return
     start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     end = start + timedelta(days=1)
     meals = (
@@ -295,20 +241,8 @@ async def report_day(message: types.Message):
 
 
 async def cb_my_meals(query: types.CallbackQuery):
-    session = SessionLocal()
-    user = session.query(User).filter_by(telegram_id=query.from_user.id).first()
-    if user and user.blocked:
-        from ..settings import SUPPORT_HANDLE
-        from ..texts import BLOCKED_TEXT
-
-        await query.message.answer(BLOCKED_TEXT.format(support=SUPPORT_HANDLE))
-        session.close()
-        await query.answer()
-        return
-    session.close()
     text, markup = build_history_text(query.from_user.id, 0, header=True)
-    await query.message.edit_text(text)
-    await query.message.edit_reply_markup(reply_markup=markup)
+    await show_view(query.message, View(text, markup))
     await query.answer()
 
 
@@ -319,4 +253,4 @@ def register(dp: Dispatcher):
     dp.callback_query.register(cb_stats_menu, F.data == 'stats_menu')
     dp.callback_query.register(cb_report_day, F.data == 'report_day')
     dp.callback_query.register(cb_my_meals, F.data == 'my_meals')
-    dp.callback_query.register(cb_stats, F.data.startswith('stats:'))
+    dp.callback_query.register(cb_stats, F.data.startswith('stats:'), flags={"alert": True})
@@ -4,6 +4,7 @@ from aiogram.fsm.context import FSMContext
 from datetime import datetime
 
 from ..database import SessionLocal, Payment
+from ..views import View, show_view
 from ..subscriptions import ensure_user, process_payment_success, notify_trial_end
 from .referral import reward_subscription
 from ..alerts import subscription_paid as alert_subscription_paid
@@ -62,8 +63,7 @@ async def show_rates_menu(message: types.Message):
 
 
 async def cb_rates_menu(query: types.CallbackQuery):
-    await query.message.edit_text(RATES_MENU_TEXT, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=tariffs_menu_inline_kb())
+    await show_view(query.message, View(RATES_MENU_TEXT, tariffs_menu_inline_kb(), "HTML"))
     await query.answer()
 
 
@@ -114,20 +114,23 @@ async def cb_pay(query: types.CallbackQuery):
 async def show_subscription_menu(message: types.Message):
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
+    notify_trial_end(session, user)
     text = build_intro_text(user)
     session.close()
     await message.answer(text, reply_markup=subscription_grades_inline_kb(), parse_mode="HTML")
 
 
+def plans_view(user) -> View:
+    return View(build_intro_text(user), subscription_grades_inline_kb(), "HTML")
+
+
 async def cb_subscribe(query: types.CallbackQuery, state: FSMContext):
     session = SessionLocal()
     user = ensure_user(session, query.from_user.id)
-    await notify_trial_end(query.bot, session, user)
-    text = build_intro_text(user)
+    notify_trial_end(session, user)
+    view = plans_view(user)
     session.close()
-    await query.message.edit_text(text, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=subscription_grades_inline_kb())
+    await show_view(query.message, view)
     await state.clear()
     await query.answer()
 
@@ -209,11 +212,10 @@ async def cb_plan_back(query: types.CallbackQuery):
 async def cb_sub_plans(query: types.CallbackQuery):
     session = SessionLocal()
     user = ensure_user(session, query.from_user.id)
-    await notify_trial_end(query.bot, session, user)
-    text = build_intro_text(user)
+    notify_trial_end(session, user)
+    view = plans_view(user)
     session.close()
-    await query.message.edit_text(text, parse_mode="HTML")
-    await query.message.edit_reply_markup(reply_markup=subscription_grades_inline_kb())
+    await show_view(query.message, view)
     await query.answer()
 
 async def handle_pre_checkout(query: types.PreCheckoutQuery, bot: Bot):
@@ -227,10 +229,10 @@ async def handle_successful_payment(message: types.Message):
     months = {"1m": 1, "3m": 3, "6m": 6}.get(code, 1)
     session = SessionLocal()
     user = ensure_user(session, message.from_user.id)
-    await notify_trial_end(message.bot, session, user)
+    notify_trial_end(session, user)
     process_payment_success(session, user, months, grade=tier)
     count = session.query(Payment).filter_by(user_id=user.id).count()
-    await reward_subscription(message.bot, session, user, count)
+    reward_subscription(session, user, count)
     session.close()
     grade_name = "🔸 Старт" if tier == "light" else "⚡ Pro-режим"
     await alert_subscription_paid(user.telegram_id, count, grade_name, months)
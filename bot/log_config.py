@@ -27,6 +27,12 @@ LOG_FLAGS = {
     'block': True,
     # Google Programmable Search lookups
     'google': True,
+    # Requests rejected by the per-user rate limiter
+    'throttle': True,
     # Utility helper functions
     'utils': True,
+    # Background watcher runs: items, errors, skipped and continued ticks
+    'watcher': True,
+    # Flood control responses from the Telegram API
+    'telegram': True,
 }
@@ -7,7 +7,7 @@ from datetime import datetime, time, timedelta, timezone
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from .config import API_TOKEN, SUBSCRIPTION_CHECK_INTERVAL, LOG_DIR
+from .config import API_TOKEN, LOG_DIR
 from .handlers import (
     start,
     photo,
@@ -22,30 +22,46 @@ from .handlers import (
     referral,
     goals,
 )
-from .subscriptions import subscription_watcher
-from .cleanup import cleanup_watcher
-from .reminders import reminder_watcher
-from .engagement import engagement_watcher
+from .background import register_watchers
+from .broadcasts import resume_broadcasts
+from .callback_answers import EarlyAnswerMiddleware, skip_repeated_answers
 from .alerts import (
-    token_watcher,
-    user_stats_watcher,
     setup_error_alerts,
     setup_asyncio_error_alerts,
     create_monitored_task,
 )
+from .edits import skip_unchanged_edits
 from .error_handler import handle_error
+from .messaging import send_limiter
+from .middlewares import BlockedUserMiddleware, load_blocked_users
+from .reachability import ReachabilityTracker, ReachableAgainMiddleware, load_unreachable
+from .throttling import ThrottlingMiddleware
+from .watchers import runtime
 
 bot = Bot(token=API_TOKEN)
+# outermost, so skipped edits take no send tokens
+bot.session.middleware(skip_unchanged_edits)
+bot.session.middleware(skip_repeated_answers)
+bot.session.middleware(send_limiter)
+bot.session.middleware(ReachabilityTracker())
 dp = Dispatcher(storage=MemoryStorage())
 
+dp.message.outer_middleware(ReachableAgainMiddleware())
+dp.callback_query.outer_middleware(ReachableAgainMiddleware())
+dp.message.outer_middleware(BlockedUserMiddleware())
+dp.callback_query.outer_middleware(BlockedUserMiddleware())
+dp.message.middleware(ThrottlingMiddleware())
+dp.callback_query.middleware(EarlyAnswerMiddleware())
+
 # register handlers
 start.register(dp)
+# admin states go first, a broadcast photo must not reach the photo handler
+admin.register(dp)
 photo.register(dp)
 history.register(dp)
 stats.register(dp)
 callbacks.register(dp)
 faq.register(dp)
-admin.register(dp)
 subscription.register(dp)
 manual.register(dp)
 reminders.register(dp)
@@ -54,24 +70,16 @@ goals.register(dp)
 
 dp.errors.register(handle_error)
 
+register_watchers(runtime, bot)
+
 async def main() -> None:
     loop = asyncio.get_running_loop()
     setup_asyncio_error_alerts(loop)
+    load_blocked_users()
+    load_unreachable()
 
-    watcher = subscription_watcher(bot, check_interval=SUBSCRIPTION_CHECK_INTERVAL)()
-    cleanup = cleanup_watcher()()
-    reminder = reminder_watcher()(bot)
-    engage = engagement_watcher()(bot)
-    tokens = token_watcher()
-    stats = user_stats_watcher()
-    tasks = [
-        create_monitored_task(watcher, name="subscription_watcher"),
-        create_monitored_task(cleanup, name="cleanup_watcher"),
-        create_monitored_task(reminder, name="reminder_watcher"),
-        create_monitored_task(engage, name="engagement_watcher"),
-        create_monitored_task(tokens, name="token_watcher"),
-        create_monitored_task(stats, name="user_stats_watcher"),
-    ]
+    tasks = runtime.start(create_monitored_task)
+    tasks.extend(resume_broadcasts(bot))
     try:
         await dp.start_polling(bot)
     except Exception:
@@ -2,39 +2,241 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
-from typing import Iterable, Optional, Sequence
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional
 
 from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
 from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
 
 from .logger import log
+from .settings import (
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_SEND_BURST,
+    TELEGRAM_SEND_RATE,
+)
 
+# called with (processed, total) while a bulk delivery is running
+ProgressCallback = Callable[[int, int], Awaitable[None]]
 
-@dataclass
-class DeliveryReport:
-    """Result of sending a message to multiple users."""
 
-    total: int
-    delivered: int
-    failed: list[int]
+class RateLimiter:
+    """Space sends to ``rate`` per second overall and ``chat_interval`` per chat.
 
-    @property
-    def has_failures(self) -> bool:
-        return bool(self.failed)
+    Each ``wait`` reserves the next free slot synchronously, so concurrent
+    senders are spread out instead of waking up together.
+    """
 
+    def __init__(
+        self,
+        rate: float,
+        *,
+        chat_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self._clock = clock
+        self._next = 0.0
+        self._chat_next: Dict[int, float] = {}
 
-async def _send_with_retries(
-    bot: Bot,
+    async def wait(self, chat_id: int) -> None:
+        now = self._clock()
+        slot = max(now, self._next, self._chat_next.get(chat_id, 0.0))
+        self._next = max(now, self._next) + self.interval
+        self._chat_next[chat_id] = slot + self.chat_interval
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {
+                chat: at for chat, at in self._chat_next.items() if at > now
+            }
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# Bot API methods that count against Telegram's message limits
+_LIMITED_METHODS = ("Send", "Copy", "Forward", "Edit")
+
+# set for code that sends on its own schedule (watchers, broadcasts); such
+# sends yield to interactive replies and stop while Telegram asks to back off
+_background: ContextVar[bool] = ContextVar("background_sends", default=False)
+
+
+@contextmanager
+def background_sends() -> Iterator[None]:
+    """Mark Telegram calls made inside the block as background traffic."""
+
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+def in_background() -> bool:
+    """True for Telegram calls made inside ``background_sends``."""
+
+    return _background.get()
+
+
+class _Bucket:
+    """Token bucket refilled with ``rate`` tokens per second up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a whole token is available."""
+
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class SendLimiter(BaseRequestMiddleware):
+    """Process-wide pacing of every message the bot sends.
+
+    Installed on the bot session, it keeps all senders within a global token
+    bucket and a bucket per chat. Interactive replies borrow tokens ahead of
+    time and are served first; background traffic waits for free tokens and
+    pauses entirely while a ``RetryAfter`` from Telegram is in force.
+    """
+
+    def __init__(
+        self,
+        rate: float = TELEGRAM_SEND_RATE,
+        *,
+        burst: float = TELEGRAM_SEND_BURST,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: float = TELEGRAM_CHAT_BURST,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+        self._sleep = sleep
+        self._bucket = _Bucket(rate, burst, clock())
+        self._chats: Dict[Hashable, _Bucket] = {}
+        self._paused_until = 0.0
+        self.waiting = {"interactive": 0, "background": 0}
+        self.sent = 0
+        self.delayed = 0
+        self.retry_after = 0
+        self.peak_waiting = 0
+
+    def _chat(self, chat_id: Hashable, now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                for chat, old in list(self._chats.items()):
+                    old.refill(now)
+                    if old.tokens >= old.burst:
+                        del self._chats[chat]
+            bucket = self._chats[chat_id] = _Bucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def pause(self, seconds: float) -> None:
+        """Hold background traffic for ``seconds``, e.g. after ``RetryAfter``."""
+
+        self.retry_after += 1
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    async def acquire(self, chat_id: Optional[Hashable], *, interactive: bool) -> None:
+        lane = "interactive" if interactive else "background"
+        self.waiting[lane] += 1
+        self.peak_waiting = max(self.peak_waiting, sum(self.waiting.values()))
+        try:
+            waited = False
+            while True:
+                now = self._clock()
+                chat = self._chat(chat_id, now) if chat_id is not None else None
+                chat_delay = chat.delay(now) if chat else 0.0
+                if interactive:
+                    # take the global token now, even on credit, so background
+                    # senders see the debt and wait behind this reply
+                    if chat_delay == 0:
+                        self._bucket.refill(now)
+                        self._bucket.tokens -= 1
+                        if chat:
+                            chat.tokens -= 1
+                        delay = -self._bucket.tokens / self._bucket.rate
+                        if delay > 0:
+                            self.delayed += not waited
+                            await self._sleep(delay)
+                        break
+                    delay = chat_delay
+                else:
+                    delay = max(
+                        chat_delay,
+                        self._bucket.delay(now),
+                        self._paused_until - now,
+                    )
+                    if delay <= 0 and self.waiting["interactive"]:
+                        delay = 1 / self._bucket.rate
+                    if delay <= 0:
+                        self._bucket.tokens -= 1
+                        if chat:
+                            chat.tokens -= 1
+                        break
+                self.delayed += not waited
+                waited = True
+                await self._sleep(delay)
+        finally:
+            self.waiting[lane] -= 1
+        self.sent += 1
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if not type(method).__name__.startswith(_LIMITED_METHODS):
+            return await make_request(bot, method)
+        await self.acquire(
+            getattr(method, "chat_id", None), interactive=not _background.get()
+        )
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as exc:
+            log("telegram", "retry after %ss on %s", exc.retry_after, type(method).__name__)
+            self.pause(exc.retry_after)
+            raise
+
+    def snapshot(self, *, reset: bool = False) -> Dict[str, float]:
+        """Queue depth and throttling counters, optionally starting new ones."""
+
+        stats = {
+            "waiting_interactive": self.waiting["interactive"],
+            "waiting_background": self.waiting["background"],
+            "paused_for": max(0.0, self._paused_until - self._clock()),
+            "sent": self.sent,
+            "delayed": self.delayed,
+            "retry_after": self.retry_after,
+            "peak_waiting": self.peak_waiting,
+            "chats": len(self._chats),
+        }
+        if reset:
+            self.sent = self.delayed = self.retry_after = self.peak_waiting = 0
+        return stats
+
+
+send_limiter = SendLimiter()
+
+
+async def call_with_retries(
+    send: Callable[[], Awaitable[Any]],
     chat_id: int,
     *,
-    text: str,
     category: str,
     retries: int = 3,
     base_delay: float = 0.5,
-    **kwargs,
 ) -> bool:
-    """Send a message handling transient Telegram errors."""
+    """Run the request made by ``send`` handling transient Telegram errors."""
 
     attempt = 0
     delay = base_delay
@@ -42,7 +244,7 @@ async def _send_with_retries(
     while attempt < retries:
         attempt += 1
         try:
-            await bot.send_message(chat_id, text, **kwargs)
+            await send()
             return True
         except TelegramRetryAfter as exc:  # pragma: no cover - depends on Telegram
             last_error = exc
@@ -85,55 +287,43 @@ async def _send_with_retries(
     return False
 
 
-async def send_with_retries(
+async def _send_with_retries(
     bot: Bot,
     chat_id: int,
     *,
     text: str,
     category: str,
     retries: int = 3,
+    base_delay: float = 0.5,
     **kwargs,
 ) -> bool:
-    """Public wrapper to send a message with retry logic."""
+    """Send a message handling transient Telegram errors."""
 
-    return await _send_with_retries(
-        bot,
+    return await call_with_retries(
+        lambda: bot.send_message(chat_id, text, **kwargs),
         chat_id,
-        text=text,
         category=category,
         retries=retries,
-        **kwargs,
+        base_delay=base_delay,
     )
 
 
-async def deliver_text(
+async def send_with_retries(
     bot: Bot,
-    user_ids: Iterable[int],
+    chat_id: int,
     *,
     text: str,
     category: str,
     retries: int = 3,
-    throttle: float = 0.0,
     **kwargs,
-) -> DeliveryReport:
-    """Send text to every ``user_id`` and return delivery statistics."""
-
-    failed: list[int] = []
-    delivered = 0
-    ids: Sequence[int] = list(user_ids)
-    for index, user_id in enumerate(ids, start=1):
-        success = await _send_with_retries(
-            bot,
-            user_id,
-            text=text,
-            category=category,
-            retries=retries,
-            **kwargs,
-        )
-        if success:
-            delivered += 1
-        else:
-            failed.append(user_id)
-        if throttle and index < len(ids):
-            await asyncio.sleep(throttle)
-    return DeliveryReport(total=len(ids), delivered=delivered, failed=failed)
+) -> bool:
+    """Public wrapper to send a message with retry logic."""
+
+    return await _send_with_retries(
+        bot,
+        chat_id,
+        text=text,
+        category=category,
+        retries=retries,
+        **kwargs,
+    )
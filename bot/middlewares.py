@@ -0,0 +1,54 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, types
+
+from .database import SessionLocal, User
+from .logger import log
+from .settings import SUPPORT_HANDLE
+from .storage import is_blocked, set_blocked_users
+from .texts import BLOCKED_TEXT
+
+
+Handler = Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+def load_blocked_users() -> int:
+    """Populate the in-memory blocked set from the database."""
+
+    session = SessionLocal()
+    try:
+        rows = session.query(User.telegram_id).filter(User.blocked.is_(True)).all()
+    finally:
+        session.close()
+    set_blocked_users(row[0] for row in rows)
+    log("block", "loaded %s blocked users", len(rows))
+    return len(rows)
+
+
+class BlockedUserMiddleware(BaseMiddleware):
+    """Answer blocked users before any handler touches the database."""
+
+    async def __call__(
+        self,
+        handler: Handler,
+        event: types.TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or not is_blocked(user.id):
+            return await handler(event, data)
+        # payments must still be recorded even if the user got blocked meanwhile
+        if isinstance(event, types.Message) and event.successful_payment:
+            return await handler(event, data)
+
+        text = BLOCKED_TEXT.format(support=SUPPORT_HANDLE)
+        state = data.get("state")
+        if state is not None:
+            await state.clear()
+        if isinstance(event, types.CallbackQuery):
+            if event.message:
+                await event.message.answer(text)
+            await event.answer()
+        elif isinstance(event, types.Message):
+            await event.answer(text)
+        return None
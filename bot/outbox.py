@@ -0,0 +1,318 @@
+"""Persistent queue of outgoing notifications.
+
+Producers call ``enqueue`` / ``enqueue_many`` inside their own transaction
+instead of sending. The ``outbox_dispatcher`` watcher sends due rows in
+priority order through a rate limiter, without holding a transaction open
+while Telegram answers, retries failures with backoff and applies the
+row's ``Mark`` updates (e.g. ``notified_7d = True``) once the message was
+delivered. Pending rows survive restarts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from aiogram import Bot, types
+from sqlalchemy import DateTime, and_, or_
+
+from .database import (
+    EngagementStatus,
+    NotificationStatus,
+    Outbox,
+    ReminderSettings,
+    SessionLocal,
+    Subscription,
+)
+from .logger import log
+from .messaging import RateLimiter, send_with_retries
+from .settings import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_FAILED_COOLDOWN,
+    OUTBOX_KEEP_DAYS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_DELAY,
+    OUTBOX_SEND_RATE,
+)
+from .watchers import TickContext
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+# Lower values are sent first
+PRIORITY_INTERACTIVE = 0  # caused by the user's own action, e.g. referral rewards
+PRIORITY_REMINDER = 10  # due at a minute the user picked
+PRIORITY_NOTICE = 20  # subscription and trial notices
+PRIORITY_ENGAGEMENT = 30
+PRIORITY_BULK = 40  # digests and discount campaigns
+
+# models a ``Mark`` may update, all keyed by ``user_id``
+_MARK_MODELS = {
+    model.__tablename__: model
+    for model in (EngagementStatus, NotificationStatus, ReminderSettings, Subscription)
+}
+
+outbox_limiter = RateLimiter(OUTBOX_SEND_RATE)
+
+
+@dataclass(frozen=True)
+class Mark:
+    """Column values written to ``model`` for ``user_id`` after delivery."""
+
+    model: Any
+    user_id: int
+    values: Dict[str, Any]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "table": self.model.__tablename__,
+            "user_id": self.user_id,
+            "values": {
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in self.values.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Mark":
+        model = _MARK_MODELS[data["table"]]
+        columns = model.__table__.columns
+        values = {
+            key: (
+                datetime.fromisoformat(value)
+                if value is not None and isinstance(columns[key].type, DateTime)
+                else value
+            )
+            for key, value in data["values"].items()
+        }
+        return cls(model, data["user_id"], values)
+
+
+@dataclass
+class OutboxMessage:
+    chat_id: int
+    text: str
+    event: str
+    category: str = "notification"
+    priority: int = PRIORITY_NOTICE
+    # at most one pending message per key; failed ones block it for a while
+    dedup_key: Optional[str] = None
+    not_before: Optional[datetime] = None
+    reply_markup: Optional[types.InlineKeyboardMarkup] = None
+    parse_mode: Optional[str] = None
+    reply_to_message_id: Optional[int] = None
+    on_delivered: Sequence[Mark] = field(default_factory=tuple)
+
+
+def _taken_keys(session, keys: List[str], now: datetime) -> set:
+    taken = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start : start + 500]
+        rows = session.query(Outbox.dedup_key).filter(
+            Outbox.dedup_key.in_(chunk),
+            or_(
+                Outbox.status == PENDING,
+                and_(
+                    Outbox.status == FAILED,
+                    Outbox.finished_at > now - timedelta(seconds=OUTBOX_FAILED_COOLDOWN),
+                ),
+            ),
+        )
+        taken.update(key for (key,) in rows)
+    return taken
+
+
+def enqueue_many(
+    session, messages: Iterable[OutboxMessage], now: Optional[datetime] = None
+) -> int:
+    """Add ``messages`` to ``session`` skipping taken dedup keys; the caller commits."""
+
+    now = now or datetime.utcnow()
+    messages = list(messages)
+    keys = sorted({m.dedup_key for m in messages if m.dedup_key})
+    taken = _taken_keys(session, keys, now) if keys else set()
+    rows = []
+    for message in messages:
+        if message.dedup_key:
+            if message.dedup_key in taken:
+                continue
+            taken.add(message.dedup_key)
+        rows.append(
+            Outbox(
+                chat_id=message.chat_id,
+                text=message.text,
+                reply_markup=(
+                    message.reply_markup.model_dump_json(exclude_none=True)
+                    if message.reply_markup is not None
+                    else None
+                ),
+                parse_mode=message.parse_mode,
+                reply_to_message_id=message.reply_to_message_id,
+                category=message.category,
+                event=message.event,
+                dedup_key=message.dedup_key,
+                priority=message.priority,
+                not_before=message.not_before or now,
+                status=PENDING,
+                on_delivered=(
+                    json.dumps([mark.to_json() for mark in message.on_delivered])
+                    if message.on_delivered
+                    else None
+                ),
+                created_at=now,
+            )
+        )
+    session.add_all(rows)
+    return len(rows)
+
+
+def enqueue(
+    session, chat_id: int, text: str, *, now: Optional[datetime] = None, **fields
+) -> bool:
+    """Queue one message, see ``OutboxMessage`` for ``fields``."""
+
+    return enqueue_many(session, [OutboxMessage(chat_id, text, **fields)], now) == 1
+
+
+def _due_rows(session, now: datetime, limit: int):
+    return (
+        session.query(
+            Outbox.id,
+            Outbox.chat_id,
+            Outbox.text,
+            Outbox.reply_markup,
+            Outbox.parse_mode,
+            Outbox.reply_to_message_id,
+            Outbox.category,
+            Outbox.event,
+            Outbox.attempts,
+            Outbox.on_delivered,
+        )
+        .filter(Outbox.status == PENDING, Outbox.not_before <= now)
+        .order_by(Outbox.priority, Outbox.not_before, Outbox.id)
+        .limit(limit)
+        .all()
+    )
+
+
+async def _deliver(bot: Bot, row, limiter: RateLimiter) -> bool:
+    kwargs = {}
+    if row.reply_markup:
+        kwargs["reply_markup"] = types.InlineKeyboardMarkup.model_validate_json(
+            row.reply_markup
+        )
+    if row.parse_mode:
+        kwargs["parse_mode"] = row.parse_mode
+    if row.reply_to_message_id:
+        kwargs["reply_to_message_id"] = row.reply_to_message_id
+    await limiter.wait(row.chat_id)
+    delivered = await send_with_retries(
+        bot, row.chat_id, text=row.text, category=row.category, **kwargs
+    )
+    if delivered:
+        log(row.category, "delivered %s to %s", row.event, row.chat_id)
+    else:
+        log(row.category, "failed to deliver %s to %s", row.event, row.chat_id)
+    return delivered
+
+
+def _apply_marks(session, rows) -> None:
+    """Write the delivered rows' marks, one UPDATE per table and value set."""
+
+    groups: Dict[tuple, List[int]] = {}
+    for row in rows:
+        for data in json.loads(row.on_delivered or "[]"):
+            mark = Mark.from_json(data)
+            key = (data["table"], json.dumps(data["values"], sort_keys=True))
+            groups.setdefault(key, [mark.model, mark.values, []])[2].append(mark.user_id)
+    for model, values, user_ids in groups.values():
+        session.query(model).filter(model.user_id.in_(user_ids)).update(
+            values, synchronize_session=False
+        )
+
+
+def _record_results(session, rows, results: List[bool], now: datetime) -> None:
+    delivered = [row for row, ok in zip(rows, results) if ok]
+    if delivered:
+        session.query(Outbox).filter(Outbox.id.in_([row.id for row in delivered])).update(
+            {
+                Outbox.status: SENT,
+                Outbox.attempts: Outbox.attempts + 1,
+                Outbox.finished_at: now,
+            },
+            synchronize_session=False,
+        )
+        _apply_marks(session, delivered)
+    failed_by_attempt: Dict[int, List[int]] = {}
+    for row, ok in zip(rows, results):
+        if not ok:
+            failed_by_attempt.setdefault((row.attempts or 0) + 1, []).append(row.id)
+    for attempts, ids in failed_by_attempt.items():
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            values = {Outbox.status: FAILED, Outbox.finished_at: now}
+        else:
+            delay = OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+            values = {Outbox.not_before: now + timedelta(seconds=delay)}
+        values[Outbox.attempts] = attempts
+        session.query(Outbox).filter(Outbox.id.in_(ids)).update(
+            values, synchronize_session=False
+        )
+
+
+def purge_outbox(session, now: datetime) -> int:
+    """Delete sent and failed rows older than ``OUTBOX_KEEP_DAYS``."""
+
+    removed = (
+        session.query(Outbox)
+        .filter(
+            Outbox.status != PENDING,
+            Outbox.finished_at < now - timedelta(days=OUTBOX_KEEP_DAYS),
+        )
+        .delete(synchronize_session=False)
+    )
+    session.commit()
+    return removed
+
+
+async def dispatch_outbox(
+    bot: Bot,
+    ctx: TickContext,
+    *,
+    limiter: RateLimiter = outbox_limiter,
+    batch_size: int = OUTBOX_BATCH_SIZE,
+) -> int:
+    """Send due messages batch by batch until none are left or time is up."""
+
+    sent = 0
+    session = SessionLocal()
+    try:
+        while True:
+            rows = _due_rows(session, ctx.now, batch_size)
+            # nothing stays locked while the batch is on its way to Telegram
+            session.commit()
+            if not rows:
+                break
+            results = await asyncio.gather(*(_deliver(bot, row, limiter) for row in rows))
+            _record_results(session, rows, results, ctx.clock.now())
+            session.commit()
+            sent += sum(results)
+            for ok in results:
+                if not ok:
+                    ctx.failed()
+            await ctx.processed(len(rows))
+            if len(rows) < batch_size:
+                break
+            if ctx.out_of_time():
+                ctx.defer()
+                break
+        last_purge = ctx.state.get("purged_at")
+        if last_purge is None or ctx.now - last_purge >= timedelta(hours=1):
+            ctx.state["purged_at"] = ctx.now
+            purge_outbox(session, ctx.now)
+    finally:
+        session.close()
+    return sent
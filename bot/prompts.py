@@ -159,39 +159,24 @@ LIGHT_HINT_PROMPT_BASE = (
 FREE_HINT_PROMPT_BASE = LIGHT_HINT_PROMPT_BASE
 
 
-GOAL_REMINDER_MORNING_PROMPT = (
-    "Ты — ассистент-диетолог. ЭТО УТРЕННЕЕ СООБЩЕНИЕ.\n"
-    "Сделай короткое сообщение ≤220 символов. Можно использовать эмодзи в меру.\n"
-    "Данные: цель={goal}, план=К{plan_kcal}/Б{plan_P}/Ж{plan_F}/У{plan_C},"
-    " факт=К{yday_kcal}/Б{yday_P}/Ж{yday_F}/У{yday_C}.\n"
+GOAL_REMINDER_ADVICE_PROMPT = (
+    "Ты — ассистент-диетолог. Напиши один совет для {moment} сообщения о цели питания.\n"
+    "Данные: цель={goal}; итог по калориям: {deviation}.\n"
     "Правила:\n"
-    "- Сообщение должно быть в 2–3 абзацах.\n"
-    "- В первом — позитивное приветствие и настрой на день.\n"
-    "- Во втором — сводка по вчерашнему дню с КБЖУ, используй данные факта без изменений.\n"
-    "- В третьем — короткое наставление/напоминание.\n"
-    "- Обязательно укажи цель в формате: "
-    "'Твоя цель {plan_kcal} ккал / {plan_P} Б / {plan_F} Ж / {plan_C} У'.\n"
-    "- Если все значения факта равны 0, подчёркни, что питание не начиналось.\n"
-    "- Будь простым, дружелюбным, добавь чуть тепла и живых фраз, избегай сухих отчётов.\n"
-    "Выведи только текст сообщения с абзацами."
+    "- Не больше 160 символов, одно-два предложения, можно один эмодзи.\n"
+    "- Без приветствия, без цифр и без списков — сводку пользователь уже видит.\n"
+    "- Тон: дружелюбный, поддерживающий, совет практичный.\n"
+    "Выведи только текст совета."
 )
 
-
-GOAL_REMINDER_EVENING_PROMPT = (
-    "Ты — ассистент-диетолог. ЭТО ВЕЧЕРНЕЕ СООБЩЕНИЕ\n"
-    "Сделай короткий ответ ≤300 символов. Можно использовать эмодзи в меру\n"
-    "Данные: цель={goal}; план=К{plan_kcal}/Б{plan_P}/Ж{plan_F}/У{plan_C};\n"
-    "факт=К{kcal}/Б{P}/Ж{F}/У{C}; блюда={meals_list}.\n\n"
-    "Правила:\n"
-    "- Текст должен состоять из 2–3 абзацев (каждый с новой строки).\n"
-    "- В первом абзаце — итог дня (недобор/перебор/достиг цели) и настроение.\n"
-    "- Во втором абзаце укажи прогресс: сначала цель в формате "
-    "'Твоя цель: {plan_kcal} ккал / {plan_P} Б / {plan_F} Ж / {plan_C} У, затем рядом факт дня в тех же единицах.\n"
-    "- В третьем абзаце — практичный совет на завтра.\n"
-    "- Если в блюдах есть газировка или сладости — отметь это и предложи простую замену.\n"
-    "- Не перечисляй все блюда. Только анализируй.\n"
-    "- Тон: дружелюбный, поддерживающий, добавляй тёплые формулировки и живые связки.\n"
-    "Выведи только текст сообщения с абзацами."
-)
+GOAL_ADVICE_MOMENTS = {"morning": "утреннего", "evening": "вечернего"}
+GOAL_DEVIATION_LABELS = {
+    "empty": "блюда не сохранялись",
+    "low": "сильный недобор",
+    "under": "небольшой недобор",
+    "on_track": "в пределах плана",
+    "over": "небольшой перебор",
+    "high": "сильный перебор",
+}
 
 
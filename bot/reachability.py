@@ -0,0 +1,171 @@
+"""Notice users the bot can no longer reach from failed sends.
+
+``ReachabilityTracker`` sits on the bot session and classifies failed
+requests: a blocked bot, a deactivated account or a missing chat means
+further messages are wasted. Such chats are collected in memory and the
+``reachability_watcher`` marks them ``left_bot`` in one UPDATE, which every
+sweep and broadcast already skips. The mark is lifted as soon as the user
+sends the bot anything again.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import BaseMiddleware, Bot, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+)
+
+from .database import Outbox, SessionLocal, User
+from .logger import log
+from .outbox import FAILED, PENDING
+from .reminder_schedule import refresh_user_schedule, reminder_schedule
+from .watchers import TickContext
+
+Handler = Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+# chat id -> reason, waiting for the next watcher run
+_pending: Dict[int, str] = {}
+# telegram ids marked unreachable, so the middleware needs no query per update
+_unreachable: Set[int] = set()
+
+
+def classify_failure(exc: TelegramAPIError) -> Optional[str]:
+    """Return why the chat is unreachable, or None for a transient failure."""
+
+    message = (exc.message or "").lower()
+    if isinstance(exc, TelegramForbiddenError):
+        if "deactivated" in message:
+            return "deactivated"
+        if "blocked" in message:
+            return "blocked"
+        return "forbidden"
+    if isinstance(exc, TelegramBadRequest) and "chat not found" in message:
+        return "chat not found"
+    return None
+
+
+class ReachabilityTracker(BaseRequestMiddleware):
+    """Remember private chats whose requests fail for good."""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as exc:
+            chat_id = getattr(method, "chat_id", None)
+            reason = classify_failure(exc)
+            # negative ids are groups and channels, not users
+            if reason and isinstance(chat_id, int) and chat_id > 0:
+                _pending[chat_id] = reason
+            raise
+
+
+def mark_unreachable(session, reasons: Dict[int, str], now: datetime) -> List[int]:
+    """Flag users by ``telegram_id`` in bulk and fail their pending outbox rows.
+
+    Returns the telegram ids that were newly marked; the caller commits.
+    """
+
+    rows = (
+        session.query(User.id, User.telegram_id)
+        .filter(User.telegram_id.in_(list(reasons)), User.left_bot.isnot(True))
+        .all()
+    )
+    if not rows:
+        return []
+    by_reason: Dict[str, List[int]] = {}
+    for _, telegram_id in rows:
+        by_reason.setdefault(reasons[telegram_id], []).append(telegram_id)
+    for reason, telegram_ids in by_reason.items():
+        session.query(User).filter(User.telegram_id.in_(telegram_ids)).update(
+            {
+                User.left_bot: True,
+                User.unreachable_at: now,
+                User.unreachable_reason: reason,
+            },
+            synchronize_session=False,
+        )
+    telegram_ids = [telegram_id for _, telegram_id in rows]
+    session.query(Outbox).filter(
+        Outbox.chat_id.in_(telegram_ids), Outbox.status == PENDING
+    ).update(
+        {Outbox.status: FAILED, Outbox.finished_at: now},
+        synchronize_session=False,
+    )
+    for user_id, _ in rows:
+        reminder_schedule.remove_user(user_id)
+    _unreachable.update(telegram_ids)
+    return telegram_ids
+
+
+def mark_reachable(session, telegram_id: int) -> None:
+    """Clear the unreachable mark of ``telegram_id``; the caller commits."""
+
+    _unreachable.discard(telegram_id)
+    user = session.query(User).filter_by(telegram_id=telegram_id).first()
+    if user is None or not user.left_bot:
+        return
+    user.left_bot = False
+    user.unreachable_at = None
+    user.unreachable_reason = None
+    refresh_user_schedule(user)
+
+
+def load_unreachable() -> int:
+    """Populate the in-memory set from users marked by delivery failures."""
+
+    session = SessionLocal()
+    try:
+        rows = (
+            session.query(User.telegram_id)
+            .filter(User.left_bot.is_(True), User.unreachable_at.isnot(None))
+            .all()
+        )
+    finally:
+        session.close()
+    _unreachable.clear()
+    _unreachable.update(row[0] for row in rows)
+    log("block", "loaded %s unreachable users", len(rows))
+    return len(rows)
+
+
+async def reachability_watcher_tick(ctx: TickContext) -> None:
+    if not _pending:
+        return
+    reasons = dict(_pending)
+    _pending.clear()
+    session = SessionLocal()
+    try:
+        marked = mark_unreachable(session, reasons, ctx.now)
+        session.commit()
+    finally:
+        session.close()
+    await ctx.processed(len(reasons))
+    if marked:
+        log("block", "marked %s users unreachable", len(marked))
+
+
+class ReachableAgainMiddleware(BaseMiddleware):
+    """Lift the unreachable mark when the user contacts the bot again."""
+
+    async def __call__(
+        self,
+        handler: Handler,
+        event: types.TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and user.id in _unreachable:
+            session = SessionLocal()
+            try:
+                mark_reachable(session, user.id)
+                session.commit()
+            finally:
+                session.close()
+            log("block", "user %s is reachable again", user.id)
+        return await handler(event, data)
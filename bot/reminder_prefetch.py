@@ -0,0 +1,113 @@
+"""Ready queue for goal reminder texts generated ahead of their due minute."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .logger import log
+from .settings import GOAL_GENERATION_CONCURRENCY
+
+# (user_id, slot)
+Key = Tuple[int, str]
+# formatted text and whether it needs parse_mode="HTML"
+ReadyText = Tuple[str, bool]
+
+
+class ReadyQueue:
+    """Run text generators with bounded concurrency and keep their results.
+
+    Every entry is tied to the minute it is due at; ``take`` hands it out only
+    for that minute and cancels generators that missed their deadline.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._ready: Dict[Key, Tuple[datetime, ReadyText]] = {}
+        self._tasks: Dict[Key, Tuple[datetime, asyncio.Task]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def has(self, key: Key, due_at: datetime) -> bool:
+        entry = self._ready.get(key)
+        return entry is not None and entry[0] == due_at
+
+    def submit(
+        self,
+        key: Key,
+        due_at: datetime,
+        generate: Callable[[], Awaitable[ReadyText]],
+    ) -> bool:
+        """Start generating ``key`` unless it is already queued for ``due_at``."""
+
+        running = self._tasks.get(key)
+        if self.has(key, due_at) or (running and running[0] == due_at):
+            return False
+        if running:
+            running[1].cancel()
+        task = asyncio.create_task(self._run(key, due_at, generate))
+        self._tasks[key] = (due_at, task)
+        return True
+
+    async def _run(
+        self,
+        key: Key,
+        due_at: datetime,
+        generate: Callable[[], Awaitable[ReadyText]],
+    ) -> None:
+        try:
+            async with self._semaphore:
+                result = await generate()
+            self._ready[key] = (due_at, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # pragma: no cover - logged and replaced by fallback
+            log("notification", "goal text generation failed for %s: %s", key, exc)
+        finally:
+            running = self._tasks.get(key)
+            if running and running[0] == due_at:
+                del self._tasks[key]
+
+    def take(self, key: Key, due_at: datetime) -> Optional[ReadyText]:
+        """Pop the text for ``key`` due at ``due_at``; ``None`` means use a fallback."""
+
+        running = self._tasks.pop(key, None)
+        if running:
+            running[1].cancel()
+        entry = self._ready.pop(key, None)
+        if entry is None or entry[0] != due_at:
+            return None
+        return entry[1]
+
+    def prune(self, now: datetime) -> None:
+        """Drop results and generators for minutes that have already passed."""
+
+        for key, (due_at, _) in list(self._ready.items()):
+            if due_at < now:
+                del self._ready[key]
+        for key, (due_at, task) in list(self._tasks.items()):
+            if due_at < now:
+                task.cancel()
+                del self._tasks[key]
+
+    async def drain(self) -> None:
+        """Wait for all running generators to finish."""
+
+        tasks = [task for _, task in self._tasks.values()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def clear(self) -> None:
+        for _, task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._ready.clear()
+
+
+goal_text_queue = ReadyQueue(GOAL_GENERATION_CONCURRENCY)
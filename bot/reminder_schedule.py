@@ -0,0 +1,168 @@
+"""In-memory index of reminder slots keyed by UTC minute of the day."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from .database import Goal, ReminderSettings, User
+from .logger import log
+from .watchers import SystemClock, system_clock
+
+MINUTES_PER_DAY = 24 * 60
+SLOTS = ("morning", "day", "evening")
+
+# (user_id, slot)
+Entry = Tuple[int, str]
+
+
+def _minutes(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        hours, minutes = map(int, value.split(":", 1))
+    except ValueError:
+        return None
+    return hours * 60 + minutes
+
+
+def slot_minutes(
+    timezone: Optional[int],
+    times: Dict[str, Optional[str]],
+    enabled: Dict[str, bool],
+) -> Dict[str, int]:
+    """Return UTC minute of the day for every enabled slot with a valid time."""
+
+    if timezone is None:
+        return {}
+    result = {}
+    for slot in SLOTS:
+        local = _minutes(times.get(slot))
+        if enabled.get(slot) and local is not None:
+            result[slot] = (local - timezone) % MINUTES_PER_DAY
+    return result
+
+
+def user_slot_minutes(user: User) -> Dict[str, int]:
+    """Compute schedule entries from a loaded user and its goal."""
+
+    goal = user.goal
+    return slot_minutes(
+        user.timezone,
+        {
+            "morning": user.morning_time,
+            "day": user.day_time,
+            "evening": user.evening_time,
+        },
+        {
+            "morning": bool(user.morning_enabled or (goal and goal.reminder_morning)),
+            "day": bool(user.day_enabled),
+            "evening": bool(user.evening_enabled or (goal and goal.reminder_evening)),
+        },
+    )
+
+
+class ReminderSchedule:
+    """Map UTC minute of the day to the (user, slot) pairs due at that minute."""
+
+    def __init__(self) -> None:
+        self._by_minute: Dict[int, Set[Entry]] = defaultdict(set)
+        self._by_user: Dict[int, Dict[str, int]] = {}
+        self.built_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return sum(len(slots) for slots in self._by_user.values())
+
+    def clear(self) -> None:
+        self._by_minute.clear()
+        self._by_user.clear()
+        self.built_at = None
+
+    def set_user(self, user_id: int, slots: Dict[str, int]) -> None:
+        self.remove_user(user_id)
+        if not slots:
+            return
+        self._by_user[user_id] = dict(slots)
+        for slot, minute in slots.items():
+            self._by_minute[minute].add((user_id, slot))
+
+    def remove_user(self, user_id: int) -> None:
+        for slot, minute in self._by_user.pop(user_id, {}).items():
+            bucket = self._by_minute.get(minute)
+            if bucket is None:
+                continue
+            bucket.discard((user_id, slot))
+            if not bucket:
+                del self._by_minute[minute]
+
+    def due(self, minute: int) -> Set[Entry]:
+        return set(self._by_minute.get(minute % MINUTES_PER_DAY, ()))
+
+    def slots_for(self, user_id: int) -> Dict[str, int]:
+        return dict(self._by_user.get(user_id, {}))
+
+
+reminder_schedule = ReminderSchedule()
+
+
+def refresh_user_schedule(user: User) -> None:
+    """Recompute index entries for ``user``; call after committing changes."""
+
+    reminder_schedule.set_user(user.id, user_slot_minutes(user))
+
+
+def rebuild_schedule(session: Session, clock: SystemClock = system_clock) -> int:
+    """Rebuild the whole index with a single column query."""
+
+    rows = (
+        session.query(
+            ReminderSettings.user_id,
+            ReminderSettings.timezone,
+            ReminderSettings.morning_time,
+            ReminderSettings.day_time,
+            ReminderSettings.evening_time,
+            ReminderSettings.morning_enabled,
+            ReminderSettings.day_enabled,
+            ReminderSettings.evening_enabled,
+            Goal.reminder_morning,
+            Goal.reminder_evening,
+        )
+        .join(User, User.id == ReminderSettings.user_id)
+        .outerjoin(Goal, Goal.user_id == ReminderSettings.user_id)
+        .filter(
+            ReminderSettings.timezone.isnot(None),
+            User.blocked.isnot(True),
+            User.left_bot.isnot(True),
+        )
+        .all()
+    )
+    reminder_schedule.clear()
+    for (
+        user_id,
+        timezone,
+        morning_time,
+        day_time,
+        evening_time,
+        morning_enabled,
+        day_enabled,
+        evening_enabled,
+        goal_morning,
+        goal_evening,
+    ) in rows:
+        reminder_schedule.set_user(
+            user_id,
+            slot_minutes(
+                timezone,
+                {"morning": morning_time, "day": day_time, "evening": evening_time},
+                {
+                    "morning": bool(morning_enabled or goal_morning),
+                    "day": bool(day_enabled),
+                    "evening": bool(evening_enabled or goal_evening),
+                },
+            ),
+        )
+    reminder_schedule.built_at = clock.monotonic()
+    log("notification", "reminder schedule rebuilt: %s slots", len(reminder_schedule))
+    return len(reminder_schedule)
@@ -1,16 +1,48 @@
-import asyncio
 import random
-import re
+from functools import partial
 from datetime import datetime, timedelta, time
-from html import escape
 from typing import Optional
 
-from aiogram import Bot
-
-from .database import SessionLocal, User, Meal
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    String,
+    and_,
+    case,
+    func,
+    literal,
+    or_,
+    select,
+    union_all,
+)
+from sqlalchemy.orm import object_session
+
+from .database import (
+    SessionLocal,
+    User,
+    Meal,
+    Goal,
+    ReminderSettings,
+    Subscription,
+    get_option_bool,
+)
 from .keyboards import subscribe_button
 from .logger import log
-from .messaging import send_with_retries
+from .outbox import PRIORITY_NOTICE, PRIORITY_REMINDER, Mark, enqueue
+from .reminder_prefetch import ReadyText, goal_text_queue
+from .reminder_schedule import (
+    SLOTS,
+    rebuild_schedule,
+    refresh_user_schedule,
+    reminder_schedule,
+)
+from .settings import (
+    GOAL_ADVICE_CACHE_TTL,
+    GOAL_PREFETCH_MINUTES,
+    REMINDER_CATCHUP_MINUTES,
+    REMINDER_SCHEDULE_REBUILD_INTERVAL,
+)
+from .watchers import TickContext
 from .texts import (
     REM_TEXT_MORNING,
     REM_TEXT_DAY,
@@ -21,85 +53,101 @@ from .texts import (
 )
 from .alerts import token_monitor
 from .services import _chat_completion
-from .prompts import GOAL_REMINDER_MORNING_PROMPT, GOAL_REMINDER_EVENING_PROMPT
+from .goal_templates import (
+    AdviceCache,
+    Macros,
+    deviation_bucket,
+    render_goal_reminder,
+)
+from .prompts import (
+    GOAL_ADVICE_MOMENTS,
+    GOAL_DEVIATION_LABELS,
+    GOAL_REMINDER_ADVICE_PROMPT,
+)
 
 TARGET_MAP = {"loss": "похудение", "gain": "набор", "maintain": "поддержка"}
 
+advice_cache = AdviceCache(GOAL_ADVICE_CACHE_TTL)
 
-def _meal_stats(meals):
-    calories = protein = fat = carbs = 0
-    names = []
-    for m in meals:
-        calories += float(m.calories or 0)
-        protein += float(m.protein or 0)
-        fat += float(m.fat or 0)
-        carbs += float(m.carbs or 0)
-        if m.name:
-            names.append(m.name)
-    return calories, protein, fat, carbs, names
 
+# (calories, protein, fat, carbs, meal names) for one reminder window
+MealTotals = tuple[float, float, float, float, list[str]]
+EMPTY_TOTALS: MealTotals = (0.0, 0.0, 0.0, 0.0, [])
 
-def _day_bounds(local_now: datetime, offset: timedelta, days: int = 0):
-    local_date = (local_now + timedelta(days=days)).date()
-    start_local = datetime.combine(local_date, time())
-    start_utc = start_local - offset
-    end_utc = start_utc + timedelta(days=1)
-    return start_utc, end_utc
+# SQLite caps compound SELECTs at 500 terms
+_WINDOW_CHUNK = 400
+_NAME_SEPARATOR = "\x1f"
 
 
-def _parse_time(value: str) -> time:
-    try:
-        h, m = map(int, value.split(":", 1))
-        return time(hour=h, minute=m)
-    except Exception:
-        return time(hour=0, minute=0)
+def _names_aggregate(session):
+    name = case((Meal.name != "", Meal.name))
+    if session.get_bind().dialect.name == "postgresql":
+        return func.string_agg(name, _NAME_SEPARATOR)
+    return func.group_concat(name, _NAME_SEPARATOR)
 
 
-def _format_macro(value) -> str:
-    try:
-        num = round(float(value), 1)
-    except (TypeError, ValueError):
-        return "0"
-    if num == int(num):
-        return str(int(num))
-    return f"{num:.1f}".rstrip("0").rstrip(".")
-
+def meal_window_totals(
+    session, windows: dict[tuple[int, str], tuple[datetime, datetime]]
+) -> dict[tuple[int, str], MealTotals]:
+    """Sum meals inside each ``(user_id, slot)`` window with a grouped query.
 
-def _highlight_numbers(text: str) -> str:
-    return re.sub(r"(\d+(?:[.,]\d+)?)", r"<b>\1</b>", text)
+    Windows are sent as a ``UNION ALL`` CTE joined to ``meals``, so a whole
+    tick is resolved in one round trip (one per 400 windows on SQLite).
+    Windows without meals are absent from the result.
+    """
 
+    totals: dict[tuple[int, str], MealTotals] = {}
+    items = list(windows.items())
+    for offset in range(0, len(items), _WINDOW_CHUNK):
+        selects = [
+            select(
+                literal(user_id, Integer).label("user_id"),
+                literal(slot, String).label("slot"),
+                literal(start, DateTime).label("start_at"),
+                literal(end, DateTime).label("end_at"),
+            )
+            for (user_id, slot), (start, end) in items[offset:offset + _WINDOW_CHUNK]
+        ]
+        window = (union_all(*selects) if len(selects) > 1 else selects[0]).cte("windows")
+        rows = (
+            session.query(
+                window.c.user_id,
+                window.c.slot,
+                func.sum(Meal.calories),
+                func.sum(Meal.protein),
+                func.sum(Meal.fat),
+                func.sum(Meal.carbs),
+                _names_aggregate(session),
+            )
+            .select_from(window)
+            .join(
+                Meal,
+                and_(
+                    Meal.user_id == window.c.user_id,
+                    Meal.timestamp >= window.c.start_at,
+                    Meal.timestamp < window.c.end_at,
+                ),
+            )
+            .group_by(window.c.user_id, window.c.slot)
+            .all()
+        )
+        for user_id, slot, cal, prot, fat, carb, names in rows:
+            totals[(user_id, slot)] = (
+                float(cal or 0),
+                float(prot or 0),
+                float(fat or 0),
+                float(carb or 0),
+                names.split(_NAME_SEPARATOR) if names else [],
+            )
+    return totals
 
-def _format_gpt_message(content: str, message_type: str) -> tuple[str, bool]:
-    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", content.strip()) if p.strip()]
-    if not paragraphs:
-        return escape(content.strip()), False
-
-    if len(paragraphs) == 1:
-        return escape(paragraphs[0]), False
 
-    prefixes = {
-        "morning": ("🌅 ", "📊 ", "💪 "),
-        "evening": ("🌙 ", "📊 ", "💡 "),
-    }
-    default_prefix = ("", "📊 ", "💡 ")
-    first_prefix, second_prefix, third_prefix = prefixes.get(message_type, default_prefix)
-
-    formatted = []
-    uses_markup = False
-    for idx, paragraph in enumerate(paragraphs):
-        escaped = escape(paragraph)
-        if idx == 0:
-            if escaped:
-                escaped = f"{first_prefix}<b>{escaped}</b>"
-                uses_markup = True
-        else:
-            escaped = _highlight_numbers(escaped)
-            if "<b>" in escaped:
-                uses_markup = True
-            prefix = third_prefix if idx >= 2 else second_prefix
-            escaped = f"{prefix}{escaped}" if escaped else ""
-        formatted.append(escaped)
-    return "\n\n".join(formatted), uses_markup
+def _day_bounds(local_now: datetime, offset: timedelta, days: int = 0):
+    local_date = (local_now + timedelta(days=days)).date()
+    start_local = datetime.combine(local_date, time())
+    start_utc = start_local - offset
+    end_utc = start_utc + timedelta(days=1)
+    return start_utc, end_utc
 
 
 def _goal_meal_window(
@@ -125,285 +173,353 @@ def _goal_meal_window(
     return start_utc, end_utc
 
 
-async def _send(
-    bot: Bot,
+def _queue(
     user: User,
     text: str,
+    now: datetime,
     *,
+    event: str,
     reply_markup=None,
     parse_mode=None,
-    event: Optional[str] = None,
+    dedup_key: Optional[str] = None,
+    on_delivered=(),
+    priority: int = PRIORITY_REMINDER,
 ) -> bool:
-    """Deliver a reminder with retry logic and structured logging."""
+    """Queue a reminder in the user's session; it is sent by the outbox."""
 
-    send_kwargs = {"reply_markup": reply_markup}
-    if parse_mode:
-        send_kwargs["parse_mode"] = parse_mode
-    delivered = await send_with_retries(
-        bot,
+    return enqueue(
+        object_session(user),
         user.telegram_id,
-        text=text,
-        category="notification",
-        **send_kwargs,
+        text,
+        now=now,
+        event=event,
+        priority=priority,
+        reply_markup=reply_markup,
+        parse_mode=parse_mode,
+        dedup_key=dedup_key,
+        on_delivered=on_delivered,
     )
-    label = event or text
-    if delivered:
-        log("notification", "sent reminder to %s: %s", user.telegram_id, label)
-    else:
-        log("notification", "failed to send reminder to %s: %s", user.telegram_id, label)
-    return delivered
-
-
-def reminder_watcher(check_interval: int = 60):
-    async def _watch(bot: Bot):
-        while True:
-            now = datetime.utcnow()
-            session = SessionLocal()
-            from .database import ReminderSettings
-
-            users = (
-                session.query(User)
-                .join(ReminderSettings)
-                .filter(ReminderSettings.timezone != None)
-                .all()
+
+
+def _queue_slot(user: User, slot: str, text: str, now: datetime, **fields) -> bool:
+    """Queue a slot reminder; ``last_<slot>`` is set once it is delivered."""
+
+    local_now = now + timedelta(minutes=user.timezone or 0)
+    return _queue(
+        user,
+        text,
+        now,
+        dedup_key=f"{slot} reminder:{user.id}:{local_now:%Y-%m-%d}",
+        on_delivered=[Mark(ReminderSettings, user.id, {f"last_{slot}": local_now})],
+        **fields,
+    )
+
+
+def _is_due(last: Optional[datetime], local_now: datetime) -> bool:
+    return last is None or last.date() != local_now.date()
+
+
+def _expire_goal_trials(session, now: datetime) -> None:
+    """Close three-day goal trials of free users and clear stale markers."""
+
+    users = (
+        session.query(User)
+        .join(Subscription)
+        .filter(Subscription.goal_trial_start != None)
+        .all()
+    )
+    for user in users:
+        if user.blocked or user.left_bot:
+            continue
+        if user.grade != "free":
+            user.goal_trial_start = None
+            user.goal_trial_notified = False
+            continue
+        if now < user.goal_trial_start + timedelta(days=3):
+            continue
+        if user.goal:
+            session.delete(user.goal)
+            user.goal = None
+            refresh_user_schedule(user)
+        if not user.goal_trial_notified:
+            _queue(
+                user,
+                GOAL_TRIAL_EXPIRED_NOTICE,
+                now,
+                reply_markup=subscribe_button(BTN_REMOVE_LIMITS),
+                event="goal trial expired notice",
+                priority=PRIORITY_NOTICE,
+                dedup_key=f"goal trial expired notice:{user.id}",
+                on_delivered=[Mark(Subscription, user.id, {"goal_trial_notified": True})],
             )
-            processed_user_ids = set()
-            for user in users:
-                processed_user_ids.add(user.id)
-                if user.blocked or user.left_bot:
-                    continue
-                offset = timedelta(minutes=user.timezone or 0)
-                local_now = now + offset
-
-                goal = getattr(user, "goal", None)
-                if user.grade != "free":
-                    if user.goal_trial_start or user.goal_trial_notified:
-                        user.goal_trial_start = None
-                        user.goal_trial_notified = False
-                else:
-                    start = getattr(user, "goal_trial_start", None)
-                    expired = False
-                    if start:
-                        try:
-                            expired = now >= start + timedelta(days=3)
-                        except TypeError:
-                            expired = False
-                    if expired:
-                        if goal:
-                            session.delete(goal)
-                        if not user.goal_trial_notified:
-                            delivered = await _send(
-                                bot,
-                                user,
-                                GOAL_TRIAL_EXPIRED_NOTICE,
-                                reply_markup=subscribe_button(BTN_REMOVE_LIMITS),
-                            )
-                            if delivered:
-                                user.goal_trial_notified = True
-                        continue
-                if goal:
-                    last_meal = (
-                        session.query(Meal)
-                        .filter(Meal.user_id == user.id)
-                        .order_by(Meal.timestamp.desc())
-                        .first()
-                    )
-                    last_activity = last_meal.timestamp if last_meal else None
-                    if getattr(goal, "reactivated_at", None):
-                        if last_activity is None:
-                            last_activity = goal.reactivated_at
-                        else:
-                            last_activity = max(last_activity, goal.reactivated_at)
-
-                    if (
-                        last_activity
-                        and last_activity < now - timedelta(days=3)
-                    ):
-                        session.delete(goal)
-                        log(
-                            "notification",
-                            "goal reminders auto-disabled for %s",
-                            user.telegram_id,
-                        )
-                        if user.grade != "free":
-                            await _send(
-                                bot,
-                                user,
-                                GOAL_REMINDERS_DISABLED,
-                                reply_markup=None,
-                            )
-                        continue
-
-                if goal and goal.reminder_morning and user.morning_time:
-                    target = _parse_time(user.morning_time)
-                    if (
-                        (user.last_morning is None or user.last_morning.date() != local_now.date())
-                        and local_now.time().hour == target.hour
-                        and local_now.time().minute == target.minute
-                    ):
-                        start, end = _goal_meal_window(
-                            user.last_morning,
-                            local_now,
-                            offset,
-                            fallback_days=-1,
-                        )
-                        meals = (
-                            session.query(Meal)
-                            .filter(Meal.user_id == user.id, Meal.timestamp >= start, Meal.timestamp < end)
-                            .all()
-                        )
-                        cal, prot, fat, carb, _ = _meal_stats(meals)
-                        prompt = GOAL_REMINDER_MORNING_PROMPT.format(
-                            goal=TARGET_MAP.get(goal.target, goal.target),
-                            plan_kcal=_format_macro(goal.calories),
-                            plan_P=_format_macro(goal.protein),
-                            plan_F=_format_macro(goal.fat),
-                            plan_C=_format_macro(goal.carbs),
-                            yday_kcal=_format_macro(cal),
-                            yday_P=_format_macro(prot),
-                            yday_F=_format_macro(fat),
-                            yday_C=_format_macro(carb),
-                        )
-                        log("notification", "morning prompt for %s: %s", user.telegram_id, prompt)
-                        content, tokens_in, tokens_out = await _chat_completion([
-                            {"role": "user", "content": prompt}
-                        ])
-                        log("notification", "morning GPT response for %s: %s", user.telegram_id, content.strip())
-                        await token_monitor.add(tokens_in, tokens_out)
-                        formatted, use_html = _format_gpt_message(content.strip(), "morning")
-                        if await _send(
-                            bot,
-                            user,
-                            formatted,
-                            parse_mode="HTML" if use_html else None,
-                            event="goal morning reminder",
-                        ):
-                            user.last_morning = local_now
-                elif user.morning_enabled and user.morning_time:
-                    target = _parse_time(user.morning_time)
-                    if (
-                        (user.last_morning is None or user.last_morning.date() != local_now.date())
-                        and local_now.time().hour == target.hour
-                        and local_now.time().minute == target.minute
-                    ):
-                        if await _send(
-                            bot,
-                            user,
-                            random.choice(REM_TEXT_MORNING),
-                            event="morning reminder",
-                        ):
-                            user.last_morning = local_now
-
-                if user.day_enabled and user.day_time:
-                    target = _parse_time(user.day_time)
-                    if (
-                        (user.last_day is None or user.last_day.date() != local_now.date())
-                        and local_now.time().hour == target.hour
-                        and local_now.time().minute == target.minute
-                    ):
-                        if await _send(
-                            bot,
-                            user,
-                            random.choice(REM_TEXT_DAY),
-                            event="day reminder",
-                        ):
-                            user.last_day = local_now
-
-                if goal and goal.reminder_evening and user.evening_time:
-                    target = _parse_time(user.evening_time)
-                    if (
-                        (user.last_evening is None or user.last_evening.date() != local_now.date())
-                        and local_now.time().hour == target.hour
-                        and local_now.time().minute == target.minute
-                    ):
-                        start, end = _goal_meal_window(
-                            user.last_morning,
-                            local_now,
-                            offset,
-                            fallback_days=0,
-                        )
-                        meals = (
-                            session.query(Meal)
-                            .filter(Meal.user_id == user.id, Meal.timestamp >= start, Meal.timestamp < end)
-                            .all()
-                        )
-                        cal, prot, fat, carb, names = _meal_stats(meals)
-                        names_str = ", ".join(names) if names else ""
-                        prompt = GOAL_REMINDER_EVENING_PROMPT.format(
-                            goal=TARGET_MAP.get(goal.target, goal.target),
-                            plan_kcal=_format_macro(goal.calories),
-                            plan_P=_format_macro(goal.protein),
-                            plan_F=_format_macro(goal.fat),
-                            plan_C=_format_macro(goal.carbs),
-                            kcal=_format_macro(cal),
-                            P=_format_macro(prot),
-                            F=_format_macro(fat),
-                            C=_format_macro(carb),
-                            meals_list=names_str,
-                        )
-                        log("notification", "evening prompt for %s: %s", user.telegram_id, prompt)
-                        content, tokens_in, tokens_out = await _chat_completion([
-                            {"role": "user", "content": prompt}
-                        ])
-                        log("notification", "evening GPT response for %s: %s", user.telegram_id, content.strip())
-                        await token_monitor.add(tokens_in, tokens_out)
-                        formatted, use_html = _format_gpt_message(content.strip(), "evening")
-                        if await _send(
-                            bot,
-                            user,
-                            formatted,
-                            parse_mode="HTML" if use_html else None,
-                            event="goal evening reminder",
-                        ):
-                            user.last_evening = local_now
-                elif user.evening_enabled and user.evening_time:
-                    target = _parse_time(user.evening_time)
-                    if (
-                        (user.last_evening is None or user.last_evening.date() != local_now.date())
-                        and local_now.time().hour == target.hour
-                        and local_now.time().minute == target.minute
-                    ):
-                        if await _send(
-                            bot,
-                            user,
-                            random.choice(REM_TEXT_EVENING),
-                            event="evening reminder",
-                        ):
-                            user.last_evening = local_now
-
-            extra_users = (
-                session.query(User)
-                .filter(User.goal_trial_start != None)
-                .all()
+
+
+def _disable_inactive_goals(session, now: datetime) -> None:
+    """Drop goals without meals or reactivation during the last three days."""
+
+    cutoff = now - timedelta(days=3)
+    users = (
+        session.query(User)
+        .join(Goal)
+        .join(ReminderSettings)
+        .filter(
+            ReminderSettings.timezone != None,
+            or_(User.last_meal_at != None, Goal.reactivated_at != None),
+            or_(User.last_meal_at == None, User.last_meal_at < cutoff),
+            or_(Goal.reactivated_at == None, Goal.reactivated_at < cutoff),
+        )
+        .all()
+    )
+    for user in users:
+        if user.blocked or user.left_bot:
+            continue
+        session.delete(user.goal)
+        user.goal = None
+        refresh_user_schedule(user)
+        log("notification", "goal reminders auto-disabled for %s", user.telegram_id)
+        if user.grade != "free":
+            _queue(
+                user,
+                GOAL_REMINDERS_DISABLED,
+                now,
+                event="goal reminders disabled notice",
+                priority=PRIORITY_NOTICE,
             )
-            for user in extra_users:
-                if user.id in processed_user_ids:
-                    continue
-                if user.blocked or user.left_bot:
-                    continue
-                if user.grade != "free":
-                    if user.goal_trial_start or user.goal_trial_notified:
-                        user.goal_trial_start = None
-                        user.goal_trial_notified = False
-                    continue
-                start = getattr(user, "goal_trial_start", None)
-                if start and now >= start + timedelta(days=3):
-                    goal = getattr(user, "goal", None)
-                    if goal:
-                        session.delete(goal)
-                    if not user.goal_trial_notified:
-                        delivered = await _send(
-                            bot,
-                            user,
-                            GOAL_TRIAL_EXPIRED_NOTICE,
-                            reply_markup=subscribe_button(BTN_REMOVE_LIMITS),
-                            event="goal trial expired notice",
-                        )
-                        if delivered:
-                            user.goal_trial_notified = True
-            session.commit()
-            session.close()
-            await asyncio.sleep(check_interval)
-    def _start(bot: Bot):
-        return _watch(bot)
-    return _start
+
+
+def _goal_plan(goal: Goal) -> Macros:
+    return (goal.calories, goal.protein, goal.fat, goal.carbs)
+
+
+def _advice_grades() -> set[str]:
+    """Grades whose goal reminders get a GPT-written advice paragraph."""
+
+    return {
+        grade
+        for grade in ("free", "light", "pro")
+        if get_option_bool(f"goal_ai_{grade}", grade == "pro")
+    }
+
+
+async def _generate_advice(slot: str, bucket: str, target: Optional[str]) -> str:
+    prompt = GOAL_REMINDER_ADVICE_PROMPT.format(
+        moment=GOAL_ADVICE_MOMENTS[slot],
+        goal=TARGET_MAP.get(target, target),
+        deviation=GOAL_DEVIATION_LABELS[bucket],
+    )
+    log("notification", "%s advice prompt: %s", slot, prompt)
+    content, tokens_in, tokens_out = await _chat_completion([
+        {"role": "user", "content": prompt}
+    ])
+    log("notification", "%s advice GPT response: %s", slot, content.strip())
+    await token_monitor.add(tokens_in, tokens_out)
+    return content.strip()
+
+
+async def _render_with_advice(
+    slot: str, target: Optional[str], plan: Macros, fact: Macros
+) -> ReadyText:
+    bucket = deviation_bucket(plan[0], fact[0])
+    advice = await advice_cache.get_or_create(
+        (slot, bucket, target), partial(_generate_advice, slot, bucket, target)
+    )
+    return render_goal_reminder(slot, plan, fact, advice), True
+
+
+def _goal_text(user: User, goal: Goal, slot: str, due_at: datetime, totals: MealTotals) -> str:
+    ready = goal_text_queue.take((user.id, slot), due_at)
+    if ready is None:
+        return render_goal_reminder(slot, _goal_plan(goal), totals[:4])
+    text, _ = ready
+    return text
+
+
+def _goal_window(user: User, slot: str, now: datetime):
+    """Return the meal window of a due goal slot, or ``None`` if it sends plain text."""
+
+    goal = user.goal
+    offset = timedelta(minutes=user.timezone or 0)
+    local_now = now + offset
+    if slot == "morning" and goal and goal.reminder_morning:
+        if _is_due(user.last_morning, local_now):
+            return _goal_meal_window(user.last_morning, local_now, offset, fallback_days=-1)
+    elif slot == "evening" and goal and goal.reminder_evening:
+        if _is_due(user.last_evening, local_now):
+            return _goal_meal_window(user.last_morning, local_now, offset, fallback_days=0)
+    return None
+
+
+def _queue_due_slot(user: User, slot: str, now: datetime, totals: MealTotals) -> None:
+    local_now = now + timedelta(minutes=user.timezone or 0)
+    goal = user.goal
+    if not _is_due(getattr(user, f"last_{slot}"), local_now):
+        return
+    if slot == "day":
+        if user.day_enabled:
+            _queue_slot(user, slot, random.choice(REM_TEXT_DAY), now, event="day reminder")
+        return
+    goal_enabled = goal and getattr(goal, f"reminder_{slot}")
+    if goal_enabled:
+        _queue_slot(
+            user,
+            slot,
+            _goal_text(user, goal, slot, now, totals),
+            now,
+            parse_mode="HTML",
+            event=f"goal {slot} reminder",
+        )
+    elif getattr(user, f"{slot}_enabled"):
+        texts = REM_TEXT_MORNING if slot == "morning" else REM_TEXT_EVENING
+        _queue_slot(user, slot, random.choice(texts), now, event=f"{slot} reminder")
+
+
+def _load_due(session, minute_at: datetime):
+    """Return due ``(user, slot)`` pairs for ``minute_at`` in slot order."""
+
+    due = reminder_schedule.due(minute_at.hour * 60 + minute_at.minute)
+    if not due:
+        return []
+    slots_by_user = {}
+    for user_id, slot in due:
+        slots_by_user.setdefault(user_id, set()).add(slot)
+    users = session.query(User).filter(User.id.in_(list(slots_by_user))).all()
+    return [
+        (user, slot)
+        for user in users
+        if not (user.blocked or user.left_bot)
+        for slot in SLOTS
+        if slot in slots_by_user[user.id]
+    ]
+
+
+async def _queue_due_reminders(session, now: datetime, ctx: TickContext) -> None:
+    """Queue the reminders indexed at the current UTC minute.
+
+    Goal texts come from ``goal_text_queue``; meal totals are only aggregated
+    for slots whose text is missing and needs the local fallback.
+    """
+
+    pending = _load_due(session, now)
+    windows = {}
+    for user, slot in pending:
+        if goal_text_queue.has((user.id, slot), now):
+            continue
+        window = _goal_window(user, slot, now)
+        if window:
+            windows[(user.id, slot)] = window
+    totals = meal_window_totals(session, windows) if windows else {}
+    for user, slot in pending:
+        _queue_due_slot(user, slot, now, totals.get((user.id, slot), EMPTY_TOTALS))
+        await ctx.processed()
+
+
+def _prefetch_goal_texts(session, now: datetime) -> int:
+    """Queue advice generation for goal slots due ``GOAL_PREFETCH_MINUTES`` ahead.
+
+    Only grades enabled with the ``goal_ai_<grade>`` options are queued; other
+    users get a fully local text at the due minute.
+    """
+
+    grades = _advice_grades()
+    if not grades:
+        return 0
+    due_at = now + timedelta(minutes=GOAL_PREFETCH_MINUTES)
+    windows = {}
+    users = {}
+    for user, slot in _load_due(session, due_at):
+        if (user.grade or "free").removesuffix("_promo") not in grades:
+            continue
+        window = _goal_window(user, slot, due_at)
+        if window:
+            windows[(user.id, slot)] = window
+            users[user.id] = user
+    if not windows:
+        return 0
+    totals = meal_window_totals(session, windows)
+    queued = 0
+    for user_id, slot in windows:
+        goal = users[user_id].goal
+        fact = totals.get((user_id, slot), EMPTY_TOTALS)[:4]
+        queued += goal_text_queue.submit(
+            (user_id, slot),
+            due_at,
+            partial(_render_with_advice, slot, goal.target, _goal_plan(goal), fact),
+        )
+    log("notification", "queued %s goal texts due at %s", queued, due_at.strftime("%H:%M"))
+    return queued
+
+
+def _catch_up_minutes(now: datetime, since: Optional[datetime]) -> list[datetime]:
+    """Return the minutes after ``since`` up to ``now`` that still need processing.
+
+    The window is capped at ``REMINDER_CATCHUP_MINUTES``; older minutes are
+    dropped with a log entry (e.g. after the process was down).
+    """
+
+    if since is None:
+        return [now]
+    if since >= now:
+        return []
+    start = since + timedelta(minutes=1)
+    earliest = now - timedelta(minutes=REMINDER_CATCHUP_MINUTES - 1)
+    if start < earliest:
+        log(
+            "notification",
+            "reminder catch-up skipped %s minutes before %s",
+            int((earliest - start).total_seconds() // 60),
+            earliest.strftime("%H:%M"),
+        )
+        start = earliest
+    minutes = []
+    while start <= now:
+        minutes.append(start)
+        start += timedelta(minutes=1)
+    return minutes
+
+
+async def run_reminder_tick(
+    now: datetime,
+    since: Optional[datetime] = None,
+    ctx: Optional[TickContext] = None,
+) -> None:
+    """Process one watcher tick: goal trial expiry, inactivity and due slots.
+
+    Slots are sent for every minute after ``since`` (the last processed minute)
+    up to ``now``, so a slow tick delays reminders instead of skipping them.
+    """
+
+    now = now.replace(second=0, microsecond=0)
+    ctx = ctx or TickContext("reminder_watcher")
+    session = SessionLocal()
+    try:
+        built_at = reminder_schedule.built_at
+        if (
+            built_at is None
+            or ctx.clock.monotonic() - built_at >= REMINDER_SCHEDULE_REBUILD_INTERVAL
+        ):
+            rebuild_schedule(session, ctx.clock)
+        _expire_goal_trials(session, now)
+        _disable_inactive_goals(session, now)
+        minutes = _catch_up_minutes(now, since)
+        for minute in minutes:
+            await _queue_due_reminders(session, minute, ctx)
+        goal_text_queue.prune(now)
+        for minute in minutes:
+            _prefetch_goal_texts(session, minute)
+        session.commit()
+    finally:
+        session.close()
+
+
+async def reminder_watcher_tick(ctx: TickContext) -> None:
+    """Watcher entry point: process the current minute and any missed ones.
+
+    The runtime skips a tick while the previous one still runs; the next
+    tick then catches up from the last processed minute kept in ``ctx.state``.
+    """
+
+    now = ctx.now.replace(second=0, microsecond=0)
+    last_processed = ctx.state.get("last_processed")
+    await run_reminder_tick(now, since=last_processed, ctx=ctx)
+    if last_processed is None or now > last_processed:
+        ctx.state["last_processed"] = now
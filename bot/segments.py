@@ -0,0 +1,232 @@
+"""Audience segments for admin broadcasts.
+
+An admin describes a segment as ``key=value`` words, for example
+``grade=light,pro goal=yes inactive=14``. The segment compiles to filters on
+one users query outer-joined to ``subscriptions`` by primary key, so the
+preview is a single ``COUNT`` and the broadcast walks the same query in
+``users.id`` order.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, fields
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import Session
+
+from .database import Goal, Subscription, User
+
+GRADES = ("free", "light", "pro")
+_YES = {"yes", "да", "1", "true"}
+_NO = {"no", "нет", "0", "false"}
+# words meaning "no filter"
+_ALL = {"", "all", "все", "всем"}
+
+
+class SegmentError(ValueError):
+    """The admin's segment text cannot be parsed; the message says why."""
+
+
+@dataclass
+class Segment:
+    """Broadcast audience; ``None`` fields do not filter."""
+
+    grades: Optional[List[str]] = None
+    trial: Optional[bool] = None
+    # last request within this many days
+    active_days: Optional[int] = None
+    # no request for this many days, including users who never sent one
+    inactive_days: Optional[int] = None
+    has_goal: Optional[bool] = None
+    referred: Optional[bool] = None
+    referrer_id: Optional[int] = None
+    # inclusive range of registration dates
+    created_from: Optional[date] = None
+    created_to: Optional[date] = None
+    # paid at least once, judged by subscriptions.paid_until
+    paid: Optional[bool] = None
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) is None for f in fields(self))
+
+    def to_json(self) -> Optional[str]:
+        if self.is_empty():
+            return None
+        values = {key: value for key, value in asdict(self).items() if value is not None}
+        for key in ("created_from", "created_to"):
+            if key in values:
+                values[key] = values[key].isoformat()
+        return json.dumps(values, ensure_ascii=False, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> "Segment":
+        if not raw:
+            return cls()
+        values = json.loads(raw)
+        for key in ("created_from", "created_to"):
+            if values.get(key):
+                values[key] = date.fromisoformat(values[key])
+        return cls(**values)
+
+    def describe(self) -> str:
+        """Render the segment back in the admin's notation."""
+
+        if self.is_empty():
+            return "все"
+        parts = []
+        if self.grades is not None:
+            parts.append("grade=" + ",".join(self.grades))
+        for key, value in (
+            ("trial", self.trial),
+            ("goal", self.has_goal),
+            ("paid", self.paid),
+        ):
+            if value is not None:
+                parts.append(f"{key}={'yes' if value else 'no'}")
+        if self.active_days is not None:
+            parts.append(f"active={self.active_days}")
+        if self.inactive_days is not None:
+            parts.append(f"inactive={self.inactive_days}")
+        if self.referrer_id is not None:
+            parts.append(f"ref={self.referrer_id}")
+        elif self.referred is not None:
+            parts.append(f"ref={'yes' if self.referred else 'no'}")
+        if self.created_from or self.created_to:
+            low = self.created_from.isoformat() if self.created_from else ""
+            high = self.created_to.isoformat() if self.created_to else ""
+            parts.append(f"created={low}..{high}")
+        return " ".join(parts)
+
+
+def _flag(value: str) -> bool:
+    value = value.lower()
+    if value in _YES:
+        return True
+    if value in _NO:
+        return False
+    raise SegmentError(f"ожидалось yes или no: {value}")
+
+
+def _days(value: str) -> int:
+    days = int(value)
+    if days < 0:
+        raise SegmentError(f"отрицательное число дней: {value}")
+    return days
+
+
+def parse_segment(text: str) -> Segment:
+    """Parse ``key=value`` words; raises ``SegmentError`` naming the bad word."""
+
+    segment = Segment()
+    if text.strip().lower() in _ALL:
+        return segment
+    for word in text.split():
+        key, sep, value = word.partition("=")
+        key = key.lower()
+        if not sep or not value:
+            raise SegmentError(f"непонятное условие: {word}")
+        try:
+            if key == "grade":
+                grades = [grade.strip().lower() for grade in value.split(",") if grade.strip()]
+                unknown = [grade for grade in grades if grade not in GRADES]
+                if unknown or not grades:
+                    raise SegmentError(f"неизвестный грейд: {value}")
+                segment.grades = grades
+            elif key == "trial":
+                segment.trial = _flag(value)
+            elif key == "goal":
+                segment.has_goal = _flag(value)
+            elif key == "paid":
+                segment.paid = _flag(value)
+            elif key == "active":
+                segment.active_days = _days(value)
+            elif key == "inactive":
+                segment.inactive_days = _days(value)
+            elif key == "ref":
+                if value.lstrip("-").isdigit():
+                    segment.referrer_id = int(value)
+                else:
+                    segment.referred = _flag(value)
+            elif key == "created":
+                low, dots, high = value.partition("..")
+                if not dots:
+                    low = high = value
+                segment.created_from = date.fromisoformat(low) if low else None
+                segment.created_to = date.fromisoformat(high) if high else None
+            else:
+                raise SegmentError(f"неизвестное условие: {key}")
+        except SegmentError:
+            raise
+        except ValueError as exc:
+            raise SegmentError(f"неверное значение: {word}") from exc
+    return segment
+
+
+def segment_filters(segment: Segment, now: datetime) -> list:
+    """SQL criteria for ``segment``; ages are measured from ``now``."""
+
+    criteria = [User.blocked.isnot(True), User.left_bot.isnot(True)]
+    if segment.grades is not None:
+        # users without a subscription row are on the free grade, and trials
+        # of a grade are stored as "<grade>_promo"
+        grade = Subscription.grade
+        grades = segment.grades + [f"{name}_promo" for name in segment.grades]
+        if "free" in segment.grades:
+            criteria.append(or_(grade.in_(grades), grade.is_(None)))
+        else:
+            criteria.append(grade.in_(grades))
+    if segment.trial is not None:
+        criteria.append(
+            Subscription.trial.is_(True)
+            if segment.trial
+            else Subscription.trial.isnot(True)
+        )
+    if segment.active_days is not None:
+        criteria.append(
+            Subscription.last_request >= now - timedelta(days=segment.active_days)
+        )
+    if segment.inactive_days is not None:
+        criteria.append(
+            or_(
+                Subscription.last_request.is_(None),
+                Subscription.last_request < now - timedelta(days=segment.inactive_days),
+            )
+        )
+    if segment.has_goal is not None:
+        has_goal = exists().where(and_(Goal.user_id == User.id, Goal.calories > 0))
+        criteria.append(has_goal if segment.has_goal else ~has_goal)
+    if segment.referrer_id is not None:
+        criteria.append(User.referrer_id == segment.referrer_id)
+    elif segment.referred is not None:
+        criteria.append(
+            User.referrer_id.isnot(None) if segment.referred else User.referrer_id.is_(None)
+        )
+    if segment.created_from is not None:
+        criteria.append(User.created_at >= datetime.combine(segment.created_from, time()))
+    if segment.created_to is not None:
+        end = datetime.combine(segment.created_to + timedelta(days=1), time())
+        criteria.append(User.created_at < end)
+    if segment.paid is not None:
+        criteria.append(
+            Subscription.paid_until.isnot(None)
+            if segment.paid
+            else Subscription.paid_until.is_(None)
+        )
+    return criteria
+
+
+def segment_query(session: Session, segment: Segment, now: datetime):
+    """``(users.id, telegram_id)`` of the segment's members, unordered."""
+
+    return (
+        session.query(User.id, User.telegram_id)
+        .outerjoin(Subscription, Subscription.user_id == User.id)
+        .filter(*segment_filters(segment, now))
+    )
+
+
+def count_segment(session: Session, segment: Segment, now: datetime) -> int:
+    return segment_query(session, segment, now).count()
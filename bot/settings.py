@@ -35,3 +35,100 @@ STATIC_DIR.mkdir(parents=True, exist_ok=True)
 
 # Filename of the illustration that accompanies the body fat question
 GOAL_BODY_FAT_IMAGE_NAME = "goal_body_fat.png"
+
+# Token-bucket limits for GPT-backed requests (photo, manual input, edits):
+# tier -> (burst capacity, seconds to refill one token)
+THROTTLE_LIMITS = {
+    "free": (3, 20.0),
+    "light": (5, 10.0),
+    "pro": (10, 5.0),
+}
+
+# How long a cached subscription tier is trusted by the throttler, in seconds
+THROTTLE_TIER_TTL = 300
+
+# Rows per transaction for bulk admin operations (days, trials, grades)
+BULK_CHUNK_SIZE = 500
+
+# Seconds between full rebuilds of the in-memory reminder schedule index;
+# handlers keep it current in between, the rebuild is only a safety net
+REMINDER_SCHEDULE_REBUILD_INTERVAL = 3600
+
+# Goal reminder texts are generated this many minutes before they are due,
+# with at most GOAL_GENERATION_CONCURRENCY GPT calls in flight
+GOAL_PREFETCH_MINUTES = 5
+GOAL_GENERATION_CONCURRENCY = 8
+
+# How long a GPT advice paragraph is reused for the same
+# (slot, calorie deviation bucket, goal) before it is generated again
+GOAL_ADVICE_CACHE_TTL = 12 * 3600
+
+# A reminder tick also sends slots due in up to this many previous minutes
+# that a slow or late tick did not process
+REMINDER_CATCHUP_MINUTES = 15
+
+# Background watchers yield to the event loop after this many items and keep
+# metrics for this many recent runs
+WATCHER_CHUNK_SIZE = 50
+WATCHER_HISTORY = 60
+
+# Seconds a watcher run may send for before it stops and continues in a
+# follow-up run, leaving the event loop to handlers in between
+WATCHER_TICK_BUDGET = 20
+
+# Weekly digest: sent on Sunday from DIGEST_LOCAL_HOUR local time, spread over
+# DIGEST_SPREAD_MINUTES; users whose window (DIGEST_WINDOW_MINUTES) was missed,
+# e.g. during a restart, are picked up by the next planning pass
+DIGEST_LOCAL_HOUR = 19
+DIGEST_SPREAD_MINUTES = 120
+DIGEST_WINDOW_MINUTES = 240
+# Minutes between planning passes and users aggregated per query
+DIGEST_PLAN_MINUTES = 10
+DIGEST_CHUNK_SIZE = 500
+# Days of history loaded to compute the logging streak
+DIGEST_STREAK_DAYS = 28
+
+# Every message the bot sends shares one limiter: a global token bucket
+# (Telegram allows about 30 messages per second) and a bucket per chat
+# (about one per second, with short bursts in private chats)
+TELEGRAM_SEND_RATE = 28
+TELEGRAM_SEND_BURST = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_CHAT_BURST = 3
+
+# Rendered messages remembered to skip edits that change nothing, and seconds
+# an entry is kept
+EDIT_CACHE_SIZE = 20000
+EDIT_CACHE_TTL = 6 * 3600
+
+# Seconds between runs that mark users unreachable after failed sends
+REACHABILITY_FLUSH_INTERVAL = 10
+
+# Admin broadcasts: messages per second overall (Telegram allows about 30),
+# requests in flight, users per persisted progress step, seconds between
+# edits of the admin's progress message and seconds to wait for the rest of
+# an album the admin is sending
+BROADCAST_SEND_RATE = 25
+BROADCAST_CONCURRENCY = 10
+BROADCAST_CHUNK_SIZE = 100
+BROADCAST_PROGRESS_INTERVAL = 5
+BROADCAST_ALBUM_WAIT = 1.0
+
+# Broadcasts sent at a local time: UTC offset in minutes assumed for users
+# without a timezone (Moscow) and seconds between cancel checks while a
+# timezone bucket waits for its release
+BROADCAST_DEFAULT_TIMEZONE = 180
+BROADCAST_RELEASE_CHECK = 30
+
+# Notification outbox: seconds between dispatcher runs, rows sent per batch,
+# messages per second, delivery attempts per message and seconds before the
+# first retry (doubled for every further attempt)
+OUTBOX_POLL_INTERVAL = 2
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_SEND_RATE = 20
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+# A message that finally failed blocks the same dedup key for this long, and
+# finished rows are deleted after OUTBOX_KEEP_DAYS
+OUTBOX_FAILED_COOLDOWN = 24 * 3600
+OUTBOX_KEEP_DAYS = 7
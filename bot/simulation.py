@@ -0,0 +1,266 @@
+"""Run the background watchers on a virtual clock.
+
+Seeds users into the configured database, jumps from one scheduled tick to
+the next without sleeping and records what the bot would have sent, with
+CPU time and SQL statement counts per tick::
+
+    DATABASE_URL=sqlite:///sim.db python -m bot.simulation --users 50000 --days 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import heapq
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, insert
+
+from .background import register_watchers
+from .database import (
+    EngagementStatus,
+    NotificationStatus,
+    ReminderSettings,
+    SessionLocal,
+    Subscription,
+    User,
+    engine,
+)
+from .messaging import RateLimiter
+from .reminder_schedule import reminder_schedule
+from .subscriptions import FREE_LIMIT, PAID_LIMIT
+from .watchers import Watcher, WatcherRuntime
+
+
+class VirtualClock:
+    """Clock whose time only moves on ``advance`` or ``sleep``."""
+
+    def __init__(self, start: datetime) -> None:
+        self._now = start
+        self._monotonic = 0.0
+
+    def now(self) -> datetime:
+        return self._now
+
+    def time(self) -> float:
+        return self._now.replace(tzinfo=timezone.utc).timestamp()
+
+    def monotonic(self) -> float:
+        return self._monotonic
+
+    def advance(self, seconds: float) -> None:
+        self._now += timedelta(seconds=seconds)
+        self._monotonic += seconds
+
+    async def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+
+@dataclass
+class SentMessage:
+    at: datetime
+    chat_id: int
+    text: str
+    kwargs: Dict[str, Any]
+
+
+class RecordingBot:
+    """Stand-in for ``aiogram.Bot`` that records messages instead of sending them."""
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.sent: List[SentMessage] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.sent.append(SentMessage(self.clock.now(), chat_id, text, kwargs))
+        return SimpleNamespace(message_id=len(self.sent), chat=SimpleNamespace(id=chat_id))
+
+
+class QueryCounter:
+    """Count SQL statements executed on ``engine`` while attached."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+@dataclass
+class SimTick:
+    """Cost of one scheduled run, including its continuation runs."""
+
+    watcher: str
+    at: datetime
+    cpu: float
+    queries: int
+    items: int
+    errors: int
+    sent: int
+
+
+def seed_users(session, count: int, *, now: datetime, rng: random.Random) -> int:
+    """Bulk insert ``count`` users with a spread of grades, activity and reminders."""
+
+    first_id = (session.query(func.max(User.id)).scalar() or 0) + 1
+    first_telegram_id = (session.query(func.max(User.telegram_id)).scalar() or 0) + 1
+    users, subscriptions, reminders, notifications, engagement = [], [], [], [], []
+    for offset in range(count):
+        user_id = first_id + offset
+        created_at = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+        requests_total = rng.choice((0, 0, 1, 3, 7, 20, 100))
+        grade = rng.choices(("free", "light", "pro"), weights=(80, 12, 8))[0]
+        users.append(
+            {"id": user_id, "telegram_id": first_telegram_id + offset, "created_at": created_at}
+        )
+        subscriptions.append(
+            {
+                "user_id": user_id,
+                "grade": grade,
+                "request_limit": FREE_LIMIT if grade == "free" else PAID_LIMIT,
+                "requests_used": rng.randint(0, FREE_LIMIT) if grade == "free" else 0,
+                "requests_total": requests_total,
+                "last_request": (
+                    created_at + (now - created_at) * rng.random() if requests_total else None
+                ),
+                "monthly_start": created_at,
+                "period_start": created_at,
+                "period_end": now + timedelta(days=rng.randint(-5, 30)),
+                "daily_start": now,
+            }
+        )
+        reminders.append(
+            {
+                "user_id": user_id,
+                "timezone": rng.choice((None, 0, 120, 180, 300, 420, 600, -300)),
+                "morning_time": f"{rng.randint(6, 10):02d}:{rng.choice((0, 15, 30, 45)):02d}",
+                "evening_time": f"{rng.randint(18, 22):02d}:00",
+                "morning_enabled": rng.random() < 0.5,
+                "day_enabled": rng.random() < 0.3,
+                "evening_enabled": rng.random() < 0.5,
+            }
+        )
+        notifications.append({"user_id": user_id, "notified_free": True})
+        engagement.append({"user_id": user_id})
+    for model, rows in (
+        (User, users),
+        (Subscription, subscriptions),
+        (ReminderSettings, reminders),
+        (NotificationStatus, notifications),
+        (EngagementStatus, engagement),
+    ):
+        if rows:
+            session.execute(insert(model), rows)
+    session.commit()
+    return count
+
+
+class Simulation:
+    """All registered watchers on a ``VirtualClock`` with a ``RecordingBot``."""
+
+    def __init__(self, start: datetime) -> None:
+        self.clock = VirtualClock(start)
+        self.bot = RecordingBot(self.clock)
+        # pacing is Telegram's concern, the simulation measures our own work
+        self.runtime = register_watchers(
+            WatcherRuntime(self.clock),
+            self.bot,
+            limiter=RateLimiter(float("inf"), chat_interval=0),
+        )
+        self.ticks: List[SimTick] = []
+        # built against whatever database the process used before
+        reminder_schedule.clear()
+
+    async def _measure(self, watcher: Watcher, counter: QueryCounter) -> SimTick:
+        at = self.clock.now()
+        queries = counter.count
+        sent = len(self.bot.sent)
+        cpu = time.process_time()
+        runs = await self.runtime.run_once(watcher)
+        return SimTick(
+            watcher.name,
+            at,
+            time.process_time() - cpu,
+            counter.count - queries,
+            sum(run.items for run in runs),
+            sum(run.errors for run in runs),
+            len(self.bot.sent) - sent,
+        )
+
+    async def run_until(
+        self, end: datetime, watchers: Optional[Iterable[str]] = None
+    ) -> List[SimTick]:
+        """Run the selected watchers (all by default) on schedule until ``end``."""
+
+        names = set(watchers) if watchers else None
+        queue = []
+        now = self.clock.time()
+        for order, watcher in enumerate(self.runtime.watchers.values()):
+            if names is not None and watcher.name not in names:
+                continue
+            due = now if watcher.immediate else now + watcher.next_delay(now)
+            queue.append((due, order, watcher))
+        heapq.heapify(queue)
+        end_at = end.replace(tzinfo=timezone.utc).timestamp()
+        with QueryCounter() as counter:
+            while queue and queue[0][0] < end_at:
+                due, order, watcher = heapq.heappop(queue)
+                self.clock.advance(max(due - self.clock.time(), 0.0))
+                self.ticks.append(await self._measure(watcher, counter))
+                heapq.heappush(queue, (due + watcher.next_delay(due), order, watcher))
+        self.clock.advance(max(end_at - self.clock.time(), 0.0))
+        return self.ticks
+
+    def report(self) -> str:
+        by_watcher: Dict[str, List[SimTick]] = defaultdict(list)
+        for tick in self.ticks:
+            by_watcher[tick.watcher].append(tick)
+        lines = []
+        for name, ticks in by_watcher.items():
+            slowest = max(ticks, key=lambda tick: tick.cpu)
+            lines.append(
+                f"{name}: ticks={len(ticks)} "
+                f"cpu={sum(t.cpu for t in ticks):.2f}s (max {slowest.cpu * 1000:.1f}ms "
+                f"at {slowest.at:%Y-%m-%d %H:%M}) "
+                f"queries={sum(t.queries for t in ticks)} (max {max(t.queries for t in ticks)}) "
+                f"items={sum(t.items for t in ticks)} errors={sum(t.errors for t in ticks)} "
+                f"sent={sum(t.sent for t in ticks)}"
+            )
+        lines.append(f"messages sent: {len(self.bot.sent)}")
+        return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--watchers", nargs="*", help="watcher names, all by default")
+    args = parser.parse_args()
+
+    start = datetime.utcnow().replace(second=0, microsecond=0)
+    with SessionLocal() as session:
+        if session.query(User.id).first():
+            raise SystemExit("DATABASE_URL already has users; point it at an empty database")
+        seed_users(session, args.users, now=start, rng=random.Random(args.seed))
+    simulation = Simulation(start)
+    asyncio.run(simulation.run_until(start + timedelta(days=args.days), args.watchers))
+    print(simulation.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,9 @@ class LookupMeal(StatesGroup):
 class AdminState(StatesGroup):
     waiting_broadcast = State()
     waiting_broadcast_support = State()
+    waiting_broadcast_segment = State()
+    waiting_broadcast_confirm = State()
+    waiting_broadcast_time = State()
     waiting_user_id = State()
     waiting_days = State()
     waiting_days_all = State()
@@ -32,6 +35,7 @@ class AdminState(StatesGroup):
     waiting_comment_text = State()
     waiting_discount_id = State()
     waiting_discount_confirm = State()
+    waiting_bulk_confirm = State()
 
 
 class ReminderState(StatesGroup):
@@ -1,12 +1,92 @@
 from __future__ import annotations
 
-from typing import Dict, Optional, Union
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+import heapq
 import os
 import time
 
 
+# (timestamp, meal_id)
+_Deadline = Tuple[float, str]
+
+
+class PendingMeals(Dict[str, Dict]):
+    """Dict of meals awaiting confirmation with min-heaps ordered by age.
+
+    Every meal stored with a ``timestamp`` is pushed onto a reminder heap and
+    an expiry heap, so periodic jobs pop only the entries older than their
+    cutoff instead of scanning the whole dict. Saved or deleted meals are
+    removed lazily: a heap entry whose meal is gone or was replaced is
+    dropped when popped, and the heaps are rebuilt once stale entries
+    outnumber live meals.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._reminders: List[_Deadline] = []
+        self._expiry: List[_Deadline] = []
+
+    def __setitem__(self, meal_id: str, meal: Dict) -> None:
+        super().__setitem__(meal_id, meal)
+        timestamp = meal.get("timestamp")
+        if not timestamp:
+            return
+        heapq.heappush(self._reminders, (timestamp, meal_id))
+        heapq.heappush(self._expiry, (timestamp, meal_id))
+        if len(self._expiry) > 2 * len(self) + 64:
+            self._compact()
+
+    def clear(self) -> None:
+        super().clear()
+        self._reminders.clear()
+        self._expiry.clear()
+
+    def _live(self, entry: _Deadline) -> Optional[Dict]:
+        timestamp, meal_id = entry
+        meal = self.get(meal_id)
+        if meal is None or meal.get("timestamp") != timestamp:
+            return None
+        return meal
+
+    def _pop_older(self, heap: List[_Deadline], cutoff: float) -> List[Tuple[str, Dict]]:
+        due = []
+        while heap and heap[0][0] < cutoff:
+            entry = heapq.heappop(heap)
+            meal = self._live(entry)
+            if meal is not None:
+                due.append((entry[1], meal))
+        return due
+
+    def _compact(self) -> None:
+        self._reminders = [
+            entry
+            for entry in self._reminders
+            if (meal := self._live(entry)) is not None and not meal.get("reminded")
+        ]
+        self._expiry = [entry for entry in self._expiry if self._live(entry) is not None]
+        heapq.heapify(self._reminders)
+        heapq.heapify(self._expiry)
+
+    def pop_reminders(self, cutoff: float) -> List[Tuple[str, Dict]]:
+        """Return live meals created before ``cutoff`` that are still due a reminder."""
+
+        return [
+            (meal_id, meal)
+            for meal_id, meal in self._pop_older(self._reminders, cutoff)
+            if not meal.get("reminded")
+        ]
+
+    def pop_expired(self, cutoff: float) -> List[Tuple[str, Dict]]:
+        """Return live meals created before ``cutoff``; the caller removes them."""
+
+        return self._pop_older(self._expiry, cutoff)
+
+
 # in-memory store for photos being processed
-pending_meals: Dict[str, Dict] = {}
+pending_meals = PendingMeals()
+
+# telegram ids of users blocked by admins or by the daily limit
+blocked_users: Set[int] = set()
 
 # track reminder states for invalid photo uploads
 _ReminderState = Dict[str, Union[float, bool]]
@@ -61,6 +141,25 @@ def reset_multi_photo_prompt(user_id: int) -> None:
     _reset_prompt(_multi_photo_reminders, user_id)
 
 
+def set_blocked_users(telegram_ids: Iterable[int]) -> None:
+    """Replace the cached set of blocked users."""
+
+    blocked_users.clear()
+    blocked_users.update(telegram_ids)
+
+
+def mark_blocked(telegram_id: int) -> None:
+    blocked_users.add(telegram_id)
+
+
+def mark_unblocked(telegram_id: int) -> None:
+    blocked_users.discard(telegram_id)
+
+
+def is_blocked(telegram_id: int) -> bool:
+    return telegram_id in blocked_users
+
+
 def remove_photo_if_unused(path: str, ignore_id: Optional[str] = None) -> None:
     """Delete the photo from disk if no other pending meal references it."""
     if not path:
@@ -3,7 +3,6 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 import asyncio
-from aiogram import Bot
 from .keyboards import subscribe_button
 from .texts import (
     SUB_END_7D,
@@ -30,7 +29,10 @@ from .database import (
 )
 
 from .logger import log
-from .messaging import send_with_retries
+from .outbox import PRIORITY_NOTICE, Mark, enqueue
+from .storage import mark_blocked
+from .throttling import forget_user
+from .watchers import TickContext
 from .alerts import (
     anomalous_activity,
     user_blocked_daily,
@@ -41,41 +43,39 @@ FREE_LIMIT = 20
 PAID_LIMIT = 800
 
 
-async def _send_notification(
-    bot: Bot,
-    chat_id: int,
+def _queue_notification(
+    session,
+    user: User,
     text: str,
+    now: datetime,
     *,
     event: str,
     reply_markup=None,
-    **kwargs,
+    flag: Optional[str] = None,
 ) -> bool:
-    """Send subscription-related notifications with retries and logging."""
-
-    send_kwargs = {}
-    if reply_markup is not None:
-        send_kwargs["reply_markup"] = reply_markup
-    send_kwargs.update(kwargs)
-    delivered = await send_with_retries(
-        bot,
-        chat_id,
-        text=text,
-        category="notification",
-        **send_kwargs,
+    """Queue a subscription notice; ``flag`` is set once it is delivered."""
+
+    if user.left_bot:
+        return False
+    return enqueue(
+        session,
+        user.telegram_id,
+        text,
+        now=now,
+        event=event,
+        priority=PRIORITY_NOTICE,
+        reply_markup=reply_markup,
+        dedup_key=f"{flag}:{user.id}" if flag else None,
+        on_delivered=[Mark(NotificationStatus, user.id, {flag: True})] if flag else (),
     )
-    if delivered:
-        log("notification", "delivered %s to %s", event, chat_id)
-    else:
-        log("notification", "failed to deliver %s to %s", event, chat_id)
-    return delivered
 
 
-def update_monthly(user: User) -> None:
+def update_monthly(user: User, now: Optional[datetime] = None) -> None:
     """Reset monthly counters every 30 days since registration."""
+    now = now or datetime.utcnow()
     if user.monthly_start is None:
-        user.monthly_start = user.created_at or datetime.utcnow()
+        user.monthly_start = user.created_at or now
         user.monthly_used = 0
-    now = datetime.utcnow()
     while (now - user.monthly_start).days >= 30:
         user.monthly_start += timedelta(days=30)
         user.monthly_used = 0
@@ -114,9 +114,9 @@ def ensure_user(session: SessionLocal, telegram_id: int) -> User:
     return user
 
 
-def update_limits(user: User) -> None:
-    update_monthly(user)
-    now = datetime.utcnow()
+def update_limits(user: User, now: Optional[datetime] = None) -> None:
+    now = now or datetime.utcnow()
+    update_monthly(user, now)
     if user.grade != "free":
         user.goal_trial_start = None
         user.goal_trial_notified = False
@@ -212,6 +212,7 @@ def consume_request(session: SessionLocal, user: User) -> tuple[bool, str]:
         asyncio.create_task(alert_monthly_limit(user.telegram_id))
     session.commit()
     if blocked:
+        mark_blocked(user.telegram_id)
         asyncio.create_task(user_blocked_daily(user.telegram_id))
     log("limit", "request consumed by %s", user.telegram_id)
     return True, ""
@@ -235,6 +236,7 @@ def process_payment_success(
         user.trial_end = None
         user.resume_grade = None
         user.resume_period_end = None
+    forget_user(user.telegram_id)
 
     def add_period(dt: datetime, count: int = 1) -> datetime:
         """Add count * 30 days to dt."""
@@ -266,7 +268,9 @@ def process_payment_success(
     user.notified_0d = False
     user.goal_trial_start = None
     user.goal_trial_notified = False
-    payment = Payment(user_id=user.id, months=months, tier=grade)
+    paid_from = user.paid_until if user.paid_until and user.paid_until > now else now
+    user.paid_until = add_period(paid_from, months)
+    payment = Payment(user_id=user.id, months=months, tier=grade, timestamp=now)
     session.add(payment)
     session.commit()
     log("payment", "subscription purchased: %s for %s months", user.telegram_id, months)
@@ -334,9 +338,11 @@ def check_start_trial(session: SessionLocal, user: User) -> Optional[tuple[str,
     return None
 
 
-async def notify_trial_end(bot: Bot, session: SessionLocal, user: User) -> None:
+def notify_trial_end(
+    session: SessionLocal, user: User, now: Optional[datetime] = None
+) -> None:
     """Notify user about expired trial and restore subscription if needed."""
-    now = datetime.utcnow()
+    now = now or datetime.utcnow()
     if (
         user.trial
         and user.trial_end
@@ -347,12 +353,8 @@ async def notify_trial_end(bot: Bot, session: SessionLocal, user: User) -> None:
         if user.resume_grade == "light" and user.grade.startswith("pro"):
             text = TRIAL_PRO_ENDED_START
         kb = None if text == TRIAL_PRO_ENDED_START else subscribe_button(BTN_REMOVE_LIMIT)
-        await _send_notification(
-            bot,
-            user.telegram_id,
-            text,
-            event="trial ended notice",
-            reply_markup=kb,
+        _queue_notification(
+            session, user, text, now, event="trial ended notice", reply_markup=kb
         )
         if user.resume_grade:
             user.grade = user.resume_grade
@@ -375,113 +377,124 @@ async def notify_trial_end(bot: Bot, session: SessionLocal, user: User) -> None:
         session.commit()
 
 
-def subscription_watcher(bot: Bot, check_interval: int = 3600):
-    """Check subscriptions periodically and notify users."""
-
-    async def _watch():
-        log("watcher", "subscription watcher started with %s sec interval", check_interval)
-        while True:
-            await _daily_check(bot)
-            await asyncio.sleep(check_interval)
-
-    return _watch
+async def subscription_watcher_tick(ctx: Optional[TickContext] = None) -> None:
+    """Check subscriptions of all users in id order, one chunk per commit.
 
+    When the run's time budget is spent the last checked id is kept in
+    ``ctx.state`` and the next run continues after it.
+    """
 
-async def _daily_check(bot: Bot):
-    log("watcher", "running subscription check")
+    ctx = ctx or TickContext("subscription_watcher")
+    after_id = ctx.state.pop("after_id", 0)
+    if not after_id:
+        log("watcher", "running subscription check")
     session = SessionLocal()
-    now = datetime.utcnow()
-    users = session.query(User).all()
-    for user in users:
-        await notify_trial_end(bot, session, user)
-        if (
-            user.grade in {"light", "pro"}
-            and user.period_end
-            and now > user.period_end
-            and user.resume_grade
-            and user.resume_period_end
-            and user.resume_period_end > now
-            and not user.trial
-        ):
-            if not user.notified_0d:
-                text = SUB_SWITCHED.format(
-                    old=grade_name(user.grade),
-                    new=grade_name(user.resume_grade),
-                )
-                await _send_notification(
-                    bot,
-                    user.telegram_id,
-                    text,
-                    event="plan switch resume notice",
-                )
-            user.grade = user.resume_grade
-            user.period_end = user.resume_period_end
-            user.resume_grade = None
-            user.resume_period_end = None
-            user.notified_0d = False
-            session.commit()
-            continue
-        if (
-            user.resume_grade
-            and user.resume_period_end
-            and now > user.resume_period_end
-            and user.grade in {"light", "pro"}
-            and not user.trial
-            and user.period_end
-            and now <= user.period_end
-        ):
-            if not user.notified_0d:
-                text = SUB_SWITCHED.format(
-                    old=grade_name(user.resume_grade),
-                    new=grade_name(user.grade),
-                )
-                delivered = await _send_notification(
-                    bot,
-                    user.telegram_id,
-                    text,
-                    event="plan switch current notice",
-                )
-                if delivered:
-                    user.notified_0d = True
-        if user.grade in {"light", "pro"} and user.period_end and not user.trial:
-            delta = user.period_end - now
-            text = None
-            price = PLAN_PRICES["1m"] if user.grade == "light" else PRO_PLAN_PRICES["1m"]
-            flag = None
-            if delta <= timedelta(0) and not user.notified_0d:
-                text = SUB_PAUSED.format(price=price)
-                flag = "notified_0d"
-            elif delta <= timedelta(days=1) and not user.notified_1d:
-                text = SUB_END_1D.format(price=price)
-                flag = "notified_1d"
-            elif delta <= timedelta(days=3) and not user.notified_3d:
-                text = SUB_END_3D.format(price=price)
-                flag = "notified_3d"
-            elif delta <= timedelta(days=7) and not user.notified_7d:
-                text = SUB_END_7D.format(price=price)
-                flag = "notified_7d"
-            if text:
-                kb = subscribe_button(BTN_RENEW_SUB)
-                delivered = await _send_notification(
-                    bot,
-                    user.telegram_id,
-                    text,
-                    event="subscription expiry notice",
-                    reply_markup=kb,
-                )
-                if delivered and flag:
-                    setattr(user, flag, True)
-        update_limits(user)
-        if user.grade == "free" and not user.notified_free:
-            delivered = await _send_notification(
-                bot,
-                user.telegram_id,
-                FREE_DAY_TEXT,
-                event="free quota notice",
-                reply_markup=subscribe_button(BTN_REMOVE_LIMIT),
+    now = ctx.now
+    try:
+        while True:
+            users = (
+                session.query(User)
+                .filter(User.id > after_id)
+                .order_by(User.id)
+                .limit(ctx.chunk_size)
+                .all()
             )
-            if delivered:
-                user.notified_free = True
-    session.commit()
-    session.close()
+            if not users:
+                break
+            for user in users:
+                _check_user(session, user, now)
+                after_id = user.id
+            session.commit()
+            await ctx.processed(len(users))
+            if ctx.out_of_time():
+                ctx.state["after_id"] = after_id
+                ctx.defer()
+                break
+    finally:
+        session.close()
+
 
+def _check_user(session, user: User, now: datetime) -> None:
+    notify_trial_end(session, user, now)
+    if (
+        user.grade in {"light", "pro"}
+        and user.period_end
+        and now > user.period_end
+        and user.resume_grade
+        and user.resume_period_end
+        and user.resume_period_end > now
+        and not user.trial
+    ):
+        if not user.notified_0d:
+            text = SUB_SWITCHED.format(
+                old=grade_name(user.grade),
+                new=grade_name(user.resume_grade),
+            )
+            _queue_notification(session, user, text, now, event="plan switch resume notice")
+        user.grade = user.resume_grade
+        user.period_end = user.resume_period_end
+        user.resume_grade = None
+        user.resume_period_end = None
+        user.notified_0d = False
+        session.commit()
+        return
+    if (
+        user.resume_grade
+        and user.resume_period_end
+        and now > user.resume_period_end
+        and user.grade in {"light", "pro"}
+        and not user.trial
+        and user.period_end
+        and now <= user.period_end
+    ):
+        if not user.notified_0d:
+            text = SUB_SWITCHED.format(
+                old=grade_name(user.resume_grade),
+                new=grade_name(user.grade),
+            )
+            _queue_notification(
+                session,
+                user,
+                text,
+                now,
+                event="plan switch current notice",
+                flag="notified_0d",
+            )
+    if user.grade in {"light", "pro"} and user.period_end and not user.trial:
+        delta = user.period_end - now
+        text = None
+        price = PLAN_PRICES["1m"] if user.grade == "light" else PRO_PLAN_PRICES["1m"]
+        flag = None
+        if delta <= timedelta(0) and not user.notified_0d:
+            text = SUB_PAUSED.format(price=price)
+            flag = "notified_0d"
+        elif delta <= timedelta(days=1) and not user.notified_1d:
+            text = SUB_END_1D.format(price=price)
+            flag = "notified_1d"
+        elif delta <= timedelta(days=3) and not user.notified_3d:
+            text = SUB_END_3D.format(price=price)
+            flag = "notified_3d"
+        elif delta <= timedelta(days=7) and not user.notified_7d:
+            text = SUB_END_7D.format(price=price)
+            flag = "notified_7d"
+        if text:
+            _queue_notification(
+                session,
+                user,
+                text,
+                now,
+                event="subscription expiry notice",
+                reply_markup=subscribe_button(BTN_RENEW_SUB),
+                flag=flag,
+            )
+    update_limits(user, now)
+    if user.grade == "free" and not user.notified_free:
+        _queue_notification(
+            session,
+            user,
+            FREE_DAY_TEXT,
+            now,
+            event="free quota notice",
+            reply_markup=subscribe_button(BTN_REMOVE_LIMIT),
+            flag="notified_free",
+        )
@@ -77,6 +77,9 @@ LIMIT_REACHED_TEXT = (
 PAID_DAILY_LIMIT_TEXT = (
     "🤖 Превышен дневной лимит запросов. Свяжитесь с поддержкой {support}"
 )
+THROTTLED_TEXT = (
+    "⏳ Слишком много запросов подряд. Попробуй снова через {seconds} сек."
+)
 
 # Template for meal info message
 MEAL_TEMPLATE = (
@@ -126,6 +129,7 @@ BTN_MANUAL = "✏️ Ручной ввод"
 BTN_SETTINGS = "⚙️ Настройки"
 BTN_REMINDERS = "🔔 Напоминания"
 BTN_GOALS = "📈 Цели питания"
+BTN_DIGEST = "📅 Итоги недели"
 BTN_UPDATE_TIME = "🔄 Обновить время"
 BTN_MORNING = "Утро"
 BTN_DAY_REM = "День"
@@ -199,6 +203,75 @@ GOAL_REMINDERS_DISABLED = (
     "Если ты забыл: чтобы цели работали, добавляй проанализированное блюдо через кнопку «Сохранить»."
 )
 
+# Goal reminder building blocks; numbers are filled in by goal_templates
+GOAL_MORNING_GREETINGS = [
+    "Доброе утро! Новый день — новые возможности",
+    "С добрым утром! Пусть день будет вкусным и полезным",
+    "Привет! Отличное утро, чтобы стать ближе к цели",
+    "Доброе утро! Начнём день с хорошего завтрака",
+]
+GOAL_EVENING_VERDICTS = {
+    "empty": [
+        "Сегодня в дневнике пока пусто",
+        "Похоже, сегодня блюда не сохранялись",
+    ],
+    "low": [
+        "День закончился с заметным недобором",
+        "Сегодня калорий было маловато",
+    ],
+    "under": [
+        "Почти в цели — совсем чуть-чуть не хватило",
+        "Хороший день, немного ниже плана",
+    ],
+    "on_track": [
+        "Отличный день — ты в цели!",
+        "Точно в план, так держать!",
+    ],
+    "over": [
+        "Небольшой перебор, ничего страшного",
+        "Чуть выше плана — так бывает",
+    ],
+    "high": [
+        "Сегодня вышло заметно больше плана",
+        "День с перебором — завтра выровняем",
+    ],
+}
+GOAL_SUMMARY = {
+    "morning": "Вчера: {kcal} ккал / {P} Б / {F} Ж / {C} У",
+    "evening": "Сегодня: {kcal} ккал / {P} Б / {F} Ж / {C} У",
+}
+GOAL_SUMMARY_EMPTY = {
+    "morning": "Вчера питание не отмечалось",
+    "evening": "Сегодня питание не отмечалось",
+}
+GOAL_TARGET_LINE = "Твоя цель {plan_kcal} ккал / {plan_P} Б / {plan_F} Ж / {plan_C} У"
+GOAL_ADVICE = {
+    "empty": [
+        "Сфоткай первое блюдо — я всё посчитаю 📸",
+        "Сохраняй блюда, чтобы видеть свой прогресс",
+    ],
+    "low": [
+        "Добавь полноценный приём пищи с белком и крупой",
+        "Не пропускай приёмы пищи — недобор тормозит прогресс",
+    ],
+    "under": [
+        "Небольшой перекус с белком закроет разницу",
+        "Горсть орехов или йогурт — и будет ровно",
+    ],
+    "on_track": [
+        "Продолжай в том же ритме",
+        "Так держать — стабильность решает",
+    ],
+    "over": [
+        "Сделай следующий приём пищи легче — больше овощей",
+        "Замени сладкое на фрукты, и всё выровняется",
+    ],
+    "high": [
+        "Следи за порциями и перекусами на ходу",
+        "Попробуй планировать приёмы пищи заранее",
+    ],
+}
+
 # Reminder notification texts
 REM_TEXT_MORNING = [
     "🌞 Доброе утро! Что вкусного на завтрак? Не забудь сфоткать еду 📸",
@@ -258,6 +331,24 @@ GOAL_TRENDS = (
     "— Жиры: {f} от цели {f_goal}\n"
     "— Углеводы: {c} от цели {c_goal}\n"
 )
+WEEKLY_DIGEST = (
+    "📅 Итоги недели\n"
+    "Записано дней: {logged} из 7\n"
+    "— В среднем: {cal} ккал при цели {cal_goal}\n"
+    "— Белки: {p} г (цель {p_goal}) • Жиры: {f} г (цель {f_goal}) • Углеводы: {c} г (цель {c_goal})\n"
+    "👍 Ближе всего к цели: {best_day} — {best_cal} ккал\n"
+    "👀 Дальше всего от цели: {worst_day} — {worst_cal} ккал\n"
+    "🔥 Серия: {streak} {streak_word} подряд"
+)
+WEEKDAY_NAMES = [
+    "понедельник",
+    "вторник",
+    "среда",
+    "четверг",
+    "пятница",
+    "суббота",
+    "воскресенье",
+]
 GOAL_REMINDERS_TEXT = "Напоминания о цели\nТекущее время: {time}"
 GOAL_STOP_PROMPT = (
     "Ты уверен, что хочешь остановить отслеживание целей питания?  \n"
@@ -436,10 +527,38 @@ SERVER_ERROR = "Произошла ошибка на сервере, попро
 ADMIN_MODE = "Админ режим"
 ADMIN_UNAVAILABLE = "Недоступно"
 BROADCAST_CHOOSE = "Выберите тип рассылки"
-BROADCAST_PROMPT = "Введите сообщение"
-BROADCAST_ERROR = "Ошибка при отправке сообщения"
-BROADCAST_DONE = "Рассылка отправлена"
+BROADCAST_PROMPT = "Введите сообщение или отправьте фото, видео, файл или альбом с подписью"
+BROADCAST_PROGRESS = "Рассылка: {done} из {total}\nДоставлено: {delivered}\nНе доставлено: {failed}"
+BROADCAST_FINISHED = "Рассылка завершена\nДоставлено: {delivered} из {total}\nНе доставлено: {failed}"
+BROADCAST_CANCELLED = "Рассылка остановлена\nДоставлено: {delivered} из {total}\nНе доставлено: {failed}"
+BROADCAST_CANCELLING = "Останавливаем рассылку"
+BTN_BROADCAST_CANCEL = "Остановить рассылку"
 BROADCAST_SUPPORT_PROMPT = "В тексте будет кнопка \"🤖 Поддержка\". Напиши текст сообщения"
+BROADCAST_ALBUM_NO_BUTTON = "К альбому нельзя прикрепить кнопку. Отправь один файл или текст"
+BROADCAST_SEGMENT_PROMPT = (
+    "Кому отправить? Напиши «все» или условия через пробел:\n"
+    "grade=free,light,pro — грейд\n"
+    "trial=yes|no — пробный период\n"
+    "active=7 — были запросы за 7 дней\n"
+    "inactive=30 — нет запросов 30 дней\n"
+    "goal=yes|no — есть цель\n"
+    "ref=yes|no|telegram_id — пришел по реферальной ссылке\n"
+    "created=2025-01-01..2025-02-01 — дата регистрации\n"
+    "paid=yes|no — оплачивал подписку"
+)
+BROADCAST_SEGMENT_INVALID = "Не удалось разобрать условия: {error}"
+BROADCAST_SEGMENT_EMPTY = "Под эти условия не попал ни один пользователь. Введи другие условия"
+BROADCAST_SEGMENT_PREVIEW = "Сегмент: {segment}\nПолучателей: {count}. Отправить?"
+BTN_BROADCAST_LOCAL_TIME = "По местному времени"
+BROADCAST_TIME_PROMPT = (
+    "Во сколько отправить по местному времени получателя? Формат ЧЧ:ММ\n"
+    "Кто не указал часовой пояс, получит по Москве"
+)
+BROADCAST_SCHEDULED_PREVIEW = (
+    "Сегмент: {segment}\nПолучателей: {count}\n"
+    "Отправка в {time} по местному времени. Запланировать?"
+)
+BROADCAST_SCHEDULED_NOTE = "\nОтправка в {time} по местному времени"
 BTN_DAYS = "Дни"
 BTN_ONE = "Одному"
 BTN_ALL = "Всем"
@@ -479,6 +598,8 @@ BTN_METHODS = "Методы оплаты"
 BTN_GRADES = "Грейды"
 BTN_GRADE_START = "Старт"
 BTN_GRADE_PRO = "PRO"
+BTN_GRADE_FREE = "Free"
+BTN_GOAL_AI = "🤖 GPT-советы в целях:"
 ADMIN_METHODS_TITLE = "Методы оплаты"
 ADMIN_GRADES_TITLE = "Грейды"
 ADMIN_SETTINGS_TITLE = "Настройки"
@@ -489,6 +610,9 @@ BTN_TRIAL_DAYS = "Дни: {days}"
 ADMIN_DISCOUNT_PROMPT = "Нажмите «Подтверждаю» для отправки"
 ADMIN_DISCOUNT_DONE = "Предложение отправлено"
 ADMIN_DISCOUNT_COOLDOWN = "Скидка уже отправлялась этому пользователю менее 30 дней назад"
+ADMIN_DISCOUNT_QUEUED = "Предложение поставлено в очередь на отправку"
+ADMIN_BULK_CONFIRM = "Будет изменено пользователей: {count}. Подтвердить?"
+ADMIN_BULK_PROGRESS = "Обработано {done}/{total}"
 DISCOUNT_MESSAGE = (
     "🔥 Специальная акция для новых пользователей!\n"
     "Переходи на платный тариф и используй Nomnomly без лимитов и ограничений.\n\n"
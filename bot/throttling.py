@@ -0,0 +1,149 @@
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, types
+from aiogram.dispatcher.flags import get_flag
+
+from .database import SessionLocal, Subscription, User
+from .logger import log
+from .settings import THROTTLE_LIMITS, THROTTLE_TIER_TTL
+from .texts import THROTTLED_TEXT
+
+
+Handler = Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class TokenBucket:
+    tier: str
+    tokens: float
+    updated: float
+    tier_checked: float
+    notified: bool = False
+
+    def refill(self, now: float) -> None:
+        capacity, period = THROTTLE_LIMITS[self.tier]
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(float(capacity), self.tokens + elapsed / period)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consume a token and return 0, or return seconds until one is available."""
+
+        self.refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        _, period = THROTTLE_LIMITS[self.tier]
+        return (1.0 - self.tokens) * period
+
+
+_buckets: Dict[int, TokenBucket] = {}
+throttle_stats: Counter = Counter()
+
+
+def _load_tier(telegram_id: int) -> str:
+    session = SessionLocal()
+    try:
+        grade = (
+            session.query(Subscription.grade)
+            .join(User, User.id == Subscription.user_id)
+            .filter(User.telegram_id == telegram_id)
+            .scalar()
+        )
+    finally:
+        session.close()
+    # trials of a paid grade are stored as "<grade>_promo"
+    grade = (grade or "free").removesuffix("_promo")
+    return grade if grade in THROTTLE_LIMITS else "free"
+
+
+def _get_bucket(telegram_id: int, now: float) -> TokenBucket:
+    bucket = _buckets.get(telegram_id)
+    if bucket is None:
+        tier = _load_tier(telegram_id)
+        bucket = TokenBucket(
+            tier=tier,
+            tokens=float(THROTTLE_LIMITS[tier][0]),
+            updated=now,
+            tier_checked=now,
+        )
+        _buckets[telegram_id] = bucket
+    elif now - bucket.tier_checked >= THROTTLE_TIER_TTL:
+        bucket.refill(now)
+        bucket.tier = _load_tier(telegram_id)
+        bucket.tier_checked = now
+    return bucket
+
+
+def acquire(telegram_id: int, now: Optional[float] = None) -> float:
+    """Take a request token for the user; return retry-after seconds if throttled."""
+
+    current = now if now is not None else time.monotonic()
+    bucket = _get_bucket(telegram_id, current)
+    retry_after = bucket.take(current)
+    if retry_after:
+        throttle_stats[f"{bucket.tier}:rejected"] += 1
+    else:
+        throttle_stats[f"{bucket.tier}:allowed"] += 1
+        bucket.notified = False
+    return retry_after
+
+
+def forget_user(telegram_id: int) -> None:
+    """Drop the cached bucket so the next request re-reads the user's tier."""
+
+    _buckets.pop(telegram_id, None)
+
+
+def prune_idle_buckets(now: Optional[float] = None) -> None:
+    """Remove buckets that have fully refilled and carry no state."""
+
+    current = now if now is not None else time.monotonic()
+    for telegram_id, bucket in list(_buckets.items()):
+        bucket.refill(current)
+        if bucket.tokens >= THROTTLE_LIMITS[bucket.tier][0]:
+            _buckets.pop(telegram_id, None)
+
+
+def snapshot_stats(reset: bool = False) -> Dict[str, int]:
+    """Return allowed/rejected counters per tier, optionally resetting them."""
+
+    data = dict(throttle_stats)
+    if reset:
+        throttle_stats.clear()
+    return data
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Reject GPT-backed requests from users who exceed their token bucket.
+
+    Only handlers registered with ``flags={"throttle": True}`` are limited.
+    """
+
+    async def __call__(
+        self,
+        handler: Handler,
+        event: types.TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or not get_flag(data, "throttle"):
+            return await handler(event, data)
+        # albums are rejected by the photo handler without reaching GPT
+        if isinstance(event, types.Message) and event.media_group_id:
+            return await handler(event, data)
+
+        retry_after = acquire(user.id)
+        if not retry_after:
+            return await handler(event, data)
+
+        bucket = _buckets[user.id]
+        log("throttle", "request from %s throttled for %.1fs", user.id, retry_after)
+        if not bucket.notified and isinstance(event, types.Message):
+            bucket.notified = True
+            await event.answer(THROTTLED_TEXT.format(seconds=math.ceil(retry_after)))
+        return None
@@ -1,5 +1,4 @@
 from typing import Dict, Any, Optional
-import asyncio
 import html
 import re
 
@@ -140,12 +139,6 @@ def seconds_until_next_utc_midnight(now: Optional[datetime] = None) -> float:
     return max((midnight - current).total_seconds(), 0.0)
 
 
-async def sleep_until_next_utc_midnight(now: Optional[datetime] = None) -> None:
-    """Sleep asynchronously until the next UTC midnight."""
-
-    await asyncio.sleep(seconds_until_next_utc_midnight(now))
-
-
 _CODE_BLOCK_PATTERN = re.compile(r"(```|''')([\s\S]+?)\1")
 _INLINE_CODE_PATTERN = re.compile(r"(?<!\w)(`|')([^`'\n]+?)\1(?!\w)")
 _BOLD_PATTERN = re.compile(r"\*\*(.+?)\*\*", re.S)
@@ -0,0 +1,46 @@
+"""Screens of the inline navigation rendered with one request.
+
+A screen is a ``View``: its text, keyboard and parse mode. ``show_view`` puts
+it into the message the user tapped with a single ``editMessageText`` that
+carries the keyboard too, instead of editing the text and the keyboard one
+after the other. When the message cannot be edited (a photo, a message too
+old or already deleted) the screen is sent as a new message.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+
+from .edits import is_not_modified
+from .logger import log
+
+
+@dataclass
+class View:
+    text: str
+    reply_markup: Optional[types.InlineKeyboardMarkup] = None
+    parse_mode: Optional[str] = None
+
+    def kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"reply_markup": self.reply_markup}
+        # leave the bot default alone unless the screen needs markup
+        if self.parse_mode:
+            kwargs["parse_mode"] = self.parse_mode
+        return kwargs
+
+
+async def show_view(message: types.Message, view: View) -> types.Message:
+    """Render ``view`` into ``message``; return the message now showing it."""
+
+    try:
+        result = await message.edit_text(view.text, **view.kwargs())
+    except TelegramBadRequest as exc:
+        if is_not_modified(exc):
+            return message
+        log("telegram", "cannot edit message in %s, sending a new one: %s", message.chat.id, exc)
+        return await message.answer(view.text, **view.kwargs())
+    return result if isinstance(result, types.Message) else message
@@ -0,0 +1,284 @@
+"""Shared runtime for the periodic background jobs started in ``main``.
+
+Each job is registered as a ``Watcher`` with a schedule and is called with a
+``TickContext``. The context counts processed items and errors, yields to
+the event loop every ``chunk_size`` items and tells the job when its time
+budget is spent, so that it can stop and continue in the next run.
+
+Jobs read the current time from ``ctx.now`` / ``ctx.timestamp`` rather than
+the system clock, so the runtime can be driven by a virtual clock (see
+``bot.simulation``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, time as dt_time, timedelta
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+)
+
+from .logger import log
+from .messaging import background_sends
+from .settings import WATCHER_CHUNK_SIZE, WATCHER_HISTORY
+
+T = TypeVar("T")
+
+
+class SystemClock:
+    """Wall clock and sleeper used in production."""
+
+    def now(self) -> datetime:
+        return datetime.utcnow()
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+system_clock = SystemClock()
+
+
+class Every:
+    """Run every ``seconds``; with ``align`` at wall-clock multiples of it."""
+
+    def __init__(self, seconds: float, *, align: bool = False) -> None:
+        self.seconds = seconds
+        self.align = align
+
+    def delay(self, now: float) -> float:
+        if self.align:
+            return self.seconds - now % self.seconds
+        return self.seconds
+
+
+class DailyAt:
+    """Run once a day at ``at`` UTC."""
+
+    def __init__(self, at: dt_time) -> None:
+        self.at = at
+
+    def delay(self, now: float) -> float:
+        current = datetime.utcfromtimestamp(now)
+        target = datetime.combine(current.date(), self.at)
+        if target <= current:
+            target += timedelta(days=1)
+        return (target - current).total_seconds()
+
+
+class TickContext:
+    """Bookkeeping handed to a watcher for a single run."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        budget: Optional[float] = None,
+        chunk_size: int = WATCHER_CHUNK_SIZE,
+        state: Optional[Dict[str, Any]] = None,
+        clock: SystemClock = system_clock,
+    ) -> None:
+        self.name = name
+        self.budget = budget
+        self.chunk_size = chunk_size
+        # survives between runs of the same watcher, e.g. a cursor to resume from
+        self.state = state if state is not None else {}
+        self.clock = clock
+        # UTC time the run started at, naive like the rest of the database
+        self.now = clock.now()
+        self.timestamp = clock.time()
+        self.started = clock.monotonic()
+        self.items = 0
+        self.errors = 0
+        self.deferred = False
+        self._since_yield = 0
+
+    @property
+    def elapsed(self) -> float:
+        return self.clock.monotonic() - self.started
+
+    def out_of_time(self) -> bool:
+        return self.budget is not None and self.elapsed >= self.budget
+
+    async def processed(self, count: int = 1) -> None:
+        """Count finished items and yield to the event loop every chunk."""
+
+        self.items += count
+        self._since_yield += count
+        if self._since_yield >= self.chunk_size:
+            self._since_yield = 0
+            await asyncio.sleep(0)
+
+    def failed(self) -> None:
+        self.errors += 1
+
+    def defer(self) -> None:
+        """Ask the runtime to run the watcher again right after this run."""
+
+        self.deferred = True
+
+    async def each(self, items: Iterable[T]) -> AsyncIterator[T]:
+        """Iterate ``items`` until the budget is spent, deferring the rest."""
+
+        for item in items:
+            if self.out_of_time():
+                self.defer()
+                return
+            yield item
+            await self.processed()
+
+
+TickFunc = Callable[[TickContext], Awaitable[Any]]
+
+
+@dataclass
+class TickStats:
+    """Metrics recorded for one run of a watcher."""
+
+    started_at: datetime
+    duration: float
+    items: int
+    errors: int
+    deferred: bool
+
+
+class Watcher:
+    def __init__(
+        self,
+        name: str,
+        func: TickFunc,
+        schedule: Every | DailyAt,
+        *,
+        immediate: bool = True,
+        jitter: float = 0.0,
+        budget: Optional[float] = None,
+        chunk_size: int = WATCHER_CHUNK_SIZE,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.immediate = immediate
+        self.jitter = jitter
+        self.budget = budget
+        self.chunk_size = chunk_size
+        self.state: Dict[str, Any] = {}
+        self.history: Deque[TickStats] = deque(maxlen=WATCHER_HISTORY)
+        self.skipped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def next_delay(self, now: float) -> float:
+        delay = self.schedule.delay(now)
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+
+class WatcherRuntime:
+    """Schedule registered watchers and keep per-run metrics."""
+
+    def __init__(self, clock: SystemClock = system_clock) -> None:
+        self.clock = clock
+        self.watchers: Dict[str, Watcher] = {}
+
+    def register(self, name: str, func: TickFunc, schedule: Every | DailyAt, **options) -> Watcher:
+        watcher = Watcher(name, func, schedule, **options)
+        self.watchers[name] = watcher
+        return watcher
+
+    async def run_once(self, watcher: Watcher) -> List[TickStats]:
+        """Run one tick, then continuation ticks while the watcher defers."""
+
+        runs = [await self._tick(watcher)]
+        while runs[-1].deferred:
+            await self.clock.sleep(0)
+            runs.append(await self._tick(watcher))
+        return runs
+
+    async def _tick(self, watcher: Watcher) -> TickStats:
+        ctx = TickContext(
+            watcher.name,
+            budget=watcher.budget,
+            chunk_size=watcher.chunk_size,
+            state=watcher.state,
+            clock=self.clock,
+        )
+        try:
+            with background_sends():
+                await watcher.func(ctx)
+        except Exception:
+            ctx.failed()
+            ctx.deferred = False
+            logging.exception("watcher %s tick failed", watcher.name)
+        stats = TickStats(ctx.now, ctx.elapsed, ctx.items, ctx.errors, ctx.deferred)
+        watcher.history.append(stats)
+        if stats.items or stats.errors or stats.deferred:
+            log(
+                "watcher",
+                "%s tick: %.2fs, items=%s, errors=%s%s",
+                watcher.name,
+                stats.duration,
+                stats.items,
+                stats.errors,
+                ", continuing" if stats.deferred else "",
+            )
+        return stats
+
+    def trigger(self, watcher: Watcher) -> bool:
+        """Start a run unless the previous one is still in progress."""
+
+        if watcher.running:
+            watcher.skipped += 1
+            log("watcher", "%s still running, tick skipped", watcher.name)
+            return False
+        watcher._task = asyncio.create_task(
+            self.run_once(watcher), name=f"{watcher.name}_tick"
+        )
+        return True
+
+    async def _loop(self, watcher: Watcher) -> None:
+        log("watcher", "%s started", watcher.name)
+        if not watcher.immediate:
+            await self.clock.sleep(watcher.next_delay(self.clock.time()))
+        try:
+            while True:
+                self.trigger(watcher)
+                await self.clock.sleep(watcher.next_delay(self.clock.time()))
+        finally:
+            if watcher.running:
+                watcher._task.cancel()
+
+    def start(
+        self, spawn: Callable[..., asyncio.Task] = asyncio.create_task
+    ) -> List[asyncio.Task]:
+        """Start a scheduling loop per watcher via ``spawn(coro, name=...)``."""
+
+        return [
+            spawn(self._loop(watcher), name=watcher.name)
+            for watcher in self.watchers.values()
+        ]
+
+
+runtime = WatcherRuntime()
@@ -0,0 +1,93 @@
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import database  # noqa: E402
+from bot.database import (  # noqa: E402
+    Base,
+    Meal,
+    Subscription,
+    User,
+    backfill_activity_counters,
+    record_meal_saved,
+)
+
+
+def _session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_record_meal_saved_updates_counters():
+    session = _session()
+    user = User(telegram_id=1)
+    session.add(user)
+    session.commit()
+
+    first = Meal(user_id=user.id, name="a", timestamp=datetime(2025, 1, 2))
+    session.add(first)
+    record_meal_saved(user, first)
+    older = Meal(user_id=user.id, name="b", timestamp=datetime(2025, 1, 1))
+    session.add(older)
+    record_meal_saved(user, older)
+    session.commit()
+
+    assert user.meals_count == 2
+    assert user.last_meal_at == datetime(2025, 1, 2)
+
+
+def test_backfill_activity_counters():
+    session = _session()
+    with_meals = User(telegram_id=1, subscription=Subscription(requests_total=3))
+    requests_only = User(
+        telegram_id=2,
+        subscription=Subscription(requests_total=1, last_request=datetime(2025, 2, 1)),
+    )
+    idle = User(telegram_id=3, subscription=Subscription(requests_total=0))
+    session.add_all([with_meals, requests_only, idle])
+    session.commit()
+    session.add_all(
+        [
+            Meal(user_id=with_meals.id, name="a", timestamp=datetime(2025, 1, 1)),
+            Meal(user_id=with_meals.id, name="b", timestamp=datetime(2025, 1, 5)),
+        ]
+    )
+    session.commit()
+
+    assert backfill_activity_counters(session) == 3
+
+    session.expire_all()
+    assert with_meals.meals_count == 2
+    assert with_meals.last_meal_at == datetime(2025, 1, 5)
+    assert with_meals.first_request_at == datetime(2025, 1, 1)
+    assert requests_only.meals_count == 0
+    assert requests_only.first_request_at == datetime(2025, 2, 1)
+    assert idle.first_request_at is None
+    assert idle.last_meal_at is None
+
+
+def test_old_database_is_migrated_before_the_backfill(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for column in ("meals_count", "last_meal_at", "first_request_at"):
+            conn.execute(text(f"ALTER TABLE users DROP COLUMN {column}"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_subscriptions_last_request"))
+        conn.execute(text("ALTER TABLE subscriptions DROP COLUMN last_request"))
+        conn.execute(text("INSERT INTO users (telegram_id) VALUES (1)"))
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+
+    database._ensure_columns()
+
+    session = database.SessionLocal()
+    assert session.query(User.meals_count).scalar() == 0
+    session.close()
@@ -0,0 +1,133 @@
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram import types
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import middlewares, storage  # noqa: E402
+from bot.database import Base, ReminderSettings, User  # noqa: E402
+from bot.handlers import admin  # noqa: E402
+from bot.reminder_schedule import rebuild_schedule, reminder_schedule  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_blocked():
+    storage.set_blocked_users([])
+    yield
+    storage.set_blocked_users([])
+
+
+def test_load_blocked_users(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add_all(
+        [User(telegram_id=1, blocked=True), User(telegram_id=2, blocked=False)]
+    )
+    session.commit()
+    session.close()
+    monkeypatch.setattr(middlewares, "SessionLocal", Session)
+
+    assert middlewares.load_blocked_users() == 1
+    assert storage.is_blocked(1)
+    assert not storage.is_blocked(2)
+
+
+@pytest.mark.asyncio
+async def test_middleware_passes_unblocked_user():
+    handler = AsyncMock(return_value="ok")
+    event = MagicMock(spec=types.Message)
+    data = {"event_from_user": SimpleNamespace(id=5)}
+
+    result = await middlewares.BlockedUserMiddleware()(handler, event, data)
+
+    assert result == "ok"
+    handler.assert_awaited_once_with(event, data)
+
+
+@pytest.mark.asyncio
+async def test_middleware_answers_blocked_message():
+    storage.mark_blocked(5)
+    handler = AsyncMock()
+    event = MagicMock(spec=types.Message)
+    event.successful_payment = None
+    event.answer = AsyncMock()
+    state = SimpleNamespace(clear=AsyncMock())
+    data = {"event_from_user": SimpleNamespace(id=5), "state": state}
+
+    await middlewares.BlockedUserMiddleware()(handler, event, data)
+
+    handler.assert_not_awaited()
+    state.clear.assert_awaited_once()
+    event.answer.assert_awaited_once()
+    assert "заблокированы" in event.answer.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_middleware_answers_blocked_callback():
+    storage.mark_blocked(5)
+    handler = AsyncMock()
+    event = MagicMock(spec=types.CallbackQuery)
+    event.message = SimpleNamespace(answer=AsyncMock())
+    event.answer = AsyncMock()
+    data = {"event_from_user": SimpleNamespace(id=5)}
+
+    await middlewares.BlockedUserMiddleware()(handler, event, data)
+
+    handler.assert_not_awaited()
+    event.message.answer.assert_awaited_once()
+    event.answer.assert_awaited_once_with()
+
+
+@pytest.mark.asyncio
+async def test_unblocked_user_passes_again():
+    storage.mark_blocked(5)
+    storage.mark_unblocked(5)
+    handler = AsyncMock()
+    event = MagicMock(spec=types.Message)
+    data = {"event_from_user": SimpleNamespace(id=5)}
+
+    await middlewares.BlockedUserMiddleware()(handler, event, data)
+
+    handler.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_admin_unblock_restores_reminder_slots(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    user = User(
+        telegram_id=5,
+        blocked=True,
+        reminders=ReminderSettings(timezone=0, morning_time="08:00", morning_enabled=True),
+    )
+    session.add(user)
+    session.commit()
+    user_id = user.id
+    rebuild_schedule(session)
+    session.close()
+    storage.mark_blocked(5)
+    monkeypatch.setattr(admin, "SessionLocal", Session)
+    monkeypatch.setattr(admin, "admins", {1})
+    monkeypatch.setattr(admin, "admin_blocked_list", AsyncMock())
+    query = SimpleNamespace(
+        from_user=SimpleNamespace(id=1), data="admin:unblock_yes:5", answer=AsyncMock()
+    )
+    assert reminder_schedule.slots_for(user_id) == {}
+
+    await admin.admin_unblock(query)
+
+    assert not storage.is_blocked(5)
+    assert reminder_schedule.slots_for(user_id) == {"morning": 8 * 60}
+    reminder_schedule.clear()
@@ -0,0 +1,285 @@
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import types
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import broadcasts, messaging  # noqa: E402
+from bot.database import Base, Broadcast, ReminderSettings, User  # noqa: E402
+from bot.handlers import admin  # noqa: E402
+from bot.messaging import RateLimiter  # noqa: E402
+from bot.simulation import VirtualClock  # noqa: E402
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(broadcasts, "SessionLocal", factory)
+    session = factory()
+    session.add_all(
+        [
+            User(telegram_id=101),
+            User(telegram_id=102, blocked=True),
+            User(telegram_id=103),
+            User(telegram_id=104, left_bot=True),
+            User(telegram_id=105),
+        ]
+    )
+    session.commit()
+    session.close()
+    return factory
+
+
+@pytest.fixture
+def send_mock(monkeypatch):
+    mock = AsyncMock(side_effect=lambda bot, chat_id, **kwargs: chat_id != 103)
+    monkeypatch.setattr(broadcasts, "send_with_retries", mock)
+    return mock
+
+
+@pytest.fixture
+def transactions(session_factory, monkeypatch):
+    """Sessions the runner opened; call it to list those inside a transaction."""
+
+    sessions = []
+
+    def factory():
+        session = session_factory()
+        sessions.append(session)
+        return session
+
+    monkeypatch.setattr(broadcasts, "SessionLocal", factory)
+    return lambda: [session for session in sessions if session.in_transaction()]
+
+
+def _create(factory, **fields):
+    session = factory()
+    job = broadcasts.create_broadcast(session, 1, "<b>hi</b>")
+    for key, value in fields.items():
+        setattr(job, key, value)
+    session.commit()
+    job_id = job.id
+    session.close()
+    return job_id
+
+
+def _sent(send_mock):
+    return [call.args[1] for call in send_mock.await_args_list]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_skips_inactive_users_and_records_progress(session_factory, send_mock):
+    job_id = _create(session_factory, status_message_id=7)
+    bot = AsyncMock()
+
+    job = await broadcasts.run_broadcast(bot, job_id, limiter=RateLimiter(1000), chunk_size=2)
+
+    assert sorted(_sent(send_mock)) == [101, 103, 105]
+    assert send_mock.await_args.kwargs["parse_mode"] == "HTML"
+    assert (job.status, job.total, job.delivered, job.failed) == ("done", 3, 2, 1)
+    assert job.cursor == 5
+    assert job.finished_at is not None
+    final = bot.edit_message_text.await_args
+    assert final.args[0].startswith("Рассылка завершена")
+    assert final.kwargs["reply_markup"] is None
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resumes_from_cursor(session_factory, send_mock):
+    job_id = _create(session_factory, cursor=1, delivered=1)
+
+    job = await broadcasts.run_broadcast(AsyncMock(), job_id, limiter=RateLimiter(1000))
+
+    assert sorted(_sent(send_mock)) == [103, 105]
+    assert (job.delivered, job.failed) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_after_current_chunk(session_factory, send_mock, monkeypatch):
+    job_id = _create(session_factory)
+    monkeypatch.setitem(broadcasts._tasks, job_id, None)
+
+    async def _send(bot, chat_id, **kwargs):
+        broadcasts.cancel_broadcast(job_id)
+        return True
+
+    send_mock.side_effect = _send
+
+    job = await broadcasts.run_broadcast(
+        AsyncMock(), job_id, limiter=RateLimiter(1000), chunk_size=1
+    )
+
+    assert _sent(send_mock) == [101]
+    assert (job.status, job.cursor, job.delivered) == ("cancelled", 1, 1)
+    session = session_factory()
+    assert session.get(Broadcast, job_id).status == "cancelled"
+    session.close()
+
+
+@pytest.mark.asyncio
+async def test_cancel_without_task_marks_job(session_factory):
+    job_id = _create(session_factory)
+
+    assert broadcasts.cancel_broadcast(job_id) is True
+    assert broadcasts.cancel_broadcast(job_id) is False
+    job = await broadcasts.run_broadcast(AsyncMock(), job_id)
+    assert job.status == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_sends_globally_and_per_chat(monkeypatch):
+    waits = []
+
+    async def _sleep(seconds):
+        waits.append(round(seconds, 3))
+
+    monkeypatch.setattr(messaging.asyncio, "sleep", _sleep)
+    limiter = RateLimiter(10, chat_interval=1.0, clock=lambda: 100.0)
+
+    await limiter.wait(1)
+    await limiter.wait(2)
+    await limiter.wait(1)
+
+    assert waits == [0.1, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_media_broadcast_reuses_file_ids(session_factory, send_mock):
+    session = session_factory()
+    photo = broadcasts.create_broadcast(
+        session, 1, "<b>hi</b>", media=[{"type": "photo", "file_id": "PHOTO"}]
+    ).id
+    album = broadcasts.create_broadcast(
+        session,
+        1,
+        "caption",
+        media=[{"type": "photo", "file_id": "A"}, {"type": "video", "file_id": "B"}],
+    ).id
+    session.close()
+    bot = AsyncMock()
+
+    await broadcasts.run_broadcast(bot, photo, limiter=RateLimiter(1000))
+    job = await broadcasts.run_broadcast(bot, album, limiter=RateLimiter(1000))
+
+    assert send_mock.await_count == 0
+    assert sorted(call.args[0] for call in bot.send_photo.await_args_list) == [101, 103, 105]
+    assert {call.args[1] for call in bot.send_photo.await_args_list} == {"PHOTO"}
+    assert bot.send_photo.await_args.kwargs["caption"] == "<b>hi</b>"
+    assert bot.send_media_group.await_count == 3
+    items = bot.send_media_group.await_args.args[1]
+    assert [(item.type, item.media, item.caption) for item in items] == [
+        ("photo", "A", "caption"),
+        ("video", "B", None),
+    ]
+    assert (job.status, job.delivered) == ("done", 3)
+
+
+@pytest.mark.asyncio
+async def test_local_time_broadcast_releases_each_timezone_bucket(session_factory, send_mock):
+    start = datetime(2025, 3, 1, 12, 0)
+    session = session_factory()
+    # 101 has no timezone and gets the Moscow default
+    for telegram_id, timezone in ((103, 0), (105, -300)):
+        user = session.query(User).filter_by(telegram_id=telegram_id).one()
+        user.reminders = ReminderSettings(timezone=timezone)
+    session.commit()
+    session.close()
+    clock = VirtualClock(start)
+    sent_at = {}
+
+    async def _send(bot, chat_id, **kwargs):
+        sent_at[chat_id] = clock.now()
+        return True
+
+    send_mock.side_effect = _send
+    job_id = _create(session_factory, local_time="10:00", created_at=start)
+
+    job = await broadcasts.run_broadcast(
+        AsyncMock(), job_id, limiter=RateLimiter(1000), clock=clock
+    )
+
+    assert sent_at == {
+        105: datetime(2025, 3, 1, 15, 0),
+        101: datetime(2025, 3, 2, 7, 0),
+        103: datetime(2025, 3, 2, 10, 0),
+    }
+    assert (job.status, job.delivered, job.cursor_offset) == ("done", 3, 0)
+
+    # a resumed job skips the buckets released before its current one
+    sent_at.clear()
+    job_id = _create(
+        session_factory, local_time="10:00", created_at=start, cursor_offset=180
+    )
+    await broadcasts.run_broadcast(
+        AsyncMock(), job_id, limiter=RateLimiter(1000), clock=VirtualClock(start)
+    )
+    assert sorted(sent_at) == [101, 103]
+
+
+@pytest.mark.asyncio
+async def test_release_wait_holds_no_transaction(
+    session_factory, send_mock, transactions, monkeypatch
+):
+    start = datetime(2025, 3, 1, 12, 0)
+    wait = broadcasts._wait_for_release
+    open_while_waiting = []
+
+    async def _wait(broadcast_id, release, clock):
+        open_while_waiting.append(len(transactions()))
+        return await wait(broadcast_id, release, clock)
+
+    monkeypatch.setattr(broadcasts, "_wait_for_release", _wait)
+    job_id = _create(session_factory, local_time="10:00", created_at=start)
+
+    job = await broadcasts.run_broadcast(
+        AsyncMock(), job_id, limiter=RateLimiter(1000), clock=VirtualClock(start)
+    )
+
+    assert job.status == "done"
+    assert open_while_waiting and set(open_while_waiting) == {0}
+
+
+@pytest.mark.asyncio
+async def test_chunk_is_sent_with_no_transaction_open(session_factory, send_mock, transactions):
+    open_while_sending = []
+
+    async def _send(bot, chat_id, **kwargs):
+        open_while_sending.append(len(transactions()))
+        return True
+
+    send_mock.side_effect = _send
+    job_id = _create(session_factory)
+
+    job = await broadcasts.run_broadcast(
+        AsyncMock(), job_id, limiter=RateLimiter(1000), chunk_size=2
+    )
+
+    assert job.delivered == 3
+    assert open_while_sending == [0, 0, 0]
+
+
+def test_caption_is_rendered_like_text():
+    chat = types.Chat(id=1, type="private")
+    text = types.Message(message_id=1, date=datetime(2025, 1, 1), chat=chat, text="**hi**")
+    photo = types.Message(
+        message_id=2,
+        date=datetime(2025, 1, 1),
+        chat=chat,
+        photo=[types.PhotoSize(file_id="P", file_unique_id="p", width=1, height=1)],
+        caption="**hi**",
+    )
+
+    rendered = admin._render_broadcast_text(text)
+
+    assert rendered != "**hi**"
+    assert admin._render_broadcast_text(photo) == rendered
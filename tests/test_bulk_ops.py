@@ -0,0 +1,125 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import bulk_ops  # noqa: E402
+from bot.database import Base, NotificationStatus, Subscription, User  # noqa: E402
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+def _session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def _user(session, telegram_id, **subscription):
+    user = User(
+        telegram_id=telegram_id,
+        subscription=Subscription(**subscription),
+        notification=NotificationStatus(notified_7d=True, notified_1d=True),
+    )
+    session.add(user)
+    return user
+
+
+@pytest.mark.asyncio
+async def test_bulk_add_subscription_days():
+    session = _session()
+    active = _user(session, 1, grade="light", period_end=NOW + timedelta(days=5))
+    expired = _user(session, 2, grade="pro", period_end=NOW - timedelta(days=5))
+    trial = _user(session, 3, grade="pro", trial=True, period_end=NOW)
+    free = _user(session, 4, grade="free")
+    session.commit()
+
+    assert bulk_ops.count_days_targets(session) == 2
+    progress = []
+
+    async def _progress(done, total):
+        progress.append((done, total))
+
+    result = await bulk_ops.bulk_add_subscription_days(
+        session, 10, now=NOW, chunk_size=1, progress=_progress
+    )
+
+    session.expire_all()
+    assert (result.total, result.updated, result.failed) == (2, 2, [])
+    assert progress == [(1, 2), (2, 2)]
+    assert active.period_end == NOW + timedelta(days=15)
+    assert expired.period_end == NOW + timedelta(days=10)
+    assert trial.period_end == NOW
+    assert free.period_end is None
+    assert active.notified_7d is True
+
+
+@pytest.mark.asyncio
+async def test_bulk_start_trial_keeps_paid_time():
+    session = _session()
+    paid = _user(session, 1, grade="light", period_end=NOW + timedelta(days=5))
+    free = _user(session, 2, grade="free", requests_used=7)
+    session.commit()
+
+    result = await bulk_ops.bulk_start_trial(session, 3, "pro", now=NOW)
+
+    session.expire_all()
+    assert result.updated == 2
+    assert paid.grade == "pro_promo"
+    assert paid.resume_grade == "light"
+    assert paid.resume_period_end == NOW + timedelta(days=8)
+    assert free.trial is True
+    assert free.trial_end == NOW + timedelta(days=3)
+    assert free.requests_used == 0
+    assert free.resume_grade is None
+    assert free.notified_7d is False
+
+
+@pytest.mark.asyncio
+async def test_bulk_set_grade_ends_trial():
+    session = _session()
+    user = _user(session, 1, grade="pro_promo", trial=True, trial_end=NOW, resume_grade="light")
+    other = _user(session, 2, grade="free")
+    session.commit()
+
+    result = await bulk_ops.bulk_set_grade(session, [user.id], "pro", 30, now=NOW)
+
+    session.expire_all()
+    assert result.updated == 1
+    assert user.grade == "pro"
+    assert user.trial is False
+    assert user.resume_grade is None
+    assert user.period_end == NOW + timedelta(days=30)
+    assert other.grade == "free"
+
+
+@pytest.mark.asyncio
+async def test_failed_rows_are_isolated(monkeypatch):
+    session = _session()
+    _user(session, 1, grade="light")
+    bad = _user(session, 2, grade="light")
+    _user(session, 3, grade="light")
+    session.commit()
+    bad_id = bad.id
+    apply_chunk = bulk_ops._apply_chunk
+
+    def _failing_apply(session, rows, *args):
+        if any(row[0] == bad_id for row in rows):
+            raise IntegrityError("update", {}, Exception("constraint"))
+        return apply_chunk(session, rows, *args)
+
+    monkeypatch.setattr(bulk_ops, "_apply_chunk", _failing_apply)
+
+    result = await bulk_ops.bulk_add_subscription_days(session, 1, now=NOW)
+
+    assert result.updated == 2
+    assert result.failed == [2]
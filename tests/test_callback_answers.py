@@ -0,0 +1,106 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import Bot, types
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import callback_answers  # noqa: E402
+from bot.callback_answers import EarlyAnswerMiddleware, SkipRepeatedAnswers  # noqa: E402
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    monkeypatch.setattr(callback_answers, "_in_flight", {})
+    bot = Bot("123456:ABCdefGHIjklMNOpqrSTUvwxYZ012345678")
+    skipper = SkipRepeatedAnswers()
+    bot.session.middleware(skipper)
+    requests = AsyncMock(return_value=True)
+    monkeypatch.setattr(bot.session, "make_request", requests)
+    query = types.CallbackQuery(
+        id="q1",
+        from_user=types.User(id=1, is_bot=False, first_name="Ann"),
+        chat_instance="c",
+        data="stats:week",
+    ).as_(bot)
+    return query, skipper, requests
+
+
+def _answers(requests):
+    return [
+        (call.args[1].text, call.args[1].show_alert) for call in requests.await_args_list
+    ]
+
+
+async def _settle():
+    await asyncio.gather(*callback_answers._answering)
+    await asyncio.sleep(0)
+
+
+def _data(alert=False):
+    return {"handler": SimpleNamespace(flags={"alert": True} if alert else {})}
+
+
+@pytest.mark.asyncio
+async def test_query_is_answered_before_the_handler_finishes(setup):
+    query, skipper, requests = setup
+    answered_during_work = []
+
+    async def handler(event, data):
+        await asyncio.sleep(0)
+        answered_during_work.append(requests.await_count)
+        await event.answer()
+        return "done"
+
+    assert await EarlyAnswerMiddleware()(handler, query, _data()) == "done"
+    await _settle()
+
+    assert answered_during_work == [1]
+    assert _answers(requests) == [(None, None)]
+    assert skipper.skipped == 1
+    assert callback_answers._in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_handler_answering_at_once_still_sends_one_answer(setup):
+    query, skipper, requests = setup
+
+    async def handler(event, data):
+        await event.answer()
+
+    await EarlyAnswerMiddleware()(handler, query, _data())
+    await _settle()
+
+    assert _answers(requests) == [(None, None)]
+    assert skipper.skipped == 1
+    assert callback_answers._in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_alert_handler_answers_itself_however_slow(setup):
+    query, skipper, requests = setup
+
+    async def handler(event, data):
+        await asyncio.sleep(0.05)
+        await event.answer("expired", show_alert=True)
+
+    await EarlyAnswerMiddleware()(handler, query, _data(alert=True))
+
+    assert _answers(requests) == [("expired", True)]
+    assert skipper.skipped == 0
+
+
+@pytest.mark.asyncio
+async def test_alert_handler_returning_without_answer_is_answered(setup):
+    query, skipper, requests = setup
+
+    await EarlyAnswerMiddleware()(AsyncMock(), query, _data(alert=True))
+
+    assert _answers(requests) == [(None, None)]
+    assert callback_answers._in_flight == {}
@@ -77,3 +77,17 @@ def test_document_prompt_cooldown_and_reset(monkeypatch):
 
     monkeypatch.setattr(storage.time, "time", lambda: 1011.0)
     assert storage.should_send_document_prompt(123, cooldown=10) is True
+
+
+def test_run_cleanup_cycle_skips_replaced_and_removed_meals(tmp_path):
+    now = 3_000_000.0
+    old = now - STALE_PENDING_SECONDS - 1
+    storage.pending_meals["removed"] = {"timestamp": old}
+    storage.pending_meals["replaced"] = {"timestamp": old}
+    storage.pending_meals.pop("removed")
+    storage.pending_meals["replaced"] = {"timestamp": now - 10}
+
+    run_cleanup_cycle(now=now, temp_dir=str(tmp_path))
+
+    assert list(storage.pending_meals) == ["replaced"]
+    assert storage.pending_meals.pop_expired(now - STALE_PENDING_SECONDS) == []
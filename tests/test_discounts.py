@@ -227,3 +227,137 @@ def test_determine_discount_type_skips_recent_payments(decision_time):
     assert (
         determine_discount_type(session, user, decision_time) is None
     ), "Users with active paid time remaining must not receive discounts"
+
+
+def _campaign_session():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from bot.database import Base
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def _campaign_user(session, telegram_id, decision_time, **subscription):
+    user = User(
+        telegram_id=telegram_id,
+        created_at=decision_time - timedelta(days=10),
+        blocked=False,
+        left_bot=False,
+    )
+    subscription.setdefault("trial", False)
+    user.subscription = Subscription(grade="free", **subscription)
+    session.add(user)
+    return user
+
+
+def test_plan_discount_campaign_matches_per_user_rules(decision_time):
+    from bot.database import backfill_paid_until
+    from bot.discounts import plan_discount_campaign
+
+    session = _campaign_session()
+    new_user = _campaign_user(session, 1, decision_time)
+    lapsed = _campaign_user(session, 2, decision_time)
+    recent = _campaign_user(session, 3, decision_time)
+    trial = _campaign_user(
+        session, 4, decision_time, trial=True, trial_end=decision_time + timedelta(days=1)
+    )
+    young = _campaign_user(session, 5, decision_time)
+    young.created_at = decision_time - timedelta(days=1)
+    blocked = _campaign_user(session, 6, decision_time)
+    blocked.blocked = True
+    cooled = _campaign_user(session, 7, decision_time)
+    cooled.engagement = EngagementStatus(
+        discount_sent=True, discount_last_sent=decision_time - timedelta(days=5)
+    )
+    legacy_cooled = _campaign_user(session, 8, decision_time)
+    legacy_cooled.engagement = EngagementStatus(
+        discount_sent=True, discount_expires=decision_time - timedelta(days=20)
+    )
+    expired_cooldown = _campaign_user(session, 9, decision_time)
+    expired_cooldown.engagement = EngagementStatus(
+        discount_sent=True, discount_last_sent=decision_time - timedelta(days=40)
+    )
+    undated = _campaign_user(session, 10, decision_time)
+    undated.engagement = EngagementStatus(discount_sent=True)
+    session.commit()
+    session.add_all(
+        [
+            Payment(user_id=lapsed.id, months=1, timestamp=decision_time - timedelta(days=70)),
+            Payment(user_id=recent.id, months=1, timestamp=decision_time - timedelta(days=10)),
+        ]
+    )
+    session.commit()
+    backfill_paid_until(session)
+
+    recipients = plan_discount_campaign(session, decision_time)
+
+    planned = {r.telegram_id: r.discount_type for r in recipients}
+    assert planned == {1: "new", 2: "return", 9: "new", 10: "new"}
+    for user in (
+        new_user,
+        lapsed,
+        recent,
+        trial,
+        young,
+        blocked,
+        cooled,
+        legacy_cooled,
+        expired_cooldown,
+        undated,
+    ):
+        expected = determine_discount_type(session, user, decision_time)
+        assert planned.get(user.telegram_id) == expected
+
+
+@pytest.mark.asyncio
+async def test_discount_campaign_is_recorded_on_delivery(monkeypatch, decision_time):
+    from unittest.mock import AsyncMock
+
+    from sqlalchemy.orm import sessionmaker
+
+    from bot import discounts, outbox
+    from bot.messaging import RateLimiter
+    from bot.simulation import VirtualClock
+    from bot.watchers import TickContext
+
+    session = _campaign_session()
+    first = _campaign_user(session, 1, decision_time)
+    second = _campaign_user(session, 2, decision_time)
+    second.engagement = EngagementStatus()
+    _campaign_user(session, 3, decision_time)
+    session.commit()
+    monkeypatch.setattr(outbox, "SessionLocal", sessionmaker(bind=session.get_bind()))
+    send = AsyncMock(side_effect=lambda bot, chat_id, **kwargs: chat_id != 3)
+    monkeypatch.setattr(outbox, "send_with_retries", send)
+
+    recipients = discounts.plan_discount_campaign(session, decision_time)
+    expires = decision_time + timedelta(days=1)
+    queued = discounts.queue_discount_campaign(
+        session,
+        recipients,
+        texts={"new": "new", "return": "return"},
+        expires=expires,
+        now=decision_time,
+    )
+    # queuing twice does not duplicate pending offers
+    replanned = discounts.plan_discount_campaign(session, decision_time)
+    again = discounts.queue_discount_campaign(
+        session, replanned, texts={"new": "new"}, expires=expires, now=decision_time
+    )
+
+    assert queued == {"new": 3, "return": 0}
+    assert again == {"new": 0}
+    assert [r.telegram_id for r in replanned] == [1, 2, 3]
+
+    ctx = TickContext("outbox", clock=VirtualClock(decision_time))
+    await outbox.dispatch_outbox(None, ctx, limiter=RateLimiter(1000))
+
+    assert sorted(call.args[1] for call in send.await_args_list) == [1, 2, 3]
+    session.expire_all()
+    assert first.engagement.discount_sent is True
+    assert first.engagement.discount_expires == expires
+    assert second.engagement.discount_sent is True
+    assert [r.telegram_id for r in discounts.plan_discount_campaign(session, decision_time)] == [3]
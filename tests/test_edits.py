@@ -0,0 +1,116 @@
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    DeleteMessage,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendMessage,
+)
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.edits import RenderCache, SkipUnchangedEdits, apply_edit  # noqa: E402
+from bot.messaging import background_sends  # noqa: E402
+
+
+def _kb(data):
+    builder = InlineKeyboardBuilder()
+    builder.button(text="go", callback_data=data)
+    return builder.as_markup()
+
+
+def _edit(text, markup=None):
+    return EditMessageText(chat_id=1, message_id=10, text=text, reply_markup=markup)
+
+
+async def _call(middleware, method, make_request=None):
+    make_request = make_request or AsyncMock(return_value=True)
+    return await apply_edit(middleware(make_request, None, method)), make_request
+
+
+def test_render_cache_evicts_by_age_and_size():
+    now = [0.0]
+    cache = RenderCache(max_size=2, max_age=60, clock=lambda: now[0])
+    cache.put("a", (1, 1))
+    cache.put("b", (2, 2))
+    now[0] = 30
+    cache.put("c", (3, 3))
+    assert (cache.get("a"), len(cache)) == (None, 2)
+    now[0] = 70
+    assert (cache.get("b"), cache.get("c")) == (None, (3, 3))
+
+
+@pytest.mark.asyncio
+async def test_repeated_edit_is_answered_without_a_request():
+    middleware = SkipUnchangedEdits(RenderCache())
+
+    changed, request = await _call(middleware, _edit("menu", _kb("a")))
+    assert changed and request.await_count == 1
+    changed, request = await _call(middleware, _edit("menu", _kb("a")))
+    assert not changed and request.await_count == 0
+    # a different keyboard or dropping it is a change
+    assert (await _call(middleware, _edit("menu", _kb("b"))))[0]
+    assert (await _call(middleware, _edit("menu")))[0]
+    assert middleware.skipped == 1
+
+
+@pytest.mark.asyncio
+async def test_keyboard_edits_compare_the_keyboard_only():
+    middleware = SkipUnchangedEdits(RenderCache())
+    await _call(middleware, _edit("menu", _kb("a")))
+
+    same = EditMessageReplyMarkup(chat_id=1, message_id=10, reply_markup=_kb("a"))
+    other = EditMessageReplyMarkup(chat_id=1, message_id=10, reply_markup=_kb("b"))
+    assert (await _call(middleware, same))[1].await_count == 0
+    assert (await _call(middleware, other))[1].await_count == 1
+    # the text is still known after a keyboard edit
+    assert (await _call(middleware, _edit("menu", _kb("b"))))[1].await_count == 0
+
+
+@pytest.mark.asyncio
+async def test_sent_messages_are_remembered_and_deletes_forgotten():
+    middleware = SkipUnchangedEdits(RenderCache())
+    sent = types.Message(
+        message_id=10,
+        date=datetime(2025, 3, 1),
+        chat=types.Chat(id=1, type="private"),
+        text="menu",
+    )
+    await middleware(AsyncMock(return_value=sent), None, SendMessage(chat_id=1, text="menu"))
+    assert (await _call(middleware, _edit("menu")))[1].await_count == 0
+
+    await middleware(AsyncMock(return_value=True), None, DeleteMessage(chat_id=1, message_id=10))
+    assert (await _call(middleware, _edit("menu")))[1].await_count == 1
+
+    with background_sends():
+        await middleware(
+            AsyncMock(return_value=sent.model_copy(update={"message_id": 11})),
+            None,
+            SendMessage(chat_id=1, text="bulk"),
+        )
+    assert middleware.cache.get((1, 11)) is None
+
+
+@pytest.mark.asyncio
+async def test_not_modified_from_telegram_is_remembered():
+    middleware = SkipUnchangedEdits(RenderCache())
+    method = _edit("menu")
+    error = TelegramBadRequest(method, "Bad Request: message is not modified")
+
+    changed, request = await _call(middleware, method, AsyncMock(side_effect=error))
+    assert not changed and request.await_count == 1
+    assert (await _call(middleware, _edit("menu")))[1].await_count == 0
+
+    other = TelegramBadRequest(method, "Bad Request: message to edit not found")
+    with pytest.raises(TelegramBadRequest):
+        await _call(middleware, _edit("new"), AsyncMock(side_effect=other))
+    assert middleware.cache.get((1, 10)) is None
@@ -0,0 +1,183 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import engagement, outbox  # noqa: E402
+from bot.database import Base, EngagementStatus, Outbox, Subscription, User  # noqa: E402
+from bot.messaging import RateLimiter  # noqa: E402
+from bot.simulation import VirtualClock  # noqa: E402
+from bot.watchers import TickContext  # noqa: E402
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(engagement, "SessionLocal", factory)
+    monkeypatch.setattr(outbox, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def send_mock(monkeypatch):
+    mock = AsyncMock(return_value=True)
+    monkeypatch.setattr(outbox, "send_with_retries", mock)
+    return mock
+
+
+async def _tick(now):
+    await engagement.run_engagement_tick(now)
+    ctx = TickContext("outbox", clock=VirtualClock(now))
+    await outbox.dispatch_outbox(None, ctx, limiter=RateLimiter(1000))
+
+
+def _add_user(factory, telegram_id, *, created_at=NOW, engagement_row=True, **subscription):
+    session = factory()
+    subscription.setdefault("requests_total", 0)
+    user = User(
+        telegram_id=telegram_id,
+        created_at=created_at,
+        subscription=Subscription(**subscription),
+        engagement=EngagementStatus() if engagement_row else None,
+    )
+    session.add(user)
+    session.commit()
+    user_id = user.id
+    session.close()
+    return user_id
+
+
+def _events(factory):
+    session = factory()
+    rows = session.query(Outbox.chat_id, Outbox.event).filter(Outbox.status == outbox.SENT)
+    events = sorted(tuple(row) for row in rows)
+    session.close()
+    return events
+
+
+def _status(factory, user_id):
+    session = factory()
+    status = session.get(EngagementStatus, user_id)
+    session.close()
+    return status
+
+
+@pytest.mark.asyncio
+async def test_welcome_reminders_follow_account_age(session_factory, send_mock):
+    fresh = _add_user(session_factory, 1, created_at=NOW - timedelta(minutes=5))
+    day_old = _add_user(session_factory, 2, created_at=NOW - timedelta(hours=25))
+    legacy = _add_user(
+        session_factory, 3, created_at=NOW - timedelta(minutes=20), engagement_row=False
+    )
+    _add_user(session_factory, 4, created_at=NOW - timedelta(hours=25), requests_total=1)
+
+    await _tick(NOW)
+
+    assert _events(session_factory) == [
+        (2, "welcome reminder 15m"),
+        (2, "welcome reminder 24h"),
+        (3, "welcome reminder 15m"),
+    ]
+    assert _status(session_factory, fresh).no_request_15m is False
+    assert _status(session_factory, day_old).no_request_24h is True
+    assert _status(session_factory, legacy).no_request_15m is True
+
+    send_mock.reset_mock()
+    await _tick(NOW)
+    send_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_keeps_flag_unset(session_factory, send_mock):
+    user_id = _add_user(session_factory, 1, created_at=NOW - timedelta(minutes=20))
+    send_mock.return_value = False
+
+    await _tick(NOW)
+
+    send_mock.assert_awaited_once()
+    assert _status(session_factory, user_id).no_request_15m is False
+
+    # the retry is backed off, the rule does not queue a second copy
+    send_mock.reset_mock()
+    await _tick(NOW + timedelta(seconds=1))
+    send_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_inactivity_sends_only_longest_stage(session_factory, send_mock):
+    long_gone = _add_user(
+        session_factory, 1, requests_total=5, last_request=NOW - timedelta(days=31)
+    )
+    _add_user(session_factory, 2, requests_total=5, last_request=NOW - timedelta(days=8))
+    _add_user(session_factory, 3, requests_total=5, last_request=NOW - timedelta(days=2))
+    session = session_factory()
+    session.get(EngagementStatus, long_gone).inactivity_30d_sent = True
+    session.commit()
+    session.close()
+
+    await _tick(NOW)
+
+    assert _events(session_factory) == [(1, "inactive 14d"), (2, "inactive 7d")]
+
+
+@pytest.mark.asyncio
+async def test_free_limit_reminder_after_three_days(session_factory, send_mock):
+    at_limit = _add_user(
+        session_factory,
+        1,
+        requests_total=20,
+        grade="free",
+        request_limit=20,
+        requests_used=20,
+        last_request=NOW,
+    )
+    recovered = _add_user(
+        session_factory,
+        2,
+        requests_total=20,
+        grade="free",
+        request_limit=20,
+        requests_used=3,
+        last_request=NOW,
+    )
+    session = session_factory()
+    session.get(EngagementStatus, recovered).limit_reached_at = NOW - timedelta(days=5)
+    session.commit()
+    session.close()
+
+    await _tick(NOW)
+    send_mock.assert_not_awaited()
+    assert _status(session_factory, at_limit).limit_reached_at == NOW
+    assert _status(session_factory, recovered).limit_reached_at is None
+
+    await _tick(NOW + timedelta(days=3))
+
+    assert _events(session_factory) == [(1, "free limit reminder")]
+    assert send_mock.await_args.kwargs["reply_markup"].inline_keyboard
+    assert _status(session_factory, at_limit).limit_reminder_sent is True
+
+
+@pytest.mark.asyncio
+async def test_blocked_users_are_skipped(session_factory, send_mock):
+    user_id = _add_user(session_factory, 1, created_at=NOW - timedelta(days=11))
+    session = session_factory()
+    session.get(User, user_id).blocked = True
+    session.commit()
+    session.close()
+
+    await _tick(NOW)
+
+    send_mock.assert_not_awaited()
@@ -10,7 +10,8 @@ os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from bot.database import Base, engine, SessionLocal, User, Goal, Meal  # noqa: E402
-from bot.reminders import _goal_meal_window  # noqa: E402
+from bot.reminders import _goal_meal_window, meal_window_totals  # noqa: E402
+from bot import reminders  # noqa: E402
 
 
 Base.metadata.create_all(bind=engine)
@@ -148,3 +149,34 @@ def test_evening_window_limits_to_last_24_hours(session):
     )
 
     assert [m.name for m in results] == ["Актуальный ужин"]
+
+
+def test_meal_window_totals_groups_windows(session, monkeypatch):
+    first = _create_user(session, telegram_id=505)
+    second = _create_user(session, telegram_id=606)
+    idle = _create_user(session, telegram_id=707)
+    session.add_all(
+        [
+            Meal(user_id=first.id, name="Каша", calories=300, protein=10, timestamp=datetime(2024, 5, 4, 9, 0)),
+            Meal(user_id=first.id, name="", calories=200, protein=5, timestamp=datetime(2024, 5, 4, 13, 0)),
+            Meal(user_id=first.id, name="Старое", calories=999, timestamp=datetime(2024, 5, 3, 9, 0)),
+            Meal(user_id=second.id, name="Суп", calories=150, fat=4.5, timestamp=datetime(2024, 5, 4, 14, 0)),
+        ]
+    )
+    session.commit()
+    day = (datetime(2024, 5, 4), datetime(2024, 5, 5))
+    windows = {
+        (first.id, "evening"): day,
+        (second.id, "morning"): day,
+        (second.id, "evening"): (datetime(2024, 5, 4, 15, 0), datetime(2024, 5, 5)),
+        (idle.id, "evening"): day,
+    }
+    # a UNION ALL chunk of three plus a single-select chunk
+    monkeypatch.setattr(reminders, "_WINDOW_CHUNK", 3)
+
+    totals = meal_window_totals(session, windows)
+
+    assert totals[(first.id, "evening")] == (500.0, 15.0, 0.0, 0.0, ["Каша"])
+    assert totals[(second.id, "morning")] == (150.0, 0.0, 4.5, 0.0, ["Суп"])
+    assert (second.id, "evening") not in totals
+    assert (idle.id, "evening") not in totals
@@ -4,17 +4,32 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
-import asyncio
 
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 
 
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from bot.handlers import goals  # noqa: E402
-from bot.database import Goal  # noqa: E402
-from bot import reminders  # noqa: E402
+from bot.database import (  # noqa: E402
+    Base,
+    Goal,
+    Meal,
+    ReminderSettings,
+    Subscription,
+    User,
+)
+from bot import outbox, reminders  # noqa: E402
+from bot.messaging import RateLimiter  # noqa: E402
+from bot.prompts import GOAL_DEVIATION_LABELS  # noqa: E402
+from bot.reminder_prefetch import goal_text_queue  # noqa: E402
+from bot.reminder_schedule import reminder_schedule  # noqa: E402
+from bot.settings import REMINDER_SCHEDULE_REBUILD_INTERVAL  # noqa: E402
+from bot.simulation import VirtualClock  # noqa: E402
+from bot.watchers import TickContext  # noqa: E402
 from bot.texts import (  # noqa: E402
     GOAL_REMINDERS_DISABLED,
     GOAL_INTRO_TEXT,
@@ -474,421 +489,454 @@ async def test_goal_process_morning_time(monkeypatch):
     state.clear.assert_awaited_once()
 
 
+def _watcher_db(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(reminders, "SessionLocal", session_factory)
+    monkeypatch.setattr(outbox, "SessionLocal", session_factory)
+    reminder_schedule.clear()
+    goal_text_queue.clear()
+    reminders.advice_cache.clear()
+    monkeypatch.setattr(reminders, "_advice_grades", lambda: {"pro"})
+    return session_factory
+
+
+def _bot():
+    bot = MagicMock()
+    bot.send_message = AsyncMock()
+    return bot
+
+
+async def _tick(bot, now, since=None):
+    """Run the reminder tick and deliver what it queued."""
+
+    await reminders.run_reminder_tick(now, since=since)
+    ctx = TickContext("outbox", clock=VirtualClock(now))
+    await outbox.dispatch_outbox(bot, ctx, limiter=RateLimiter(1000))
+
+
+@pytest.mark.asyncio
+async def test_schedule_rebuild_follows_the_tick_clock(monkeypatch):
+    _watcher_db(monkeypatch)
+    rebuilt_at = []
+    rebuild = reminders.rebuild_schedule
+
+    def recording_rebuild(session, clock):
+        rebuilt_at.append(clock.monotonic())
+        return rebuild(session, clock)
+
+    monkeypatch.setattr(reminders, "rebuild_schedule", recording_rebuild)
+    now = datetime(2025, 1, 1, 8, 0)
+    clock = VirtualClock(now)
+
+    for step in (0, REMINDER_SCHEDULE_REBUILD_INTERVAL - 60, 60):
+        clock.advance(step)
+        await reminders.run_reminder_tick(
+            clock.now(), ctx=TickContext("reminder_watcher", clock=clock)
+        )
+
+    assert rebuilt_at == [0.0, REMINDER_SCHEDULE_REBUILD_INTERVAL]
+    reminder_schedule.clear()
+
+
+def _watcher_user(
+    session_factory,
+    *,
+    telegram_id=123,
+    grade="free",
+    goal=None,
+    last_meal_at=None,
+    **settings,
+):
+    session = session_factory()
+    settings.setdefault("timezone", 0)
+    user = User(
+        telegram_id=telegram_id,
+        blocked=False,
+        left_bot=False,
+        last_meal_at=last_meal_at,
+        subscription=Subscription(grade=grade),
+        reminders=ReminderSettings(**settings),
+        goal=goal,
+    )
+    session.add(user)
+    session.commit()
+    session.close()
+    return user
+
+
+def _stored_user(session_factory, user_id):
+    session = session_factory()
+    user = session.get(User, user_id)
+    # touch lazy relationships while the session is open
+    user.goal, user.reminders, user.subscription
+    session.close()
+    return user
+
+
 @pytest.mark.asyncio
 async def test_goal_trial_expiry_disables_feature(monkeypatch):
-    user = MagicMock()
+    session_factory = _watcher_db(monkeypatch)
     goal = Goal(
         target="loss",
         calories=1800,
-        protein=120,
-        fat=50,
-        carbs=200,
         reminder_morning=True,
         reminder_evening=True,
+        reactivated_at=datetime(2025, 1, 4),
     )
-    user.goal = goal
-    user.id = 1
-    user.telegram_id = 123
-    user.timezone = 0
-    user.morning_time = "08:00"
-    user.evening_time = "20:00"
-    user.morning_enabled = False
-    user.day_enabled = False
-    user.evening_enabled = False
-    user.grade = "free"
-    user.goal_trial_start = datetime(2025, 1, 1, 8, 0)
-    user.goal_trial_notified = False
+    user = _watcher_user(session_factory, goal=goal, morning_time="08:00")
+    session = session_factory()
+    stored = session.get(User, user.id)
+    stored.goal_trial_start = datetime(2025, 1, 1, 8, 0)
+    stored.goal_trial_notified = False
+    session.commit()
+    session.close()
 
-    fake_now = datetime(2025, 1, 4, 8, 1)
-
-    query_users = MagicMock()
-    query_users.join.return_value.filter.return_value.all.return_value = [user]
-
-    meal_query = MagicMock()
-    meal_query.filter.return_value.order_by.return_value.first.return_value = MagicMock(
-        timestamp=fake_now - timedelta(days=1)
-    )
+    monkeypatch.setattr(reminders, "_chat_completion", AsyncMock())
 
-    session = MagicMock()
+    bot = _bot()
+    await _tick(bot, datetime(2025, 1, 4, 8, 1))
 
-    def query_side_effect(model):
-        if model.__name__ == "User":
-            return query_users
-        return meal_query
+    bot.send_message.assert_awaited_once()
+    assert bot.send_message.await_args.args[1] == GOAL_TRIAL_EXPIRED_NOTICE
+    assert bot.send_message.await_args.kwargs["reply_markup"].inline_keyboard
+    stored = _stored_user(session_factory, user.id)
+    assert stored.goal is None
+    assert stored.goal_trial_notified is True
+    assert reminder_schedule.slots_for(user.id) == {}
 
-    session.query.side_effect = query_side_effect
-    monkeypatch.setattr(reminders, "SessionLocal", MagicMock(return_value=session))
 
-    send_mock = AsyncMock()
-    monkeypatch.setattr(reminders, "_send", send_mock)
-    monkeypatch.setattr(reminders, "subscribe_button", MagicMock(return_value="kb"))
-    monkeypatch.setattr(reminders, "_chat_completion", AsyncMock())
-
-    monkeypatch.setattr(
-        reminders,
-        "datetime",
-        SimpleNamespace(utcnow=lambda: fake_now, combine=datetime.combine),
+@pytest.mark.asyncio
+async def test_goal_morning_notification_sent(monkeypatch):
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 1, 8, 0)
+    goal = Goal(
+        target="loss",
+        calories=2000,
+        protein=100,
+        fat=50,
+        carbs=250,
+        reminder_morning=True,
+        reactivated_at=now - timedelta(days=1),
+    )
+    user = _watcher_user(
+        session_factory,
+        grade="pro",
+        goal=goal,
+        last_meal_at=now - timedelta(days=1),
+        morning_time="08:00",
     )
 
-    async def fake_sleep(_):
-        raise asyncio.CancelledError()
+    monkeypatch.setattr(reminders, "_chat_completion", AsyncMock(return_value=("hi", 1, 1)))
+    monkeypatch.setattr(reminders, "token_monitor", SimpleNamespace(add=AsyncMock()))
 
-    monkeypatch.setattr(reminders, "asyncio", SimpleNamespace(sleep=fake_sleep))
+    bot = _bot()
 
-    bot = MagicMock()
+    await _tick(bot, now - timedelta(minutes=5))
+    await goal_text_queue.drain()
+    bot.send_message.assert_not_awaited()
 
-    with pytest.raises(asyncio.CancelledError):
-        await reminders.reminder_watcher(check_interval=0)(bot)
+    await _tick(bot, now)
+    await _tick(bot, now)
 
-    session.delete.assert_called_once_with(goal)
-    send_mock.assert_awaited_once_with(
-        bot,
-        user,
-        GOAL_TRIAL_EXPIRED_NOTICE,
-        reply_markup="kb",
-    )
-    assert user.goal_trial_notified is True
+    bot.send_message.assert_awaited_once()
+    chat_id, text = bot.send_message.await_args.args
+    assert chat_id == 123
+    assert text.endswith("💪 hi")
+    assert "<b>2000</b>" in text
+    assert bot.send_message.await_args.kwargs["parse_mode"] == "HTML"
+    assert _stored_user(session_factory, user.id).last_morning == now
 
 
 @pytest.mark.asyncio
-async def test_goal_morning_notification_sent(monkeypatch):
-    user = MagicMock()
-    goal = Goal(target="loss", calories=2000, protein=100, fat=50, carbs=250, reminder_morning=True)
-    user.goal = goal
-    user.id = 1
-    user.telegram_id = 123
-    user.timezone = 0
-    user.morning_time = "08:00"
-    user.evening_time = None
-    user.last_morning = None
-    user.morning_enabled = False
-    user.day_enabled = False
-    user.evening_enabled = False
-
-    fake_now = datetime(2025, 1, 1, 8, 0)
-
-    query_users = MagicMock()
-    query_users.join.return_value.filter.return_value.all.return_value = [user]
-
-    last_meal_query = MagicMock()
-    last_meal_query.filter.return_value.order_by.return_value.first.return_value = MagicMock(
-        timestamp=fake_now - timedelta(days=1)
+async def test_goal_evening_notification_sent(monkeypatch):
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 1, 20, 0)
+    goal = Goal(
+        target="gain",
+        calories=1800,
+        protein=90,
+        fat=60,
+        carbs=210,
+        reminder_evening=True,
+        reactivated_at=now - timedelta(days=1),
+    )
+    user = _watcher_user(
+        session_factory,
+        grade="pro_promo",
+        goal=goal,
+        last_meal_at=now - timedelta(hours=2),
+        evening_time="20:00",
     )
+    session = session_factory()
+    session.add(
+        Meal(
+            user_id=user.id,
+            name="Салат",
+            calories=100,
+            protein=10,
+            fat=5,
+            carbs=20,
+            timestamp=now - timedelta(hours=2),
+        )
+    )
+    session.commit()
+    session.close()
 
-    yday_meals_query = MagicMock()
-    yday_meals_query.filter.return_value.all.return_value = []
+    completion = AsyncMock(return_value=("ok", 1, 1))
+    monkeypatch.setattr(reminders, "_chat_completion", completion)
+    monkeypatch.setattr(reminders, "token_monitor", SimpleNamespace(add=AsyncMock()))
 
-    meal_queries = [last_meal_query, yday_meals_query]
+    bot = _bot()
 
-    session = MagicMock()
+    await _tick(bot, now - timedelta(minutes=5))
+    await goal_text_queue.drain()
+    await _tick(bot, now)
 
-    def query_side_effect(model):
-        if model.__name__ == "User":
-            return query_users
-        return meal_queries.pop(0)
+    bot.send_message.assert_awaited_once()
+    text = bot.send_message.await_args.args[1]
+    assert text.endswith("💡 ok")
+    assert "<b>100</b> ккал" in text
+    assert GOAL_DEVIATION_LABELS["low"] in completion.await_args.args[0][0]["content"]
 
-    session.query.side_effect = query_side_effect
-    monkeypatch.setattr(reminders, "SessionLocal", MagicMock(return_value=session))
 
-    monkeypatch.setattr(reminders, "_chat_completion", AsyncMock(return_value=("hi", 1, 1)))
-    tm = SimpleNamespace(add=AsyncMock())
-    monkeypatch.setattr(reminders, "token_monitor", tm)
-
-    monkeypatch.setattr(
-        reminders,
-        "datetime",
-        SimpleNamespace(utcnow=lambda: fake_now, combine=datetime.combine),
+@pytest.mark.asyncio
+async def test_goal_reminder_rendered_locally_without_gpt(monkeypatch):
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 2, 8, 0)
+    goal = Goal(
+        target="loss",
+        calories=2000,
+        protein=100,
+        fat=50,
+        carbs=250,
+        reminder_morning=True,
+        reactivated_at=now - timedelta(days=1),
+    )
+    user = _watcher_user(
+        session_factory,
+        grade="light",
+        goal=goal,
+        last_meal_at=now - timedelta(hours=12),
+        morning_time="08:00",
     )
+    session = session_factory()
+    session.add(
+        Meal(
+            user_id=user.id,
+            name="Ужин",
+            calories=640,
+            protein=30,
+            fat=20,
+            carbs=80,
+            timestamp=now - timedelta(hours=12),
+        )
+    )
+    session.commit()
+    session.close()
 
-    async def fake_sleep(_):
-        raise asyncio.CancelledError()
+    completion = AsyncMock()
+    monkeypatch.setattr(reminders, "_chat_completion", completion)
+    bot = _bot()
 
-    monkeypatch.setattr(reminders, "asyncio", SimpleNamespace(sleep=fake_sleep))
+    await _tick(bot, now)
 
-    bot = MagicMock()
-    bot.send_message = AsyncMock()
+    completion.assert_not_awaited()
+    bot.send_message.assert_awaited_once()
+    text = bot.send_message.await_args.args[1]
+    assert "<b>640</b> ккал / <b>30</b> Б / <b>20</b> Ж / <b>80</b> У" in text
+    assert "<b>2000</b> ккал" in text
 
-    with pytest.raises(asyncio.CancelledError):
-        await reminders.reminder_watcher(check_interval=0)(bot)
 
-    bot.send_message.assert_awaited_once_with(123, "hi", reply_markup=None)
+@pytest.mark.asyncio
+async def test_goal_advice_shared_between_users(monkeypatch):
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 2, 8, 0)
+    for telegram_id in (1, 2):
+        _watcher_user(
+            session_factory,
+            telegram_id=telegram_id,
+            grade="pro",
+            goal=Goal(
+                target="loss",
+                calories=2000,
+                reminder_morning=True,
+                reactivated_at=now - timedelta(days=1),
+            ),
+            morning_time="08:00",
+        )
+
+    completion = AsyncMock(return_value=("совет", 1, 1))
+    monkeypatch.setattr(reminders, "_chat_completion", completion)
+    monkeypatch.setattr(reminders, "token_monitor", SimpleNamespace(add=AsyncMock()))
+    bot = _bot()
+
+    await _tick(bot, now - timedelta(minutes=5))
+    await goal_text_queue.drain()
+    await _tick(bot, now)
+
+    completion.assert_awaited_once()
+    assert bot.send_message.await_count == 2
+    for call in bot.send_message.await_args_list:
+        assert call.args[1].endswith("💪 совет")
 
 
 @pytest.mark.asyncio
-async def test_goal_evening_notification_sent(monkeypatch):
-    user = MagicMock()
-    goal = Goal(target="gain", calories=1800, protein=90, fat=60, carbs=210, reminder_evening=True)
-    user.goal = goal
-    user.id = 1
-    user.telegram_id = 123
-    user.timezone = 0
-    user.morning_time = None
-    user.evening_time = "20:00"
-    user.last_evening = None
-    user.morning_enabled = False
-    user.day_enabled = False
-    user.evening_enabled = False
-
-    fake_now = datetime(2025, 1, 1, 20, 0)
+async def test_reminders_follow_user_timezone(monkeypatch):
+    session_factory = _watcher_db(monkeypatch)
+    user = _watcher_user(
+        session_factory, timezone=180, morning_time="08:00", morning_enabled=True
+    )
+    bot = _bot()
+    send_mock = bot.send_message
+    await _tick(bot, datetime(2025, 1, 1, 8, 0))
+    send_mock.assert_not_awaited()
 
-    query_users = MagicMock()
-    query_users.join.return_value.filter.return_value.all.return_value = [user]
+    await _tick(bot, datetime(2025, 1, 1, 5, 0))
+    send_mock.assert_awaited_once()
+    assert send_mock.await_args.args[0] == 123
+    assert _stored_user(session_factory, user.id).last_morning == datetime(2025, 1, 1, 8, 0)
 
-    meal = MagicMock()
-    meal.calories = 100
-    meal.protein = 10
-    meal.fat = 5
-    meal.carbs = 20
-    meal.name = "Салат"
 
-    last_meal_query = MagicMock()
-    last_meal_query.filter.return_value.order_by.return_value.first.return_value = MagicMock(
-        timestamp=fake_now - timedelta(days=1)
+@pytest.mark.asyncio
+async def test_slow_tick_catches_up_missed_minutes(monkeypatch):
+    session_factory = _watcher_db(monkeypatch)
+    user = _watcher_user(
+        session_factory, timezone=0, morning_time="08:00", morning_enabled=True
     )
+    bot = _bot()
+    send_mock = bot.send_message
 
-    day_meals_query = MagicMock()
-    day_meals_query.filter.return_value.all.return_value = [meal]
-
-    meal_queries = [last_meal_query, day_meals_query]
-
-    session = MagicMock()
+    await _tick(bot, datetime(2025, 1, 1, 8, 3))
+    send_mock.assert_not_awaited()
 
-    def query_side_effect(model):
-        if model.__name__ == "User":
-            return query_users
-        return meal_queries.pop(0)
+    await _tick(
+        bot, datetime(2025, 1, 1, 8, 3, 20), since=datetime(2025, 1, 1, 7, 59)
+    )
+    send_mock.assert_awaited_once()
+    assert _stored_user(session_factory, user.id).last_morning == datetime(2025, 1, 1, 8, 0)
 
-    session.query.side_effect = query_side_effect
-    monkeypatch.setattr(reminders, "SessionLocal", MagicMock(return_value=session))
+    await _tick(
+        bot, datetime(2025, 1, 1, 8, 5), since=datetime(2025, 1, 1, 7, 50)
+    )
+    send_mock.assert_awaited_once()
 
-    monkeypatch.setattr(reminders, "_chat_completion", AsyncMock(return_value=("ok", 1, 1)))
-    tm = SimpleNamespace(add=AsyncMock())
-    monkeypatch.setattr(reminders, "token_monitor", tm)
 
-    monkeypatch.setattr(
-        reminders,
-        "datetime",
-        SimpleNamespace(utcnow=lambda: fake_now, combine=datetime.combine),
-    )
+def test_catch_up_window_is_capped(monkeypatch):
+    monkeypatch.setattr(reminders, "REMINDER_CATCHUP_MINUTES", 3)
+    now = datetime(2025, 1, 1, 8, 10)
 
-    async def fake_sleep(_):
-        raise asyncio.CancelledError()
+    assert reminders._catch_up_minutes(now, None) == [now]
+    assert reminders._catch_up_minutes(now, now) == []
+    assert reminders._catch_up_minutes(now, now - timedelta(minutes=2)) == [
+        now - timedelta(minutes=1),
+        now,
+    ]
+    assert reminders._catch_up_minutes(now, now - timedelta(hours=1)) == [
+        now - timedelta(minutes=2),
+        now - timedelta(minutes=1),
+        now,
+    ]
 
-    monkeypatch.setattr(reminders, "asyncio", SimpleNamespace(sleep=fake_sleep))
 
-    bot = MagicMock()
-    bot.send_message = AsyncMock()
+@pytest.mark.asyncio
+async def test_watcher_tick_catches_up_from_last_minute(monkeypatch):
+    tick = AsyncMock()
+    monkeypatch.setattr(reminders, "run_reminder_tick", tick)
+    ctx = TickContext("reminder_watcher")
 
-    with pytest.raises(asyncio.CancelledError):
-        await reminders.reminder_watcher(check_interval=0)(bot)
+    await reminders.reminder_watcher_tick(ctx)
+    await reminders.reminder_watcher_tick(ctx)
 
-    bot.send_message.assert_awaited_once_with(123, "ok", reply_markup=None)
+    first, second = tick.await_args_list
+    assert first.kwargs["since"] is None
+    assert first.args[0].second == 0
+    assert second.kwargs["since"] == first.args[0]
+    assert ctx.state["last_processed"] == second.args[0]
 
 
 @pytest.mark.asyncio
 async def test_goal_auto_stop_after_inactivity(monkeypatch):
-    user = MagicMock()
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 4, 8, 0)
     goal = Goal(
         target="maintain",
-        calories=2000,
-        protein=100,
-        fat=50,
-        carbs=250,
         reminder_morning=True,
         reminder_evening=True,
+        reactivated_at=datetime(2024, 12, 31),
     )
-    goal.reactivated_at = datetime(2024, 12, 31)
-    user.goal = goal
-    user.id = 1
-    user.telegram_id = 123
-    user.timezone = 0
-    user.morning_time = "08:00"
-    user.evening_time = "20:00"
-    user.morning_enabled = False
-    user.day_enabled = False
-    user.evening_enabled = False
-    user.grade = "light"
-
-    fake_now = datetime(2025, 1, 4, 8, 0)
-
-    query_users = MagicMock()
-    query_users.join.return_value.filter.return_value.all.return_value = [user]
-
-    last_meal_query = MagicMock()
-    last_meal_query.filter.return_value.order_by.return_value.first.return_value = MagicMock(
-        timestamp=fake_now - timedelta(days=4)
-    )
-
-    session = MagicMock()
-
-    def query_side_effect(model):
-        if model.__name__ == "User":
-            return query_users
-        return last_meal_query
-
-    session.query.side_effect = query_side_effect
-    monkeypatch.setattr(reminders, "SessionLocal", MagicMock(return_value=session))
-
-    monkeypatch.setattr(
-        reminders,
-        "datetime",
-        SimpleNamespace(utcnow=lambda: fake_now, combine=datetime.combine),
+    user = _watcher_user(
+        session_factory,
+        grade="light",
+        goal=goal,
+        last_meal_at=now - timedelta(days=4),
+        morning_time="08:00",
     )
 
-    send_mock = AsyncMock()
-    monkeypatch.setattr(reminders, "_send", send_mock)
     monkeypatch.setattr(reminders, "_chat_completion", AsyncMock())
-    tm = SimpleNamespace(add=AsyncMock())
-    monkeypatch.setattr(reminders, "token_monitor", tm)
 
-    async def fake_sleep(_):
-        raise asyncio.CancelledError()
+    bot = _bot()
+    send_mock = bot.send_message
+    await _tick(bot, now)
 
-    monkeypatch.setattr(reminders, "asyncio", SimpleNamespace(sleep=fake_sleep))
-
-    bot = MagicMock()
-
-    with pytest.raises(asyncio.CancelledError):
-        await reminders.reminder_watcher(check_interval=0)(bot)
-
-    session.delete.assert_called_once_with(goal)
-    send_mock.assert_awaited_once_with(bot, user, GOAL_REMINDERS_DISABLED, reply_markup=None)
+    assert _stored_user(session_factory, user.id).goal is None
+    send_mock.assert_awaited_once()
+    assert send_mock.await_args.args[1] == GOAL_REMINDERS_DISABLED
+    assert reminder_schedule.slots_for(user.id) == {}
 
 
 @pytest.mark.asyncio
 async def test_goal_auto_stop_after_inactivity_free_no_notice(monkeypatch):
-    user = MagicMock()
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 4, 8, 0)
     goal = Goal(
         target="maintain",
-        calories=2000,
-        protein=100,
-        fat=50,
-        carbs=250,
         reminder_morning=True,
         reminder_evening=True,
+        reactivated_at=datetime(2024, 12, 31),
     )
-    goal.reactivated_at = datetime(2024, 12, 31)
-    user.goal = goal
-    user.id = 1
-    user.telegram_id = 123
-    user.timezone = 0
-    user.morning_time = "08:00"
-    user.evening_time = "20:00"
-    user.morning_enabled = False
-    user.day_enabled = False
-    user.evening_enabled = False
-    user.grade = "free"
-
-    fake_now = datetime(2025, 1, 4, 8, 0)
-
-    query_users = MagicMock()
-    query_users.join.return_value.filter.return_value.all.return_value = [user]
-
-    last_meal_query = MagicMock()
-    last_meal_query.filter.return_value.order_by.return_value.first.return_value = MagicMock(
-        timestamp=fake_now - timedelta(days=4)
+    user = _watcher_user(
+        session_factory,
+        goal=goal,
+        last_meal_at=now - timedelta(days=4),
+        morning_time="08:00",
     )
 
-    session = MagicMock()
-
-    def query_side_effect(model):
-        if model.__name__ == "User":
-            return query_users
-        return last_meal_query
-
-    session.query.side_effect = query_side_effect
-    monkeypatch.setattr(reminders, "SessionLocal", MagicMock(return_value=session))
-
-    monkeypatch.setattr(
-        reminders,
-        "datetime",
-        SimpleNamespace(utcnow=lambda: fake_now, combine=datetime.combine),
-    )
-
-    send_mock = AsyncMock()
-    monkeypatch.setattr(reminders, "_send", send_mock)
     monkeypatch.setattr(reminders, "_chat_completion", AsyncMock())
-    tm = SimpleNamespace(add=AsyncMock())
-    monkeypatch.setattr(reminders, "token_monitor", tm)
-
-    async def fake_sleep(_):
-        raise asyncio.CancelledError()
 
-    monkeypatch.setattr(reminders, "asyncio", SimpleNamespace(sleep=fake_sleep))
+    bot = _bot()
+    send_mock = bot.send_message
+    await _tick(bot, now)
 
-    bot = MagicMock()
-
-    with pytest.raises(asyncio.CancelledError):
-        await reminders.reminder_watcher(check_interval=0)(bot)
-
-    session.delete.assert_called_once_with(goal)
+    assert _stored_user(session_factory, user.id).goal is None
     send_mock.assert_not_awaited()
 
 
 @pytest.mark.asyncio
 async def test_goal_not_stopped_immediately_after_reactivation(monkeypatch):
-    user = MagicMock()
+    session_factory = _watcher_db(monkeypatch)
+    now = datetime(2025, 1, 4, 8, 0)
     goal = Goal(
         target="maintain",
-        calories=2000,
-        protein=100,
-        fat=50,
-        carbs=250,
         reminder_morning=True,
         reminder_evening=True,
+        reactivated_at=now - timedelta(hours=1),
     )
-    fake_now = datetime(2025, 1, 4, 8, 0)
-    goal.reactivated_at = fake_now - timedelta(hours=1)
-    user.goal = goal
-    user.id = 1
-    user.telegram_id = 123
-    user.timezone = 0
-    user.morning_time = "08:00"
-    user.evening_time = "20:00"
-    user.morning_enabled = False
-    user.day_enabled = False
-    user.evening_enabled = False
-    user.grade = "light"
-
-    query_users = MagicMock()
-    query_users.join.return_value.filter.return_value.all.return_value = [user]
-
-    last_meal_query = MagicMock()
-    last_meal_query.filter.return_value.order_by.return_value.first.return_value = MagicMock(
-        timestamp=fake_now - timedelta(days=4)
+    user = _watcher_user(
+        session_factory,
+        grade="light",
+        goal=goal,
+        last_meal_at=now - timedelta(days=4),
+        morning_time="08:00",
+        last_morning=now,
     )
 
-    session = MagicMock()
-
-    def query_side_effect(model):
-        if model.__name__ == "User":
-            return query_users
-        return last_meal_query
-
-    session.query.side_effect = query_side_effect
-    monkeypatch.setattr(reminders, "SessionLocal", MagicMock(return_value=session))
-
-    monkeypatch.setattr(
-        reminders,
-        "datetime",
-        SimpleNamespace(utcnow=lambda: fake_now, combine=datetime.combine),
-    )
-
-    send_mock = AsyncMock()
-    monkeypatch.setattr(reminders, "_send", send_mock)
     monkeypatch.setattr(reminders, "_chat_completion", AsyncMock())
-    tm = SimpleNamespace(add=AsyncMock())
-    monkeypatch.setattr(reminders, "token_monitor", tm)
-
-    async def fake_sleep(_):
-        raise asyncio.CancelledError()
-
-    monkeypatch.setattr(reminders, "asyncio", SimpleNamespace(sleep=fake_sleep))
-
-    bot = MagicMock()
 
-    with pytest.raises(asyncio.CancelledError):
-        await reminders.reminder_watcher(check_interval=0)(bot)
+    bot = _bot()
+    send_mock = bot.send_message
+    await _tick(bot, now)
 
-    session.delete.assert_not_called()
+    assert _stored_user(session_factory, user.id).goal is not None
     send_mock.assert_not_awaited()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.goal_templates import (  # noqa: E402
+    AdviceCache,
+    deviation_bucket,
+    render_goal_reminder,
+)
+from bot.texts import GOAL_SUMMARY_EMPTY  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "fact, bucket",
+    [(0, "empty"), (1000, "low"), (1800, "under"), (2000, "on_track"), (2300, "over"), (3000, "high")],
+)
+def test_deviation_bucket(fact, bucket):
+    assert deviation_bucket(2000, fact) == bucket
+
+
+def test_render_goal_reminder_formats_numbers_and_escapes_advice():
+    text = render_goal_reminder(
+        "evening",
+        (2000, 120, 60, 250),
+        (2010.5, 118, 61, 240),
+        advice="Меньше <сладкого> & больше воды",
+        rng=random.Random(1),
+    )
+    paragraphs = text.split("\n\n")
+    assert paragraphs[0].startswith("🌙 <b>")
+    assert "<b>2010.5</b> ккал / <b>118</b> Б" in paragraphs[1]
+    assert "<b>2000</b> ккал / <b>120</b> Б" in paragraphs[1]
+    assert paragraphs[2] == "💡 Меньше &lt;сладкого&gt; &amp; больше воды"
+
+
+def test_render_goal_reminder_without_meals():
+    text = render_goal_reminder("morning", (2000, 120, 60, 250), (0, 0, 0, 0))
+    assert GOAL_SUMMARY_EMPTY["morning"] in text
+    assert text.startswith("🌅 <b>")
+
+
+@pytest.mark.asyncio
+async def test_advice_cache_shares_inflight_call():
+    cache = AdviceCache(ttl=60)
+    calls = 0
+    release = asyncio.Event()
+
+    async def _create():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "совет"
+
+    key = ("morning", "low", "loss")
+    first = asyncio.create_task(cache.get_or_create(key, _create))
+    second = asyncio.create_task(cache.get_or_create(key, _create))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "совет"
+    assert calls == 1
+    assert cache.get(key) == "совет"
@@ -0,0 +1,148 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import outbox  # noqa: E402
+from bot.database import Base, NotificationStatus, Outbox, User  # noqa: E402
+from bot.messaging import RateLimiter  # noqa: E402
+from bot.outbox import Mark, OutboxMessage  # noqa: E402
+from bot.simulation import VirtualClock  # noqa: E402
+from bot.watchers import TickContext  # noqa: E402
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(outbox, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def send_mock(monkeypatch):
+    mock = AsyncMock(return_value=True)
+    monkeypatch.setattr(outbox, "send_with_retries", mock)
+    return mock
+
+
+def _enqueue(factory, *messages, now=NOW):
+    session = factory()
+    queued = outbox.enqueue_many(session, messages, now)
+    session.commit()
+    session.close()
+    return queued
+
+
+async def _dispatch(clock, **kwargs):
+    ctx = TickContext("outbox", clock=clock)
+    return await outbox.dispatch_outbox(None, ctx, limiter=RateLimiter(1000), **kwargs)
+
+
+def _rows(factory):
+    session = factory()
+    rows = session.query(Outbox).order_by(Outbox.id).all()
+    session.close()
+    return rows
+
+
+def test_dedup_key_blocks_pending_and_recently_failed(session_factory):
+    message = OutboxMessage(1, "hi", "test", dedup_key="test:1")
+
+    assert _enqueue(session_factory, message, message) == 1
+    assert _enqueue(session_factory, message) == 0
+
+    session = session_factory()
+    session.query(Outbox).update({"status": outbox.FAILED, "finished_at": NOW})
+    session.commit()
+    session.close()
+    assert _enqueue(session_factory, message, now=NOW + timedelta(hours=1)) == 0
+    assert _enqueue(session_factory, message, now=NOW + timedelta(days=2)) == 1
+
+
+@pytest.mark.asyncio
+async def test_dispatch_sends_by_priority_and_applies_marks(session_factory, send_mock):
+    session = session_factory()
+    session.add(User(id=5, telegram_id=50, notification=NotificationStatus()))
+    session.commit()
+    session.close()
+    builder = InlineKeyboardBuilder()
+    builder.button(text="go", callback_data="go")
+    _enqueue(
+        session_factory,
+        OutboxMessage(50, "bulk", "bulk", priority=outbox.PRIORITY_BULK),
+        OutboxMessage(
+            50,
+            "notice",
+            "notice",
+            reply_markup=builder.as_markup(),
+            on_delivered=[Mark(NotificationStatus, 5, {"notified_7d": True})],
+        ),
+        OutboxMessage(60, "later", "later", not_before=NOW + timedelta(hours=1)),
+    )
+
+    sent = await _dispatch(VirtualClock(NOW))
+
+    assert sent == 2
+    assert [call.kwargs["text"] for call in send_mock.await_args_list] == ["notice", "bulk"]
+    markup = send_mock.await_args_list[0].kwargs["reply_markup"]
+    assert markup.inline_keyboard[0][0].callback_data == "go"
+    assert [row.status for row in _rows(session_factory)] == ["sent", "sent", "pending"]
+    session = session_factory()
+    assert session.get(NotificationStatus, 5).notified_7d is True
+    session.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_sends_back_off_then_give_up(session_factory, send_mock, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(outbox, "OUTBOX_RETRY_DELAY", 60)
+    send_mock.return_value = False
+    _enqueue(session_factory, OutboxMessage(1, "hi", "test"))
+    clock = VirtualClock(NOW)
+
+    await _dispatch(clock)
+    row = _rows(session_factory)[0]
+    assert (row.status, row.attempts, row.not_before) == (
+        "pending",
+        1,
+        NOW + timedelta(seconds=60),
+    )
+
+    await _dispatch(clock)
+    assert send_mock.await_count == 1
+
+    clock.advance(60)
+    await _dispatch(clock)
+    assert _rows(session_factory)[0].not_before == clock.now() + timedelta(seconds=120)
+
+    clock.advance(120)
+    await _dispatch(clock)
+    row = _rows(session_factory)[0]
+    assert (row.status, row.attempts, row.finished_at) == ("failed", 3, clock.now())
+
+
+@pytest.mark.asyncio
+async def test_dispatch_defers_when_out_of_time(session_factory, send_mock):
+    _enqueue(session_factory, *(OutboxMessage(chat, "hi", "test") for chat in range(5)))
+    clock = VirtualClock(NOW)
+    ctx = TickContext("outbox", clock=clock, budget=0)
+
+    sent = await outbox.dispatch_outbox(None, ctx, limiter=RateLimiter(1000), batch_size=2)
+
+    assert sent == 2
+    assert ctx.deferred
+    assert [row.status for row in _rows(session_factory)].count("pending") == 3
@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.storage import PendingMeals  # noqa: E402
+
+
+@pytest.fixture
+def meals():
+    return PendingMeals()
+
+
+def test_pop_reminders_returns_oldest_due_once(meals):
+    meals["b"] = {"timestamp": 200.0}
+    meals["a"] = {"timestamp": 100.0}
+    meals["c"] = {"timestamp": 900.0}
+
+    assert [meal_id for meal_id, _ in meals.pop_reminders(500.0)] == ["a", "b"]
+    assert meals.pop_reminders(500.0) == []
+    assert set(meals) == {"a", "b", "c"}
+
+
+def test_pop_reminders_skips_reminded_and_saved_meals(meals):
+    meals["saved"] = {"timestamp": 100.0}
+    meals["reminded"] = {"timestamp": 100.0}
+    meals["reminded"]["reminded"] = True
+    del meals["saved"]
+
+    assert meals.pop_reminders(500.0) == []
+
+
+def test_pop_expired_is_independent_of_reminders(meals):
+    meals["a"] = {"timestamp": 100.0}
+    meals.pop_reminders(500.0)
+
+    assert [meal_id for meal_id, _ in meals.pop_expired(500.0)] == ["a"]
+
+
+def test_stale_entries_are_compacted(meals):
+    for idx in range(500):
+        meals[str(idx)] = {"timestamp": 100.0 + idx}
+        meals.pop(str(idx))
+
+    assert len(meals._expiry) <= 64
+    assert len(meals._reminders) <= 64
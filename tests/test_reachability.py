@@ -0,0 +1,144 @@
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+)
+from aiogram.methods import SendMessage
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import reachability  # noqa: E402
+from bot.database import Base, Outbox, ReminderSettings, User  # noqa: E402
+from bot.outbox import OutboxMessage, enqueue_many  # noqa: E402
+from bot.reminder_schedule import rebuild_schedule, reminder_schedule  # noqa: E402
+from bot.simulation import VirtualClock  # noqa: E402
+from bot.watchers import TickContext  # noqa: E402
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(reachability, "SessionLocal", factory)
+    monkeypatch.setattr(reachability, "_pending", {})
+    monkeypatch.setattr(reachability, "_unreachable", set())
+    reminder_schedule.clear()
+    session = factory()
+    for telegram_id in (1, 2, 3):
+        session.add(
+            User(
+                telegram_id=telegram_id,
+                reminders=ReminderSettings(
+                    timezone=0, morning_time="08:00", morning_enabled=True
+                ),
+            )
+        )
+    session.commit()
+    rebuild_schedule(session)
+    session.close()
+    yield factory
+    reminder_schedule.clear()
+
+
+def _error(cls, message):
+    return cls(SendMessage(chat_id=1, text="hi"), message)
+
+
+def test_classify_failure():
+    cases = [
+        (TelegramForbiddenError, "Forbidden: bot was blocked by the user", "blocked"),
+        (TelegramForbiddenError, "Forbidden: user is deactivated", "deactivated"),
+        (TelegramBadRequest, "Bad Request: chat not found", "chat not found"),
+        (TelegramBadRequest, "Bad Request: message is too long", None),
+        (TelegramNetworkError, "timeout", None),
+    ]
+    for cls, message, reason in cases:
+        assert reachability.classify_failure(_error(cls, message)) == reason
+
+
+@pytest.mark.asyncio
+async def test_tracker_records_only_private_chats_failing_for_good():
+    tracker = reachability.ReachabilityTracker()
+    reachability._pending.clear()
+
+    for chat_id, error in (
+        (5, _error(TelegramForbiddenError, "Forbidden: bot was blocked by the user")),
+        (-100, _error(TelegramBadRequest, "Bad Request: chat not found")),
+        (6, _error(TelegramNetworkError, "timeout")),
+    ):
+        with pytest.raises(type(error)):
+            await tracker(
+                AsyncMock(side_effect=error), None, SendMessage(chat_id=chat_id, text="hi")
+            )
+
+    assert reachability._pending == {5: "blocked"}
+    reachability._pending.clear()
+
+
+@pytest.mark.asyncio
+async def test_watcher_marks_users_and_fails_their_outbox(session_factory):
+    session = session_factory()
+    enqueue_many(session, [OutboxMessage(1, "a", "test"), OutboxMessage(3, "b", "test")], NOW)
+    session.commit()
+    session.close()
+    reachability._pending.update({1: "blocked", 2: "deactivated", 999: "blocked"})
+
+    await reachability.reachability_watcher_tick(
+        TickContext("reachability", clock=VirtualClock(NOW))
+    )
+
+    session = session_factory()
+    users = {user.telegram_id: user for user in session.query(User)}
+    assert (users[1].left_bot, users[1].unreachable_reason, users[1].unreachable_at) == (
+        True,
+        "blocked",
+        NOW,
+    )
+    assert users[2].unreachable_reason == "deactivated"
+    assert not users[3].left_bot
+    statuses = dict(session.query(Outbox.chat_id, Outbox.status))
+    assert statuses == {1: "failed", 3: "pending"}
+    assert [entry[0] for entry in reminder_schedule.due(8 * 60)] == [users[3].id]
+    # a restart does not schedule them again
+    rebuild_schedule(session)
+    assert [entry[0] for entry in reminder_schedule.due(8 * 60)] == [users[3].id]
+    session.close()
+    assert reachability._pending == {}
+    assert reachability._unreachable == {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_user_contacting_the_bot_is_reachable_again(session_factory):
+    session = session_factory()
+    reachability.mark_unreachable(session, {1: "blocked"}, NOW)
+    session.commit()
+    session.close()
+    handler = AsyncMock(return_value="handled")
+    middleware = reachability.ReachableAgainMiddleware()
+
+    result = await middleware(
+        handler, object(), {"event_from_user": SimpleNamespace(id=1)}
+    )
+
+    assert result == "handled"
+    session = session_factory()
+    user = session.query(User).filter_by(telegram_id=1).one()
+    assert (user.left_bot, user.unreachable_at, user.unreachable_reason) == (False, None, None)
+    assert reminder_schedule.slots_for(user.id) == {"morning": 8 * 60}
+    session.close()
+    assert reachability._unreachable == set()
@@ -1,16 +1,12 @@
 import os
 import sys
-import asyncio
 from datetime import datetime, timedelta
 from pathlib import Path
-from unittest.mock import AsyncMock
-
-import pytest
 
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from bot.database import Base, engine, SessionLocal, set_option  # noqa: E402
+from bot.database import Base, Outbox, engine, SessionLocal, set_option  # noqa: E402
 from bot.subscriptions import ensure_user  # noqa: E402
 from bot.handlers.referral import (  # noqa: E402
     reward_first_analysis,
@@ -37,13 +33,11 @@ def test_reward_first_analysis_gives_days_and_notifies():
     invitee.requests_total = 1
     session.commit()
 
-    bot = AsyncMock()
-    asyncio.run(reward_first_analysis(bot, session, invitee))
+    reward_first_analysis(session, invitee)
     session.refresh(referrer)
 
-    bot.send_message.assert_awaited_with(
-        referrer.telegram_id, REFERRAL_FRIEND_ACTIVATED
-    )
+    queued = session.query(Outbox).one()
+    assert (queued.chat_id, queued.text) == (referrer.telegram_id, REFERRAL_FRIEND_ACTIVATED)
     assert referrer.trial is True
     assert referrer.trial_end - datetime.utcnow() > timedelta(days=4)
     session.close()
@@ -57,13 +51,11 @@ def test_reward_subscription_gives_days_and_notifies():
     invitee.referrer_id = referrer.telegram_id
     session.commit()
 
-    bot = AsyncMock()
-    asyncio.run(reward_subscription(bot, session, invitee, payments=1))
+    reward_subscription(session, invitee, payments=1)
     session.refresh(referrer)
 
-    bot.send_message.assert_awaited_with(
-        referrer.telegram_id, REFERRAL_FRIEND_PAID
-    )
+    queued = session.query(Outbox).one()
+    assert (queued.chat_id, queued.text) == (referrer.telegram_id, REFERRAL_FRIEND_PAID)
     assert referrer.trial is True
     assert referrer.trial_end - datetime.utcnow() > timedelta(days=29)
     session.close()
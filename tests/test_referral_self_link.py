@@ -7,7 +7,7 @@ import sys
 from pathlib import Path
 from datetime import datetime
 import asyncio
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from aiogram import types
@@ -49,7 +49,7 @@ def test_new_user_receives_referral(monkeypatch):
     ensure_user(session, 10)
     session.close()
 
-    monkeypatch.setattr("bot.handlers.start.notify_trial_end", AsyncMock())
+    monkeypatch.setattr("bot.handlers.start.notify_trial_end", MagicMock())
     monkeypatch.setattr("bot.alerts.new_user", AsyncMock())
 
     msg = DummyMessage("/start ref_10", 20)
@@ -67,7 +67,7 @@ def test_new_user_receives_referral(monkeypatch):
 def test_self_referral_does_nothing(monkeypatch):
     _setup_db()
 
-    monkeypatch.setattr("bot.handlers.start.notify_trial_end", AsyncMock())
+    monkeypatch.setattr("bot.handlers.start.notify_trial_end", MagicMock())
     monkeypatch.setattr("bot.alerts.new_user", AsyncMock())
 
     msg = DummyMessage("/start ref_5", 5)
@@ -87,7 +87,7 @@ def test_existing_user_referral_ignored(monkeypatch):
     ensure_user(session, 30)
     session.close()
 
-    monkeypatch.setattr("bot.handlers.start.notify_trial_end", AsyncMock())
+    monkeypatch.setattr("bot.handlers.start.notify_trial_end", MagicMock())
     monkeypatch.setattr("bot.alerts.new_user", AsyncMock())
 
     msg = DummyMessage("/start ref_40", 30)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.reminder_prefetch import ReadyQueue  # noqa: E402
+
+
+DUE = datetime(2025, 1, 1, 8, 0)
+
+
+@pytest.mark.asyncio
+async def test_ready_queue_limits_concurrency():
+    queue = ReadyQueue(2)
+    running = 0
+    peak = 0
+
+    async def _generate():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        return "text", False
+
+    for user_id in range(5):
+        assert queue.submit((user_id, "morning"), DUE, _generate)
+    assert not queue.submit((0, "morning"), DUE, _generate)
+    await queue.drain()
+
+    assert peak == 2
+    assert len(queue) == 5
+    assert queue.take((3, "morning"), DUE) == ("text", False)
+    assert queue.take((3, "morning"), DUE) is None
+
+
+@pytest.mark.asyncio
+async def test_ready_queue_misses_deadline():
+    queue = ReadyQueue(1)
+    release = asyncio.Event()
+
+    async def _slow():
+        await release.wait()
+        return "late", False
+
+    queue.submit((1, "evening"), DUE, _slow)
+    await asyncio.sleep(0)
+    assert queue.take((1, "evening"), DUE) is None
+    assert queue.pending == 0
+
+    queue.submit((2, "evening"), DUE, lambda: asyncio.sleep(0, ("old", False)))
+    await queue.drain()
+    assert queue.take((2, "evening"), DUE + timedelta(days=1)) is None
+
+    queue.submit((3, "evening"), DUE, lambda: asyncio.sleep(0, ("stale", False)))
+    await queue.drain()
+    queue.prune(DUE + timedelta(minutes=1))
+    assert len(queue) == 0
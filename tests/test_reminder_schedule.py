@@ -0,0 +1,70 @@
+import os
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.database import Base, Goal, ReminderSettings, User  # noqa: E402
+from bot.reminder_schedule import (  # noqa: E402
+    ReminderSchedule,
+    rebuild_schedule,
+    reminder_schedule,
+    slot_minutes,
+)
+
+
+def test_slot_minutes_wraps_around_midnight():
+    slots = slot_minutes(
+        180,
+        {"morning": "02:00", "day": "13:00", "evening": "bad"},
+        {"morning": True, "day": False, "evening": True},
+    )
+    assert slots == {"morning": 23 * 60}
+    assert slot_minutes(None, {"morning": "08:00"}, {"morning": True}) == {}
+
+
+def test_schedule_replaces_user_entries():
+    schedule = ReminderSchedule()
+    schedule.set_user(1, {"morning": 480, "evening": 1200})
+    schedule.set_user(2, {"morning": 480})
+    assert schedule.due(480) == {(1, "morning"), (2, "morning")}
+
+    schedule.set_user(1, {"morning": 540})
+    assert schedule.due(480) == {(2, "morning")}
+    assert schedule.due(540) == {(1, "morning")}
+    assert schedule.due(1200) == set()
+
+    schedule.remove_user(2)
+    assert schedule.due(480) == set()
+    assert len(schedule) == 1
+
+
+def test_rebuild_schedule_merges_goal_flags():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    plain = User(
+        telegram_id=1,
+        reminders=ReminderSettings(timezone=60, day_enabled=True),
+    )
+    with_goal = User(
+        telegram_id=2,
+        reminders=ReminderSettings(timezone=0),
+        goal=Goal(reminder_evening=True),
+    )
+    no_timezone = User(
+        telegram_id=3,
+        reminders=ReminderSettings(morning_enabled=True),
+    )
+    session.add_all([plain, with_goal, no_timezone])
+    session.commit()
+
+    assert rebuild_schedule(session) == 2
+    assert reminder_schedule.slots_for(plain.id) == {"day": 12 * 60}
+    assert reminder_schedule.slots_for(with_goal.id) == {"evening": 20 * 60}
+    assert reminder_schedule.slots_for(no_timezone.id) == {}
+    reminder_schedule.clear()
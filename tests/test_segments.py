@@ -0,0 +1,154 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import broadcasts  # noqa: E402
+from bot.database import Base, Goal, Subscription, User  # noqa: E402
+from bot.messaging import RateLimiter  # noqa: E402
+from bot.segments import (  # noqa: E402
+    Segment,
+    SegmentError,
+    count_segment,
+    parse_segment,
+    segment_query,
+)
+
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(broadcasts, "SessionLocal", factory)
+    session = factory()
+    session.add_all(
+        [
+            # no subscription row at all
+            User(id=1, telegram_id=101, created_at=datetime(2025, 1, 5)),
+            User(
+                id=2,
+                telegram_id=102,
+                created_at=datetime(2025, 2, 1),
+                referrer_id=101,
+                subscription=Subscription(
+                    grade="pro",
+                    last_request=NOW - timedelta(days=2),
+                    paid_until=NOW + timedelta(days=20),
+                ),
+                goal=Goal(calories=2000),
+            ),
+            User(
+                id=3,
+                telegram_id=103,
+                created_at=datetime(2025, 2, 10),
+                subscription=Subscription(
+                    grade="light", trial=True, last_request=NOW - timedelta(days=40)
+                ),
+                goal=Goal(calories=None),
+            ),
+            User(
+                id=4,
+                telegram_id=104,
+                left_bot=True,
+                subscription=Subscription(grade="pro"),
+            ),
+        ]
+    )
+    session.commit()
+    session.close()
+    return factory
+
+
+def _members(factory, text):
+    session = factory()
+    ids = sorted(row[1] for row in segment_query(session, parse_segment(text), NOW))
+    session.close()
+    return ids
+
+
+def test_parse_segment_round_trips_and_reports_bad_words():
+    segment = parse_segment("grade=light,PRO trial=no inactive=14 ref=101 created=2025-01-01..")
+
+    assert segment == Segment(
+        grades=["light", "pro"],
+        trial=False,
+        inactive_days=14,
+        referrer_id=101,
+        created_from=date(2025, 1, 1),
+    )
+    assert Segment.from_json(segment.to_json()) == segment
+    assert parse_segment(segment.describe()) == segment
+    assert parse_segment("все").to_json() is None
+    for text, word in (
+        ("grade=gold", "gold"),
+        ("goal=maybe", "maybe"),
+        ("active=-1", "-1"),
+        ("created=yesterday", "yesterday"),
+        ("color=red", "color"),
+    ):
+        with pytest.raises(SegmentError, match=word):
+            parse_segment(text)
+
+
+def test_segment_filters_match_users(session_factory):
+    assert _members(session_factory, "все") == [101, 102, 103]
+    assert _members(session_factory, "grade=free") == [101]
+    assert _members(session_factory, "grade=light,pro trial=no") == [102]
+    assert _members(session_factory, "active=7") == [102]
+    assert _members(session_factory, "inactive=30") == [101, 103]
+    assert _members(session_factory, "goal=yes") == [102]
+    assert _members(session_factory, "goal=no") == [101, 103]
+    assert _members(session_factory, "ref=yes") == _members(session_factory, "ref=101") == [102]
+    assert _members(session_factory, "created=2025-02-01..2025-02-01") == [102]
+    assert _members(session_factory, "created=..2025-01-31") == [101]
+    assert _members(session_factory, "paid=no") == [101, 103]
+    session = session_factory()
+    assert count_segment(session, parse_segment("paid=yes goal=yes"), NOW) == 1
+    session.close()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_sends_to_its_segment_only(session_factory, monkeypatch):
+    send_mock = AsyncMock(return_value=True)
+    monkeypatch.setattr(broadcasts, "send_with_retries", send_mock)
+    session = session_factory()
+    job = broadcasts.create_broadcast(
+        session, 1, "hi", segment=parse_segment("grade=light,pro")
+    )
+    job_id = job.id
+    assert job.total == 2
+    session.close()
+
+    job = await broadcasts.run_broadcast(AsyncMock(), job_id, limiter=RateLimiter(1000))
+
+    assert sorted(call.args[1] for call in send_mock.await_args_list) == [102, 103]
+    assert (job.status, job.delivered) == ("done", 2)
+
+
+def test_grade_filter_includes_promo_trials(session_factory):
+    session = session_factory()
+    session.add(
+        User(
+            id=5,
+            telegram_id=105,
+            subscription=Subscription(grade="pro_promo", trial=True),
+        )
+    )
+    session.commit()
+    session.close()
+
+    assert _members(session_factory, "grade=pro") == [102, 105]
+    assert _members(session_factory, "grade=pro trial=yes") == [105]
+    assert _members(session_factory, "grade=light trial=yes") == [103]
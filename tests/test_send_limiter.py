@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.messaging import SendLimiter, background_sends  # noqa: E402
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+
+def _limiter(fake_time, **kwargs):
+    kwargs.setdefault("burst", 1)
+    kwargs.setdefault("chat_burst", 1)
+    return SendLimiter(10, clock=fake_time.clock, sleep=fake_time.sleep, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_global_and_per_chat_buckets(fake_time):
+    limiter = _limiter(fake_time)
+
+    await limiter.acquire(1, interactive=True)
+    await limiter.acquire(2, interactive=True)
+    await limiter.acquire(1, interactive=True)
+
+    # 0.1s between any two sends, 1s between sends to the same chat
+    assert fake_time.sleeps == [0.1, 0.9]
+    assert limiter.snapshot()["sent"] == 3
+
+
+@pytest.mark.asyncio
+async def test_interactive_replies_go_before_background():
+    # real time: the senders below wait concurrently
+    limiter = SendLimiter(50, burst=1, chat_burst=1)
+    order = []
+
+    async def send(chat_id, interactive):
+        await limiter.acquire(chat_id, interactive=interactive)
+        order.append(chat_id)
+
+    await limiter.acquire(0, interactive=False)
+    await asyncio.gather(
+        send(1, False), send(2, False), send(3, True), send(4, True)
+    )
+
+    assert order[:2] == [3, 4]
+    assert sorted(order[2:]) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_background_only(fake_time):
+    limiter = _limiter(fake_time, burst=5)
+    make_request = AsyncMock(side_effect=TelegramRetryAfter(None, "flood", 30))
+
+    with pytest.raises(TelegramRetryAfter):
+        await limiter(make_request, None, SendMessage(chat_id=1, text="hi"))
+
+    await limiter.acquire(2, interactive=True)
+    assert fake_time.now == 0
+    with background_sends():
+        await limiter(AsyncMock(return_value="ok"), None, SendMessage(chat_id=3, text="hi"))
+    assert fake_time.now == pytest.approx(30)
+    stats = limiter.snapshot(reset=True)
+    assert (stats["retry_after"], stats["sent"]) == (1, 3)
+    assert limiter.snapshot()["sent"] == 0
+
+
+@pytest.mark.asyncio
+async def test_other_methods_are_not_limited(fake_time):
+    limiter = _limiter(fake_time)
+    make_request = AsyncMock(return_value="me")
+    limiter.pause(60)
+
+    with background_sends():
+        assert await limiter(make_request, None, GetMe()) == "me"
+
+    assert fake_time.sleeps == []
+    assert limiter.snapshot()["sent"] == 0
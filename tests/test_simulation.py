@@ -0,0 +1,70 @@
+import os
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.database import SessionLocal, User  # noqa: E402
+from bot.simulation import Simulation, seed_users  # noqa: E402
+from bot.texts import REM_TEXT_MORNING, WELCOME_REMINDER_15M  # noqa: E402
+
+
+START = datetime(2025, 3, 1, 6, 0)
+
+
+@pytest.fixture
+def seeded():
+    with SessionLocal() as session:
+        before = session.query(User.id).count()
+        seed_users(session, 40, now=START, rng=random.Random(7))
+    yield
+    with SessionLocal() as session:
+        for user in session.query(User).order_by(User.id).offset(before):
+            session.delete(user)
+        session.commit()
+
+
+@pytest.mark.asyncio
+async def test_watchers_run_on_virtual_time(seeded):
+    simulation = Simulation(START)
+
+    ticks = await simulation.run_until(
+        START + timedelta(hours=2),
+        [
+            "reminder_watcher",
+            "engagement_watcher",
+            "subscription_watcher",
+            "outbox_dispatcher",
+        ],
+    )
+
+    assert simulation.clock.now() == START + timedelta(hours=2)
+    per_watcher = Counter(tick.watcher for tick in ticks)
+    assert per_watcher["reminder_watcher"] == 120
+    assert per_watcher["engagement_watcher"] >= 120 * 60 // 70
+    assert per_watcher["subscription_watcher"] >= 3
+    assert all(tick.errors == 0 for tick in ticks)
+    assert sum(tick.queries for tick in ticks) > 0
+    assert sum(tick.sent for tick in ticks) == len(simulation.bot.sent) > 0
+
+    # one-off engagement messages are not repeated across ticks
+    welcome = Counter(
+        message.chat_id
+        for message in simulation.bot.sent
+        if message.text == WELCOME_REMINDER_15M
+    )
+    assert welcome and max(welcome.values()) == 1
+    # each user gets at most one morning reminder
+    mornings = Counter(
+        message.chat_id
+        for message in simulation.bot.sent
+        if message.text in REM_TEXT_MORNING
+    )
+    assert mornings and max(mornings.values()) == 1
+    assert "reminder_watcher: ticks=120" in simulation.report()
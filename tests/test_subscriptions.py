@@ -28,6 +28,7 @@ class DummyUser:
         self.goal_trial_start = None
         self.goal_trial_notified = False
         self.trial_used = False
+        self.paid_until = None
 
 
 def test_process_payment_marks_trial_used():
@@ -37,3 +38,14 @@ def test_process_payment_marks_trial_used():
     subscriptions.process_payment_success(session, user, months=1, grade="light")
 
     assert user.trial_used is True
+
+
+def test_process_payment_chains_paid_until():
+    user = DummyUser()
+    session = MagicMock()
+
+    subscriptions.process_payment_success(session, user, months=1, grade="light")
+    first = user.paid_until
+    subscriptions.process_payment_success(session, user, months=2, grade="light")
+
+    assert (user.paid_until - first).days == 60
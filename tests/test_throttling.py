@@ -0,0 +1,115 @@
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram import types
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import throttling  # noqa: E402
+from bot.database import Base, Subscription, User  # noqa: E402
+
+
+load_tier = throttling._load_tier
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    throttling._buckets.clear()
+    throttling.throttle_stats.clear()
+    monkeypatch.setattr(
+        throttling, "THROTTLE_LIMITS", {"free": (2, 10.0), "pro": (4, 1.0)}
+    )
+    monkeypatch.setattr(throttling, "_load_tier", lambda telegram_id: "free")
+    yield
+    throttling._buckets.clear()
+    throttling.throttle_stats.clear()
+
+
+def test_bucket_allows_burst_then_rejects_with_retry_hint():
+    assert throttling.acquire(1, now=100.0) == 0
+    assert throttling.acquire(1, now=100.0) == 0
+    retry = throttling.acquire(1, now=100.0)
+    assert retry == pytest.approx(10.0)
+
+    assert throttling.acquire(1, now=105.0) == pytest.approx(5.0)
+    assert throttling.acquire(1, now=110.0) == 0
+    assert throttling.snapshot_stats() == {"free:allowed": 3, "free:rejected": 2}
+
+
+def test_buckets_are_per_user_and_per_tier(monkeypatch):
+    monkeypatch.setattr(
+        throttling, "_load_tier", lambda telegram_id: "pro" if telegram_id == 2 else "free"
+    )
+    for _ in range(2):
+        throttling.acquire(1, now=0.0)
+    assert throttling.acquire(1, now=0.0) > 0
+    for _ in range(4):
+        assert throttling.acquire(2, now=0.0) == 0
+
+
+def test_prune_idle_buckets_keeps_drained_ones():
+    throttling.acquire(1, now=0.0)
+    throttling.acquire(2, now=0.0)
+    throttling.acquire(2, now=0.0)
+
+    throttling.prune_idle_buckets(now=10.0)
+
+    assert 1 not in throttling._buckets
+    assert 2 in throttling._buckets
+
+
+def test_promo_trials_get_their_grade_tier(monkeypatch):
+    monkeypatch.setattr(
+        throttling, "THROTTLE_LIMITS", {"free": (2, 10.0), "light": (3, 5.0), "pro": (4, 1.0)}
+    )
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(throttling, "SessionLocal", factory)
+    session = factory()
+    for telegram_id, grade in ((1, "pro_promo"), (2, "light_promo"), (3, "gold")):
+        session.add(User(telegram_id=telegram_id, subscription=Subscription(grade=grade)))
+    session.add(User(telegram_id=4))
+    session.commit()
+    session.close()
+
+    assert [load_tier(telegram_id) for telegram_id in (1, 2, 3, 4)] == [
+        "pro",
+        "light",
+        "free",
+        "free",
+    ]
+
+
+def test_snapshot_stats_reset():
+    throttling.acquire(1, now=0.0)
+    assert throttling.snapshot_stats(reset=True) == {"free:allowed": 1}
+    assert throttling.snapshot_stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_middleware_rejects_once_and_skips_unflagged(monkeypatch):
+    monkeypatch.setattr(throttling, "get_flag", lambda data, name: data.get("flag"))
+    middleware = throttling.ThrottlingMiddleware()
+    handler = AsyncMock()
+    event = MagicMock(spec=types.Message)
+    event.media_group_id = None
+    event.answer = AsyncMock()
+    data = {"event_from_user": SimpleNamespace(id=7), "flag": True}
+
+    for _ in range(4):
+        await middleware(handler, event, data)
+
+    assert handler.await_count == 2
+    event.answer.assert_awaited_once()
+    assert "сек" in event.answer.await_args.args[0]
+
+    await middleware(handler, event, {"event_from_user": SimpleNamespace(id=7)})
+    assert handler.await_count == 3
@@ -0,0 +1,55 @@
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.handlers import stats  # noqa: E402
+from bot.views import View, show_view  # noqa: E402
+
+
+def _message(edit_error=None):
+    message = MagicMock()
+    message.edit_text = AsyncMock(side_effect=edit_error)
+    message.edit_reply_markup = AsyncMock()
+    message.answer = AsyncMock(return_value="new message")
+    return message
+
+
+def _error(text):
+    return TelegramBadRequest(EditMessageText(chat_id=1, message_id=2, text="x"), text)
+
+
+@pytest.mark.asyncio
+async def test_screen_is_one_edit_with_its_keyboard():
+    message = _message()
+    query = MagicMock(message=message, answer=AsyncMock())
+
+    await stats.cb_stats_menu(query)
+
+    view = stats.stats_menu_view()
+    message.edit_text.assert_awaited_once_with(
+        view.text, reply_markup=view.reply_markup, parse_mode="HTML"
+    )
+    message.edit_reply_markup.assert_not_awaited()
+    message.answer.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_show_view_keeps_unchanged_message_and_falls_back_to_send():
+    view = View("text")
+
+    unchanged = _message(_error("Bad Request: message is not modified"))
+    assert await show_view(unchanged, view) is unchanged
+    unchanged.answer.assert_not_awaited()
+    unchanged.edit_text.assert_awaited_once_with("text", reply_markup=None)
+
+    photo = _message(_error("Bad Request: there is no text in the message to edit"))
+    assert await show_view(photo, view) == "new message"
+    photo.answer.assert_awaited_once_with("text", reply_markup=None)
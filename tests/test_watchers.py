@@ -0,0 +1,95 @@
+import asyncio
+import sys
+from datetime import datetime, time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.simulation import VirtualClock  # noqa: E402
+from bot.watchers import DailyAt, Every, TickContext, WatcherRuntime  # noqa: E402
+
+
+def test_schedules():
+    assert Every(60).delay(6125.25) == 60
+    assert Every(60, align=True).delay(6125.25) == 54.75
+    # 1970-01-01 23:30 UTC
+    assert DailyAt(time()).delay(23 * 3600 + 1800) == 1800
+    assert DailyAt(time(hour=23, minute=45)).delay(23 * 3600 + 1800) == 900
+
+
+@pytest.mark.asyncio
+async def test_each_defers_when_budget_is_spent():
+    clock = VirtualClock(datetime(2025, 1, 1))
+    ctx = TickContext("test", budget=2.0, clock=clock)
+
+    seen = []
+    async for item in ctx.each([1, 2, 3]):
+        seen.append(item)
+        clock.advance(1.5)
+
+    assert seen == [1, 2]
+    assert ctx.items == 2
+    assert ctx.deferred is True
+
+
+@pytest.mark.asyncio
+async def test_run_once_continues_deferred_ticks_and_records_stats():
+    runtime = WatcherRuntime()
+    calls = []
+
+    async def _tick(ctx):
+        position = ctx.state.get("position", 0)
+        calls.append(position)
+        await ctx.processed(2)
+        if position < 2:
+            ctx.state["position"] = position + 1
+            ctx.defer()
+
+    watcher = runtime.register("test", _tick, Every(60))
+
+    runs = await runtime.run_once(watcher)
+
+    assert calls == [0, 1, 2]
+    assert [run.deferred for run in runs] == [True, True, False]
+    assert list(watcher.history) == runs
+
+
+@pytest.mark.asyncio
+async def test_failing_tick_is_counted_and_not_raised():
+    runtime = WatcherRuntime()
+
+    async def _tick(ctx):
+        await ctx.processed()
+        raise RuntimeError("boom")
+
+    watcher = runtime.register("test", _tick, Every(60))
+
+    (run,) = await runtime.run_once(watcher)
+
+    assert (run.items, run.errors) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_trigger_skips_while_previous_tick_runs():
+    runtime = WatcherRuntime()
+    release = asyncio.Event()
+    runs = []
+
+    async def _tick(ctx):
+        runs.append(ctx)
+        await release.wait()
+
+    watcher = runtime.register("test", _tick, Every(60))
+
+    assert runtime.trigger(watcher) is True
+    await asyncio.sleep(0)
+    assert runtime.trigger(watcher) is False
+    assert watcher.skipped == 1
+
+    release.set()
+    await watcher._task
+    assert runtime.trigger(watcher) is True
+    await watcher._task
+    assert len(runs) == 2
@@ -0,0 +1,150 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import digest, outbox  # noqa: E402
+from bot.database import Base, Goal, Meal, Outbox, ReminderSettings, User  # noqa: E402
+from bot.messaging import RateLimiter  # noqa: E402
+from bot.simulation import VirtualClock  # noqa: E402
+from bot.watchers import TickContext  # noqa: E402
+
+
+# Sunday, 19:05 in UTC+3
+NOW = datetime(2025, 3, 2, 16, 5)
+PLAN = (2000.0, 100.0, 70.0, 250.0)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(digest, "SessionLocal", factory)
+    monkeypatch.setattr(outbox, "SessionLocal", factory)
+    monkeypatch.setattr(digest, "get_option_bool", lambda key, default=True: True)
+    digest._planned.clear()
+    yield factory
+    digest._planned.clear()
+
+
+def _add_user(factory, telegram_id, timezone, meals=(), **reminders):
+    session = factory()
+    user = User(
+        telegram_id=telegram_id,
+        goal=Goal(calories=2000, protein=100, fat=70, carbs=250),
+        reminders=ReminderSettings(timezone=timezone, **reminders),
+    )
+    user.meals = [
+        Meal(name="meal", calories=cal, protein=10, fat=5, carbs=20, timestamp=ts)
+        for ts, cal in meals
+    ]
+    session.add(user)
+    session.commit()
+    user_id = user.id
+    session.close()
+    return user_id
+
+
+def test_render_digest_reports_averages_best_worst_and_streak():
+    today = date(2025, 3, 2)
+    days = {
+        today: (1900.0, 90.0, 60.0, 240.0),
+        today - timedelta(days=1): (2500.0, 110.0, 80.0, 300.0),
+        today - timedelta(days=2): (2100.0, 100.0, 70.0, 260.0),
+        # outside the week, still counts for the streak
+        today - timedelta(days=7): (2000.0, 100.0, 70.0, 250.0),
+        today - timedelta(days=3): (1000.0, 40.0, 30.0, 100.0),
+        today - timedelta(days=4): (1800.0, 80.0, 60.0, 220.0),
+        today - timedelta(days=5): (2050.0, 95.0, 65.0, 255.0),
+        today - timedelta(days=6): (2000.0, 100.0, 70.0, 250.0),
+    }
+
+    text = digest.render_digest(PLAN, days, today)
+
+    assert "Записано дней: 7 из 7" in text
+    assert "В среднем: 1907 ккал при цели 2000" in text
+    assert "Ближе всего к цели: понедельник — 2000 ккал" in text
+    assert "Дальше всего от цели: четверг — 1000 ккал" in text
+    assert "Серия: 8 дней подряд" in text
+    assert digest.render_digest(PLAN, {}, today) is None
+
+
+def test_digest_offsets_cover_timezones_in_the_evening_window():
+    # 16:05 UTC on Sunday: UTC+3 is at 19:05, UTC+0 at 16:05, UTC+7 at 23:05
+    ranges = digest.digest_offsets(NOW)
+    assert any(low <= 180 < high for low, high in ranges)
+    assert not any(low <= 0 < high for low, high in ranges)
+    assert not any(low <= 420 < high for low, high in ranges)
+    # Monday 00:30 UTC is still Sunday evening west of UTC-5:30
+    monday = datetime(2025, 3, 3, 0, 30)
+    assert any(low <= -300 < high for low, high in digest.digest_offsets(monday))
+    assert digest.digest_offsets(datetime(2025, 3, 5, 16, 0)) == []
+
+
+def test_daily_totals_group_by_local_day(session_factory):
+    user_id = _add_user(
+        session_factory,
+        1,
+        180,
+        meals=[
+            # 22:30 UTC on Saturday is already Sunday in UTC+3
+            (datetime(2025, 3, 1, 22, 30), 500),
+            (datetime(2025, 3, 2, 10, 0), 700),
+            (datetime(2025, 3, 1, 12, 0), 900),
+        ],
+    )
+    session = session_factory()
+
+    totals = digest.daily_totals(session, [user_id], NOW)
+
+    assert totals[user_id][date(2025, 3, 2)] == (1200.0, 20.0, 10.0, 40.0)
+    assert totals[user_id][date(2025, 3, 1)] == (900.0, 10.0, 5.0, 20.0)
+    session.close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_queues_and_paces_digests(session_factory, monkeypatch):
+    meals = [(NOW - timedelta(days=offset), 1800) for offset in range(3)]
+    moscow = _add_user(session_factory, 1, 180, meals)
+    _add_user(session_factory, 2, 0, meals)  # 16:05 local, too early
+    _add_user(session_factory, 3, 180)  # nothing logged this week
+    _add_user(session_factory, 4, 180, meals, last_digest=NOW - timedelta(days=2))
+    send = AsyncMock(return_value=True)
+    monkeypatch.setattr(outbox, "send_with_retries", send)
+    clock = VirtualClock(NOW - timedelta(minutes=5))
+    state = {}
+
+    async def _tick():
+        await digest.digest_watcher_tick(TickContext("digest", state=state, clock=clock))
+        ctx = TickContext("outbox", clock=clock)
+        await outbox.dispatch_outbox(None, ctx, limiter=RateLimiter(1000))
+
+    await _tick()
+    session = session_factory()
+    queued = session.query(Outbox).one()
+    session.close()
+    assert queued.chat_id == 1
+    assert NOW - timedelta(minutes=5) <= queued.not_before < NOW + timedelta(hours=2)
+    assert send.await_count == 0
+
+    clock.advance((queued.not_before - clock.now()).total_seconds())
+    await _tick()
+
+    assert [call.args[1] for call in send.await_args_list] == [1]
+    assert "Итоги недели" in send.await_args.kwargs["text"]
+    session = session_factory()
+    assert session.get(ReminderSettings, moscow).last_digest is not None
+    session.close()
+
+    clock.advance(3600)
+    await _tick()
+    assert send.await_count == 1